@@ -0,0 +1,346 @@
+"""Compact, versioned binary format for CodeAnalyzer.analyze() results
+
+Layout: a header (magic, format version, section count), a directory of
+(section id, flags, offset, length) entries, then the sections. Numbers are
+stored column-wise as little-endian arrays, every string once in a shared
+table, the source lines that function bodies cover (or the whole file, or
+for streamed analyses the function windows) optionally zlib-compressed,
+and the DOT graph not at all, since it is rebuilt from the tree. Readers
+skip sections they do not need, so metrics can be read without touching
+the string table or decompressing any code.
+
+    python analysis_codec.py bench <file>...     # size and speed against pickle and JSON
+"""
+import bisect
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from code_tree import KINDS, CodeTree
+from source_buffer import FunctionRecord, SourceBuffer
+
+MAGIC = b'CAB'
+FORMAT_VERSION = 1
+# Content type for HTTP responses carrying an encoded analysis
+MEDIA_TYPE = 'application/vnd.code-analysis'
+
+# Section ids
+META = 1
+STRINGS = 2
+FUNCTIONS = 3
+TREE = 4
+SOURCE = 5
+CODE = 6
+
+# Section flags
+ZLIB = 1
+
+# Optional analysis keys carried in META as they are
+_META_KEYS = ('truncated', 'bytes_read', 'degraded', 'metrics')
+
+_HEADER = struct.Struct('<3sBB')
+_ENTRY = struct.Struct('<BBII')
+
+
+class CodecError(ValueError):
+    """Data is not an encoded analysis, or uses a newer format version"""
+
+
+def _column(typecode: str, values: Iterable[int] = ()) -> bytes:
+    column = array(typecode, values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_columns(data: bytes, offset: int, spec: str, count: int) -> Tuple[List[array], int]:
+    """count-long arrays, one per typecode in spec, stored back to back from offset"""
+    columns = []
+    for typecode in spec:
+        column = array(typecode)
+        end = offset + column.itemsize * count
+        column.frombytes(data[offset:end])
+        if sys.byteorder == 'big':
+            column.byteswap()
+        columns.append(column)
+        offset = end
+    return columns, offset
+
+
+def _pack_strings(strings: List[str]) -> bytes:
+    encoded = [s.encode('utf-8', errors='surrogatepass') for s in strings]
+    return struct.pack('<I', len(encoded)) + _column('I', map(len, encoded)) + b''.join(encoded)
+
+
+def _unpack_strings(data: bytes) -> List[str]:
+    (count,) = struct.unpack_from('<I', data)
+    (lengths,), offset = _read_columns(data, 4, 'I', count)
+    strings = []
+    for length in lengths:
+        strings.append(data[offset:offset + length].decode('utf-8', errors='surrogatepass'))
+        offset += length
+    return strings
+
+
+class _Interner:
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __call__(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+def _shared_buffer(functions: list) -> Optional[SourceBuffer]:
+    """The buffer every function record points into, if there is exactly one"""
+    buffer = None
+    for func in functions:
+        if not isinstance(func, FunctionRecord) or (buffer is not None and func.buffer is not buffer):
+            return None
+        buffer = func.buffer
+    return buffer
+
+
+def _function_lines(buffer: SourceBuffer, functions: List[FunctionRecord]) -> Tuple[str, List[int], List[int]]:
+    """Only the source lines some function covers, and the functions' line ranges renumbered into them"""
+    count = buffer.line_count()
+    spans = sorted({(min(f.start_line, count), min(max(f.end_line, f.start_line), count)) for f in functions})
+    # Merge overlapping windows into runs of lines, each stored once
+    runs = []
+    for start, end in spans:
+        if runs and start <= runs[-1][1]:
+            runs[-1][1] = max(runs[-1][1], end)
+        else:
+            runs.append([start, end])
+    pieces = []
+    run_starts = []
+    new_line = 0
+    for start, end in runs:
+        run_starts.append((start, new_line))
+        pieces.append(buffer.lines(start, end))
+        new_line += end - start
+    starts, ends = [], []
+    keys = [start for start, _ in run_starts]
+    for f in functions:
+        start = min(f.start_line, count)
+        end = min(max(f.end_line, f.start_line), count)
+        run_start, new_start = run_starts[bisect.bisect_right(keys, start) - 1]
+        starts.append(new_start + start - run_start)
+        ends.append(new_start + end - run_start)
+    # Terminating the last line keeps a trailing empty line countable
+    return '\n'.join(pieces) + '\n', starts, ends
+
+
+def encode(analysis: Dict, source: str = 'functions', compress: bool = True) -> bytes:
+    """Serialise an analysis dict
+
+    source selects what code is stored: 'functions' (the lines function
+    bodies cover), 'full' (the whole file, for later review) or 'none'
+    (decoding then yields (name, summary) pairs, which the app already
+    renders).
+    """
+    if source not in ('functions', 'full', 'none'):
+        raise ValueError(f"source must be 'functions', 'full' or 'none', not {source!r}")
+    intern = _Interner()
+    sections = []
+    flags = ZLIB if compress else 0
+
+    functions = analysis.get('functions') or []
+    tree = analysis.get('code_tree')
+    if tree is not None and not isinstance(tree, CodeTree):
+        tree = CodeTree.from_dicts(tree)
+    tree = tree or CodeTree()
+
+    # META is self-contained so metrics can be read on their own
+    meta = {
+        'language': analysis.get('language', 'Unknown'),
+        'loc': analysis.get('loc', 0),
+        'libraries': list(analysis.get('libraries') or []),
+        'function_count': len(functions),
+        'tree_size': len(tree),
+    }
+    for key in _META_KEYS:
+        if key in analysis:
+            meta[key] = analysis[key]
+    sections.append((META, 0, json.dumps(meta, separators=(',', ':')).encode('utf-8')))
+
+    names = [intern(func[0]) for func in functions]
+    summaries = [intern(func[1]) for func in functions]
+    buffer = _shared_buffer(functions) if source != 'none' else None
+    if buffer is not None:
+        # Functions are line ranges of the source section
+        if source == 'full':
+            text = buffer.text
+            starts = [func.start_line for func in functions]
+            ends = [func.end_line for func in functions]
+        else:
+            text, starts, ends = _function_lines(buffer, functions)
+        body = _column('I', starts) + _column('I', ends)
+        sections.append((SOURCE, flags, text.encode('utf-8', errors='surrogatepass')))
+    elif source != 'none':
+        body = b''
+        sections.append((CODE, flags, _pack_strings([func[2] if len(func) > 2 else '' for func in functions])))
+    else:
+        body = b''
+    sections.append((FUNCTIONS, 0, struct.pack('<I', len(functions)) + _column('I', names) + _column('I', summaries) + body))
+
+    node_names = [intern(name) for name in tree.names]
+    arg_offsets = [0]
+    arg_names = []
+    for args in tree.args:
+        arg_names.extend(intern(arg) for arg in args)
+        arg_offsets.append(len(arg_names))
+    sections.append((TREE, 0, b''.join([
+        struct.pack('<II', len(tree), len(arg_names)),
+        _column('B', tree.kinds), _column('I', node_names), _column('i', tree.parents), _column('I', tree.lines),
+        _column('I', arg_offsets), _column('I', arg_names),
+    ])))
+    sections.append((STRINGS, flags, _pack_strings(intern.strings)))
+
+    directory_size = _HEADER.size + _ENTRY.size * len(sections)
+    offset = directory_size
+    directory = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections))]
+    payloads = []
+    for section_id, section_flags, payload in sections:
+        if section_flags & ZLIB:
+            payload = zlib.compress(payload, 6)
+        directory.append(_ENTRY.pack(section_id, section_flags, offset, len(payload)))
+        payloads.append(payload)
+        offset += len(payload)
+    return b''.join(directory + payloads)
+
+
+def _directory(data: bytes) -> Dict[int, Tuple[int, int, int]]:
+    """section id -> (flags, offset, length)"""
+    if len(data) < _HEADER.size:
+        raise CodecError("Not an encoded analysis")
+    magic, version, count = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise CodecError("Not an encoded analysis")
+    if version > FORMAT_VERSION:
+        raise CodecError(f"Encoded analysis uses format version {version}; this reader supports {FORMAT_VERSION}")
+    sections = {}
+    for i in range(count):
+        section_id, flags, offset, length = _ENTRY.unpack_from(data, _HEADER.size + i * _ENTRY.size)
+        # Unknown ids come from newer writers and are ignored
+        sections[section_id] = (flags, offset, length)
+    return sections
+
+
+def _section(data: bytes, sections: Dict, section_id: int) -> Optional[bytes]:
+    entry = sections.get(section_id)
+    if entry is None:
+        return None
+    flags, offset, length = entry
+    payload = data[offset:offset + length]
+    return zlib.decompress(payload) if flags & ZLIB else payload
+
+
+def decode_metrics(data: bytes) -> Dict:
+    """Language, LOC, libraries and counts, without decoding strings, functions, tree or code"""
+    sections = _directory(data)
+    return json.loads(_section(data, sections, META))
+
+
+def decode(data: bytes, code: bool = True, tree: bool = True) -> Dict:
+    """Rebuild an analysis dict
+
+    code=False skips the source section: functions come back as (name,
+    summary) pairs. tree=False skips the structure: code_tree and
+    tree_graphviz are None.
+    """
+    sections = _directory(data)
+    meta = json.loads(_section(data, sections, META))
+    strings = _unpack_strings(_section(data, sections, STRINGS))
+    analysis = {
+        'language': meta['language'],
+        'loc': meta['loc'],
+        'libraries': meta['libraries'],
+    }
+
+    payload = _section(data, sections, FUNCTIONS)
+    (count,) = struct.unpack_from('<I', payload)
+    (names, summaries), offset = _read_columns(payload, 4, 'II', count)
+    functions = []
+    if code and SOURCE in sections:
+        (starts, ends), _ = _read_columns(payload, offset, 'II', count)
+        buffer = SourceBuffer(_section(data, sections, SOURCE).decode('utf-8', errors='surrogatepass'))
+        functions = [FunctionRecord(strings[n], strings[s], buffer, start, end)
+                     for n, s, start, end in zip(names, summaries, starts, ends)]
+    elif code and CODE in sections:
+        bodies = _unpack_strings(_section(data, sections, CODE))
+        functions = [FunctionRecord.from_code(strings[n], strings[s], body)
+                     for n, s, body in zip(names, summaries, bodies)]
+    else:
+        functions = [(strings[n], strings[s]) for n, s in zip(names, summaries)]
+    analysis['functions'] = functions
+
+    code_tree = None
+    if tree:
+        payload = _section(data, sections, TREE)
+        size, arg_count = struct.unpack_from('<II', payload)
+        (kinds, node_names, parents, lines), offset = _read_columns(payload, 8, 'BIiI', size)
+        (arg_offsets,), offset = _read_columns(payload, offset, 'I', size + 1)
+        (arg_names,), _ = _read_columns(payload, offset, 'I', arg_count)
+        code_tree = CodeTree()
+        for i in range(size):
+            args = [strings[a] for a in arg_names[arg_offsets[i]:arg_offsets[i + 1]]]
+            code_tree.add(KINDS[kinds[i]], strings[node_names[i]], parents[i], lines[i], args)
+    analysis['code_tree'] = code_tree
+    analysis['tree_graphviz'] = code_tree.to_dot() if code_tree else None
+    for key in _META_KEYS:
+        if key in meta:
+            analysis[key] = meta[key]
+    return analysis
+
+
+def bench(paths: List[str], rounds: int = 20):
+    """Encoded size and round-trip time against pickle and JSON"""
+    import os
+    import pickle
+    import time
+    from code_analyzer import CodeAnalyzer
+
+    def as_plain(analysis: Dict) -> Dict:
+        plain = dict(analysis)
+        plain['functions'] = [tuple(func) for func in analysis['functions']]
+        plain['code_tree'] = list(analysis['code_tree'] or [])
+        return plain
+
+    formats = [
+        ('pickle', lambda a: pickle.dumps(as_plain(a), protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+        ('json', lambda a: json.dumps(as_plain(a)).encode('utf-8'), json.loads),
+        ('codec', encode, decode),
+        ('codec, no zlib', lambda a: encode(a, compress=False), decode),
+        ('codec, full', lambda a: encode(a, source='full'), decode),
+        ('codec metrics', encode, decode_metrics),
+    ]
+    analyzer = CodeAnalyzer()
+    for path in paths:
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            analysis = analyzer.analyze(f.read(), os.path.basename(path))
+        print(f"{path}: {len(analysis['functions'])} functions, {len(analysis['code_tree'] or [])} tree nodes")
+        for label, dump, load in formats:
+            start = time.perf_counter()
+            for _ in range(rounds):
+                data = dump(analysis)
+            dumped = time.perf_counter()
+            for _ in range(rounds):
+                load(data)
+            loaded = time.perf_counter()
+            print(f"  {label:<15} {len(data):>10,} bytes  encode {(dumped - start) / rounds * 1000:7.2f} ms  "
+                  f"decode {(loaded - dumped) / rounds * 1000:7.2f} ms")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'bench':
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(2)
+    bench(sys.argv[2:])
@@ -0,0 +1,310 @@
+"""Headless HTTP API for CodeAnalyzer and BedrockHelper
+
+Lets other systems (e.g. an ATS) submit code without the Streamlit UI.
+
+    python api_server.py [--port 8765] [--workers 8] [--mock]
+    python api_server.py loadtest [--url http://127.0.0.1:8765] [--requests 200] [--concurrency 20]
+
+Endpoints:
+    POST /analyze   {"filename", "code"}                          -> analysis (synchronous; binary with
+                                                                     Accept: application/vnd.code-analysis)
+    POST /enhance   {"filename", "code", "model_id"}              -> 202 {"job_id", ...}
+    POST /convert   {"code", "target_language", "source_language", "model_id"} -> 202 {"job_id", ...}
+    GET  /jobs/<id>                                               -> job status and result
+    GET  /jobs/<id>/stream                                        -> server-sent events until done
+    GET  /health                                                  -> queue and model call counters
+
+Identical enhance/convert submissions that are still queued or running are
+coalesced onto the same job id.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+import analysis_codec
+from code_analyzer import CodeAnalyzer
+from code_tree import CodeTree
+from bedrock_helper import BedrockHelper
+from jobs import JobQueue
+from sandbox import SandboxPool
+from source_buffer import FunctionRecord
+
+DEFAULT_MODEL_ID = 'amazon.titan-text-lite-v1'
+
+
+def _json_default(obj):
+    # Analyses carry a CodeTree; send it as its list of nodes
+    if isinstance(obj, CodeTree):
+        return obj.to_dicts()
+    # Function records go out as the legacy [name, summary, code]
+    if isinstance(obj, FunctionRecord):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class AnalysisService:
+    """Shared analyzer, Bedrock helper and job queue behind the HTTP handlers"""
+
+    def __init__(self, workers: int = 8, mock: bool = None):
+        self.analyzer = CodeAnalyzer()
+        # Processes used to scan huge non-Python files in chunks
+        self.analysis_workers = int(os.getenv('ANALYSIS_WORKERS', str(os.cpu_count() or 1)))
+        # Uploads are analysed in resource-limited worker processes unless ANALYSIS_SANDBOX_WORKERS=0
+        self.sandbox = SandboxPool.from_env() if int(os.getenv('ANALYSIS_SANDBOX_WORKERS', '2')) > 0 else None
+        self.bedrock = BedrockHelper(mock=mock, max_concurrency=workers)
+        self.queue = JobQueue(workers=workers)
+
+    def analyze(self, payload: Dict) -> Dict:
+        analyzer = self.sandbox or self.analyzer
+        return analyzer.analyze(payload['code'], payload.get('filename', 'submission.txt'),
+                                workers=self.analysis_workers)
+
+    async def _enhance(self, payload: Dict) -> Dict:
+        # Static analysis is CPU-bound; keep it off the event loop
+        analysis = await asyncio.to_thread(self.analyze, payload)
+        return await self.bedrock.aenhance_analysis(analysis, payload.get('model_id', DEFAULT_MODEL_ID))
+
+    async def _convert(self, payload: Dict) -> Dict:
+        converted = await self.bedrock.aconvert_function_to_language(
+            payload['code'],
+            payload['target_language'],
+            payload.get('source_language', 'Python'),
+            payload.get('model_id', DEFAULT_MODEL_ID)
+        )
+        return {'converted_code': converted}
+
+    def submit(self, kind: str, payload: Dict) -> Tuple[Dict, bool]:
+        """Queue an enhance/convert job; identical in-flight requests share one job"""
+        key = hashlib.sha256(json.dumps([kind, payload], sort_keys=True).encode('utf-8')).hexdigest()
+        handler = self._enhance if kind == 'enhance' else self._convert
+        job, coalesced = self.queue.submit(key, kind, lambda: handler(payload))
+        return job, coalesced
+
+    def health(self) -> Dict:
+        return {
+            'status': 'ok',
+            'mock': bool(self.bedrock.mock),
+            'queue_depth': self.queue.depth(),
+            'queue': dict(self.queue.stats),
+            'bedrock': dict(self.bedrock.stats),
+            'models': {model: dict(usage) for model, usage in self.bedrock.usage.items()},
+            'regions': {'hedging': self.bedrock.regions.hedge, **self.bedrock.regions.stats,
+                        'health': self.bedrock.regions.snapshot()},
+            'sandbox': dict(self.sandbox.stats) if self.sandbox else None,
+            'quota': {'waiting': self.bedrock.scheduler.waiting(), **self.bedrock.scheduler.stats},
+        }
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    service: AnalysisService = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Keep load tests quiet; errors are still reported in responses
+        pass
+
+    def _send_json(self, status: int, data: Dict):
+        body = json.dumps(data, default=_json_default).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_bytes(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send_json(400, {'error': 'Request body must be JSON'})
+            return
+        route = self.path.rstrip('/')
+        required = {
+            '/analyze': ['code'],
+            '/enhance': ['code'],
+            '/convert': ['code', 'target_language'],
+        }
+        if route not in required:
+            self._send_json(404, {'error': f'Unknown endpoint {self.path}'})
+            return
+        missing = [field for field in required[route] if field not in payload]
+        if missing:
+            self._send_json(400, {'error': f"Missing field(s): {', '.join(missing)}"})
+            return
+        if route == '/analyze':
+            try:
+                analysis = self.service.analyze(payload)
+                if analysis_codec.MEDIA_TYPE in (self.headers.get('Accept') or ''):
+                    self._send_bytes(200, analysis_codec.encode(analysis), analysis_codec.MEDIA_TYPE)
+                else:
+                    self._send_json(200, analysis)
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+            return
+        job, coalesced = self.service.submit(route[1:], payload)
+        data = job.to_dict(include_result=False)
+        data['coalesced'] = coalesced
+        self._send_json(202, data)
+
+    def do_GET(self):
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        if parts == ['health']:
+            self._send_json(200, self.service.health())
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self.service.queue.get(parts[1])
+            if job is None:
+                self._send_json(404, {'error': 'Unknown or expired job id'})
+            else:
+                self._send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'stream':
+            self._stream(parts[1])
+        else:
+            self._send_json(404, {'error': f'Unknown endpoint {self.path}'})
+
+    def _stream(self, job_id: str):
+        """Server-sent events: one 'status' event per change, then 'result'"""
+        job = self.service.queue.get(job_id)
+        if job is None:
+            self._send_json(404, {'error': 'Unknown or expired job id'})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        last_status = None
+        done = False
+        while not done:
+            if job.status != last_status:
+                last_status = job.status
+                self._send_event('status', {'status': job.status})
+            done = job.wait(0.5)
+        self._send_event('result', job.to_dict())
+
+    def _send_event(self, event: str, data: Dict):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data, default=_json_default)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+
+class APIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many short connections at once; the default backlog of 5 resets them
+    request_queue_size = 256
+
+
+def serve(host: str, port: int, workers: int, mock: bool):
+    APIHandler.service = AnalysisService(workers=workers, mock=mock or None)
+    server = APIServer((host, port), APIHandler)
+    print(f"Serving on http://{host}:{port} (workers={workers}, mock={bool(mock)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _http_json(method: str, url: str, payload: Dict = None) -> Tuple[int, Dict]:
+    import urllib.error
+    import urllib.request
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+
+def loadtest(url: str, total: int, concurrency: int, unique: int):
+    """Fire convert jobs at a running server and report end-to-end latency"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    samples_dir = os.path.join(os.path.dirname(current_dir), 'Code_For_Test')
+    analyzer = CodeAnalyzer()
+    functions = []
+    for name in sorted(os.listdir(samples_dir)):
+        with open(os.path.join(samples_dir, name), encoding='utf-8', errors='ignore') as f:
+            analysis = analyzer.analyze(f.read(), name)
+        functions.extend((analysis['language'], func[2]) for func in analysis['functions'] if len(func) == 3)
+    # A small pool of distinct requests makes coalescing observable
+    functions = functions[:max(1, unique)]
+
+    def one(i: int) -> Tuple[float, bool, str]:
+        language, code = functions[i % len(functions)]
+        start = time.perf_counter()
+        status, job = _http_json('POST', f"{url}/convert", {
+            'code': code, 'target_language': 'Java', 'source_language': language
+        })
+        if status != 202:
+            return time.perf_counter() - start, False, 'rejected'
+        # Only the submission says whether it joined a job in flight; the polled job does not
+        coalesced = job.get('coalesced', False)
+        while job['status'] in ('queued', 'running'):
+            time.sleep(0.05)
+            status, job = _http_json('GET', f"{url}/jobs/{job['job_id']}")
+            if status != 200:
+                return time.perf_counter() - start, coalesced, 'lost'
+        return time.perf_counter() - start, coalesced, job['status']
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    statuses = {}
+    for r in results:
+        statuses[r[2]] = statuses.get(r[2], 0) + 1
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    print(f"requests={total} concurrency={concurrency} distinct={len(functions)} elapsed={elapsed:.2f}s "
+          f"throughput={total / elapsed:.1f} req/s")
+    print(f"latency p50={pct(50):.3f}s p95={pct(95):.3f}s p99={pct(99):.3f}s max={latencies[-1]:.3f}s")
+    print(f"statuses={statuses} coalesced={sum(1 for r in results if r[1])}")
+    print(f"server={json.dumps(_http_json('GET', f'{url}/health')[1])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Interview Code Lens API")
+    parser.add_argument('command', nargs='?', default='serve', choices=['serve', 'loadtest'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=8, help="Job queue workers (and concurrent model calls)")
+    parser.add_argument('--mock', action='store_true', help="Answer model calls locally (same as BEDROCK_MOCK=1)")
+    parser.add_argument('--url', default='http://127.0.0.1:8765', help="loadtest: server to target")
+    parser.add_argument('--requests', type=int, default=200, help="loadtest: total requests")
+    parser.add_argument('--concurrency', type=int, default=20, help="loadtest: concurrent clients")
+    parser.add_argument('--unique', type=int, default=20, help="loadtest: distinct function bodies")
+    args = parser.parse_args()
+
+    if args.command == 'loadtest':
+        loadtest(args.url.rstrip('/'), args.requests, args.concurrency, args.unique)
+    else:
+        serve(args.host, args.port, args.workers, args.mock)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,77 @@
 import streamlit as st
 import os
 import sys
+import time
 import hashlib
+import tempfile
 import streamlit.components.v1 as components
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
+# Bidirectional video component; its HTML/CSS/JS are static files cached by the browser
+video_interview = components.declare_component(
+    "video_interview",
+    path=os.path.join(current_dir, "components", "video_interview")
+)
+
 from code_analyzer import CodeAnalyzer
+from code_tree import CodeTree
 from bedrock_helper import BedrockHelper
+from jobs import JobManager
+from graph_render import render_svg
+from source_buffer import FunctionRecord
+
+# Trees with more nodes than this start with their classes collapsed
+TREE_DETAIL_LIMIT = 80
+# Upper bound on drawn nodes, whatever the user expands
+TREE_MAX_NODES = 400
+# Uploads larger than this are analysed as a stream of chunks, up to the hard cap
+STREAM_ANALYSIS_BYTES = 5 * 1024 * 1024
+MAX_ANALYSIS_BYTES = int(os.getenv('ANALYSIS_MAX_BYTES', str(100 * 1024 * 1024)))
+# Source shown in the "view source" expander for streamed uploads
+SOURCE_PREVIEW_BYTES = 200 * 1024
+# Optional persistent symbol index that every analysed upload is added to
+SYMBOL_INDEX_DB = os.getenv('SYMBOL_INDEX_DB')
+# Optional MinHash index of known solutions / past submissions (built with similarity_index.py)
+SIMILARITY_INDEX = os.getenv('SIMILARITY_INDEX')
+# Processes used to scan huge non-Python files in chunks
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', str(os.cpu_count() or 1)))
+# Uploads are analysed in resource-limited worker processes (sandbox.py); 0 analyses in-process
+ANALYSIS_SANDBOX = int(os.getenv('ANALYSIS_SANDBOX_WORKERS', '2')) > 0
+# Seconds a page run waits for AI summaries and conversions before leaving them as "pending"
+AI_PAGE_DEADLINE = float(os.getenv('AI_PAGE_DEADLINE', '15'))
+# How often a page with pending AI results checks whether more have arrived
+AI_REFRESH_SECONDS = float(os.getenv('AI_REFRESH_SECONDS', '2'))
+# Logins that may profile every run and download profiles from the sidebar (see profiling.py)
+ADMIN_USERS = {name.strip() for name in os.getenv('ADMIN_USERS', 'admin').split(',') if name.strip()}
+# Map target language to syntax highlighting (40+ languages)
+TARGET_LANG_MAP = {
+    # Mainstream Languages
+    "Python": "python", "Java": "java", "JavaScript": "javascript",
+    "TypeScript": "typescript", "C": "c", "C++": "cpp", "C#": "csharp",
+    # Modern Systems Languages
+    "Rust": "rust", "Go": "go", "Swift": "swift", 
+    "Kotlin": "kotlin", "Dart": "dart", "Zig": "zig",
+    # Functional & Scripting
+    "Ruby": "ruby", "PHP": "php", "Perl": "perl", 
+    "Lua": "lua", "Scala": "scala", "Haskell": "haskell",
+    "F#": "fsharp", "Elixir": "elixir",
+    # Data Science & Scientific
+    "R": "r", "MATLAB": "matlab", "Julia": "julia", "Fortran": "fortran",
+    # Web & Frontend
+    "HTML": "html", "CSS": "css", "Vue": "vue", 
+    "Svelte": "svelte", "CoffeeScript": "coffeescript", "Elm": "elm",
+    # Systems & Low-level
+    "Assembly": "asm", "Nim": "nim", "Crystal": "crystal", "D": "d",
+    # Legacy & Enterprise
+    "COBOL": "cobol", "Pascal": "pascal", "Ada": "ada",
+    # Other Popular
+    "Shell": "bash", "Bash": "bash", "PowerShell": "powershell", 
+    "SQL": "sql", "Groovy": "groovy",
+    # Functional & Logic
+    "Clojure": "clojure", "Erlang": "erlang", "OCaml": "ocaml"
+}
 
 # Initialize session state for authentication
 if 'authenticated' not in st.session_state:
@@ -17,6 +80,8 @@ if 'username' not in st.session_state:
     st.session_state.username = None
 if 'show_login' not in st.session_state:
     st.session_state.show_login = False
+if 'video_end_requests' not in st.session_state:
+    st.session_state.video_end_requests = 0
 
 # Simple user database (in production, use a proper database)
 USERS = {
@@ -83,41 +148,251 @@ def logout():
     st.session_state.show_login = False
     st.rerun()
 
-def format_tree_text(tree):
-    """Format code tree as text"""
-    if not tree:
-        return "📄 (Simple script - no classes or functions)"
-    
-    lines = ["📄 Module"]
-    items_by_parent = {}
-    root_items = []
+def request_video_end():
+    """Ask the video component to hang up (runs before the rerun renders it)"""
+    st.session_state.video_end_requests += 1
+
+def is_admin():
+    return bool(st.session_state.authenticated and st.session_state.username in ADMIN_USERS)
+
+def requested_profile():
+    """Profiler options when this run is to be profiled, else None
     
-    for item in tree:
-        if item['parent']:
-            if item['parent'] not in items_by_parent:
-                items_by_parent[item['parent']] = []
-            items_by_parent[item['parent']].append(item)
-        else:
-            root_items.append(item)
+    Logged-in users can add ?profile=1 (sampled stacks) or ?profile=full
+    (plus cProfile) to the URL; admins can profile every run from the sidebar.
+    """
+    requested = str(st.query_params.get('profile', '')).lower()
+    if st.session_state.authenticated and requested in ('1', 'true', 'sample', 'full'):
+        return {'mode': 'full' if requested == 'full' else 'sample'}
+    if is_admin() and st.session_state.get('profile_reruns'):
+        return {'mode': st.session_state.get('profile_mode', 'sample'),
+                'allocations': st.session_state.get('profile_allocations', True)}
+    return None
+
+def defer_ai_result(label, poll, render):
+    """Leave a pending placeholder that fill_pending_ai() replaces once poll() returns a result"""
+    placeholder = st.empty()
+    placeholder.caption(f"⏳ {label} (pending)")
+    pending_ai.append((placeholder, poll, render))
+
+def fill_pending_ai(status, deadline):
+    """Fill pending placeholders as their results arrive, until all are in or the page deadline passes"""
+    while pending_ai:
+        for item in list(pending_ai):
+            placeholder, poll, render = item
+            result = poll()
+            if result is not None:
+                with placeholder.container():
+                    render(result)
+                pending_ai.remove(item)
+        remaining = deadline - time.monotonic()
+        if not pending_ai or remaining <= 0:
+            break
+        # Each update is a point where Streamlit can stop a superseded run
+        status.caption(f"⏳ {len(pending_ai)} AI result(s) pending ({remaining:.0f}s left on this page)")
+        time.sleep(0.25)
+    if pending_ai:
+        status.caption(f"⏳ {len(pending_ai)} AI result(s) still running; they appear here as they finish")
+    else:
+        status.empty()
+
+def job_result(job):
+    """Result of a finished, uncancelled job, else None"""
+    if job.done() and not job.cancelled():
+        return job.result()
+    return None
+
+def conversion_key(func_code, target_lang, source_lang):
+    """Key of a conversion in the session store (and the shared response cache)"""
+    return bedrock.conversion_cache_key(func_code, target_lang, source_lang, st.session_state.selected_model_id)
+
+def conversion_result(job):
+    """Result of a finished conversion job; successful ones live on in the session store"""
+    converted_code = job_result(job)
+    if converted_code is not None and not bedrock._is_failed('conversion', converted_code):
+        jobs.pop(job.slot)
+    return converted_code
+
+def render_conversion(converted_code, target_lang):
+    """Show a converted function, or the error the conversion produced"""
+    # Check if result is an error
+    if converted_code.startswith("MODEL_ERROR:"):
+        error_msg = converted_code.replace("MODEL_ERROR:", "").strip()
+        st.error("⚠️ **Model Error**")
+        st.warning(error_msg)
+        st.info("💡 **Suggestion**: Please try selecting a different model from the AI Enhancement section (e.g., switch to Titan Text Lite). Some models may have limitations with certain code patterns or languages.")
+    elif converted_code.startswith("HTTP_ERROR:"):
+        error_msg = converted_code.replace("HTTP_ERROR:", "").strip()
+        st.error("⚠️ **Connection Error**")
+        st.warning(error_msg)
+        st.info("💡 **Suggestion**: This is a network or authentication issue, not a model problem. Please check your API key and network connection.")
+    elif converted_code.startswith("SYSTEM_ERROR:"):
+        error_msg = converted_code.replace("SYSTEM_ERROR:", "").strip()
+        st.error("⚠️ **System Error**")
+        st.warning(error_msg)
+        st.info("💡 **Suggestion**: Please try again or contact support if the problem persists.")
+    elif converted_code.startswith("// Error:") or converted_code.startswith("Error:"):
+        st.error(converted_code.replace("// Error:", "").replace("Error:", "").strip())
+    else:
+        st.code(converted_code, language=TARGET_LANG_MAP.get(target_lang, "text"))
+
+def conversion_job(func_name, func_code, target_lang, source_lang):
+    """Submit (or reuse) the conversion job for one function"""
+    model_id = st.session_state.selected_model_id
+    return jobs.submit(
+        f"convert:{func_name}:{hash(func_code)}",
+        (target_lang, model_id),
+        lambda: bedrock.aconvert_function_to_language(func_code, target_lang, source_lang, model_id)
+    )
+
+@st.cache_resource
+def get_symbol_index():
+    """One index connection shared by all sessions"""
+    from symbol_index import SymbolIndex
+    return SymbolIndex(SYMBOL_INDEX_DB)
+
+@st.cache_resource
+def get_sandbox():
+    """Analysis worker processes shared by all sessions"""
+    from sandbox import SandboxPool
+    return SandboxPool.from_env()
+
+def get_similarity_index():
+    """The similarity index, or None while SIMILARITY_INDEX is unset or its file is missing"""
+    # Checked on every call, so an index built after startup is picked up
+    if not SIMILARITY_INDEX or not os.path.exists(SIMILARITY_INDEX):
+        return None
+    return load_similarity_index(SIMILARITY_INDEX)
+
+@st.cache_resource
+def load_similarity_index(path):
+    """Similarity index loaded once and shared by all sessions"""
+    from similarity_index import SimilarityIndex
+    return SimilarityIndex.load(path)
+
+@st.cache_resource
+def get_profile_store():
+    """Stored profiles, shared by all sessions"""
+    from profiling import ProfileStore
+    return ProfileStore()
+
+def save_profile(kind, report):
+    """Store a profile under the current submission's hash"""
+    from profiling import NO_SUBMISSION
+    return get_profile_store().save(
+        code_hash if uploaded_file else NO_SUBMISSION, kind, report,
+        filename=uploaded_file.name if uploaded_file else None,
+        user=st.session_state.username
+    )
+
+def profiling_panel():
+    """Admin controls: profile every run or the current analysis, and download stored profiles"""
+    from profiling import NO_SUBMISSION, PROFILE_MODES
+    with st.expander("🩺 Profiling"):
+        st.toggle("Profile every run", key="profile_reruns",
+                  help="Anyone logged in can also profile one page by adding ?profile=1 (or ?profile=full) to the URL")
+        st.radio("Profiler", PROFILE_MODES, key="profile_mode", horizontal=True,
+                 format_func=lambda mode: "Sampling" if mode == 'sample' else "Sampling + cProfile")
+        st.checkbox("Track allocations (tracemalloc, slower)", value=True, key="profile_allocations")
+        if uploaded_file and st.button("Profile this file's analysis", key="profile_analysis_btn"):
+            options = {'mode': st.session_state.profile_mode, 'allocations': st.session_state.profile_allocations}
+            with st.spinner("Profiling analysis..."):
+                profiled, _ = analyze_upload(uploaded_file, streamed, profile=options)
+            if profiled.get('profile'):
+                save_profile('analysis', profiled['profile'])
+            else:
+                st.caption("Not profiled: another profile is running, or the analysis was stopped")
+        
+        key = code_hash if uploaded_file else NO_SUBMISSION
+        store = get_profile_store()
+        profiles = store.list(key)
+        if not profiles:
+            st.caption("No profiles for this submission yet")
+        for summary in profiles[:5]:
+            details = f"{summary['wall_seconds']:.2f}s · {summary['samples']} samples"
+            if summary.get('allocated_bytes') is not None:
+                details += f" · {summary['allocated_bytes'] / 1024:,.0f} KB retained"
+            started = time.strftime('%H:%M:%S', time.localtime(summary['created']))
+            st.caption(f"**{summary['kind']}** {started} · {details}")
+            formats = ['folded', 'json'] + (['pstats'] if summary['mode'] == 'full' else [])
+            for column, ext in zip(st.columns(len(formats)), formats):
+                with column:
+                    st.download_button(f".{ext}", store.read(key, summary['id'], ext) or b'',
+                                       file_name=f"{summary['id']}.{ext}", key=f"profile_{summary['id']}_{ext}",
+                                       on_click='ignore', use_container_width=True)
+
+def analyze_upload(uploaded_file, streamed, profile=None):
+    """Analyse an upload: (analysis, sha256 of the file)
     
-    def render_item(item, prefix="", is_last=True):
-        connector = "└─ " if is_last else "├─ "
-        if item['type'] == 'class':
-            lines.append(f"{prefix}{connector}📦 Class: {item['name']}")
-            new_prefix = prefix + ("   " if is_last else "│  ")
-            children = items_by_parent.get(item['name'], [])
-            for i, child in enumerate(children):
-                render_item(child, new_prefix, i == len(children) - 1)
-        elif item['type'] == 'function':
-            icon = "🔧" if item['parent'] else "⚙️"
-            parent_prefix = f"{item['parent']}." if item['parent'] else ""
-            args_str = f"({', '.join(item['args'])})" if item['args'] else "()"
-            lines.append(f"{prefix}{connector}{icon} {parent_prefix}{item['name']}{args_str}")
+    With `profile` (Profiler options, see profiling.py) the analysis is
+    profiled and the report is returned under analysis['profile'].
+    """
+    def in_process(analyze, *args, **kwargs):
+        if profile is None:
+            return analyze(*args, **kwargs)
+        from profiling import profile_call
+        result, report = profile_call(analyze, *args, **profile, **kwargs)
+        if report is not None:
+            result['profile'] = report
+        return result
     
-    for i, item in enumerate(root_items):
-        render_item(item, "", i == len(root_items) - 1)
+    uploaded_file.seek(0)
+    if streamed:
+        # Large upload: decode and scan chunk by chunk instead of building one big string
+        hasher = hashlib.sha256()
+        
+        def upload_chunks():
+            for chunk in iter(lambda: uploaded_file.read(1024 * 1024), b''):
+                hasher.update(chunk)
+                yield chunk
+        
+        if ANALYSIS_SANDBOX:
+            # The worker process reads the upload back from a temporary file
+            with tempfile.NamedTemporaryFile(delete=False) as upload_copy:
+                for chunk in upload_chunks():
+                    upload_copy.write(chunk)
+                    if upload_copy.tell() > MAX_ANALYSIS_BYTES:
+                        break
+            try:
+                analysis = get_sandbox().analyze_file(upload_copy.name, uploaded_file.name,
+                                                      max_bytes=MAX_ANALYSIS_BYTES, profile=profile)
+            finally:
+                os.unlink(upload_copy.name)
+        else:
+            analysis = in_process(analyzer.analyze_stream, upload_chunks(), uploaded_file.name,
+                                  max_bytes=MAX_ANALYSIS_BYTES)
+        # Analysis stops at MAX_ANALYSIS_BYTES, but the hash covers the whole file
+        for _ in upload_chunks():
+            pass
+        code_hash = hasher.hexdigest()
+    else:
+        code_bytes = uploaded_file.read()
+        code_text = code_bytes.decode("utf-8", errors="ignore")
+        code_hash = hashlib.sha256(code_bytes).hexdigest()
+        if ANALYSIS_SANDBOX:
+            analysis = get_sandbox().analyze(code_text, uploaded_file.name, workers=ANALYSIS_WORKERS, profile=profile)
+        else:
+            analysis = in_process(analyzer.analyze, code_text, uploaded_file.name, workers=ANALYSIS_WORKERS)
+    return analysis, code_hash
+
+def upload_source(uploaded_file, analysis, streamed):
+    """Source shown on the page: the buffer the analysis' functions share, else read back from the upload
     
-    return "\n".join(lines)
+    For streamed uploads (whose functions only keep their own windows) this
+    is the first SOURCE_PREVIEW_BYTES.
+    """
+    functions = analysis['functions']
+    if not streamed and functions and isinstance(functions[0], FunctionRecord):
+        return functions[0].buffer.text
+    uploaded_file.seek(0)
+    return uploaded_file.read(SOURCE_PREVIEW_BYTES if streamed else -1).decode("utf-8", errors="ignore")
+
+def format_tree_text(tree):
+    """Format code tree as text"""
+    if not isinstance(tree, CodeTree):
+        # Legacy list of node dicts
+        tree = CodeTree.from_dicts(tree or [])
+    return tree.to_text()
 
 st.set_page_config(
     page_title="Interview Code Lens", 
@@ -175,6 +450,20 @@ if st.session_state.show_login:
         login_form()
     st.stop()
 
+# A profiled run cut short (st.rerun, or a newer interaction) never reached its end; drop that capture
+interrupted_profiler = st.session_state.pop('rerun_profiler', None)
+if interrupted_profiler is not None:
+    interrupted_profiler.stop()
+profile_options = requested_profile()
+if profile_options:
+    from profiling import Profiler
+    rerun_profiler = Profiler(**profile_options)
+    # One capture at a time per process; otherwise this run goes unprofiled
+    if rerun_profiler.start():
+        st.session_state.rerun_profiler = rerun_profiler
+# Analyses run in the sandbox are profiled there; in-process they are part of the run's profile
+analysis_profile_options = profile_options if ANALYSIS_SANDBOX else None
+
 # Main content - Interview Interface
 # Header with title and login
 header_col1, header_col2 = st.columns([8, 1])
@@ -204,8 +493,20 @@ with st.sidebar:
     st.caption("Interview ID: #INT-2024-001")
     st.caption("Duration: Active")
 
+# The page deadline for AI results counts from the start of the run
+page_started = time.monotonic()
+# AI results not finished when their section was drawn: (placeholder, poll, render)
+pending_ai = []
+
 analyzer = CodeAnalyzer()
-bedrock = BedrockHelper()
+# One helper per session so deduplicated conversions and call counters survive reruns
+if 'bedrock' not in st.session_state:
+    st.session_state.bedrock = BedrockHelper()
+bedrock = st.session_state.bedrock
+# Model work runs as cancellable jobs so a superseded request never blocks the next rerun
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = JobManager()
+jobs = st.session_state.jobs
 
 # Get available models
 available_models = bedrock.get_available_models()
@@ -227,300 +528,30 @@ with left_col:
     st.markdown('<div class="interview-header">', unsafe_allow_html=True)
     st.markdown("### 🎥 Live Interview")
     st.markdown("</div>", unsafe_allow_html=True)
-    # Real webcam video interface using browser camera & microphone (getUserMedia)
-    video_placeholder = st.empty()
-    with video_placeholder:
-        video_html = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-            body {
-                margin: 0;
-                padding: 0;
-                background: transparent;
-                font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-            }
-            #video-container {
-                background: #1a1a1a;
-                border-radius: 12px;
-                padding: 0;
-                position: relative;
-                min-height: 320px;
-                overflow: hidden;
-                margin-bottom: 10px;
-                box-shadow: 0 8px 16px rgba(0,0,0,0.3);
-            }
-            #video-area {
-                width: 100%;
-                height: 260px;
-                background: #000;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                position: relative;
-                overflow: hidden;
-            }
-            #localVideo {
-                width: 100%;
-                height: 100%;
-                object-fit: cover;
-                display: none;
-            }
-            #placeholder {
-                width: 100%;
-                height: 100%;
-                background: linear-gradient(135deg, #2c3e50 0%, #34495e 100%);
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                flex-direction: column;
-                color: white;
-            }
-            .avatar {
-                width: 120px;
-                height: 120px;
-                border-radius: 50%;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                margin-bottom: 15px;
-                box-shadow: 0 0 30px rgba(102, 126, 234, 0.5);
-                animation: pulse 2s infinite;
-            }
-            .status-badge {
-                position: absolute;
-                top: 12px;
-                right: 12px;
-                background: rgba(0,0,0,0.65);
-                padding: 6px 12px;
-                border-radius: 20px;
-                display: flex;
-                align-items: center;
-                gap: 6px;
-                font-size: 0.8em;
-                color: #e5e7eb;
-            }
-            .status-dot {
-                width: 8px;
-                height: 8px;
-                border-radius: 50%;
-                background: #ef4444;
-                animation: blink 1.5s infinite;
-            }
-            .quality-badge {
-                position: absolute;
-                bottom: 12px;
-                left: 12px;
-                background: rgba(0,0,0,0.65);
-                padding: 4px 10px;
-                border-radius: 14px;
-                font-size: 0.75em;
-                color: #e5e7eb;
-            }
-            #info-bar {
-                background: #2d3748;
-                padding: 10px 14px;
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                font-size: 0.85em;
-                color: #e5e7eb;
-            }
-            #controls {
-                display: flex;
-                gap: 8px;
-                margin-top: 6px;
-            }
-            .btn {
-                flex: 1;
-                border: none;
-                padding: 8px 10px;
-                border-radius: 999px;
-                cursor: pointer;
-                font-size: 0.85em;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                gap: 6px;
-                background: #111827;
-                color: #e5e7eb;
-            }
-            .btn-primary {
-                background: linear-gradient(135deg, #3b82f6 0%, #6366f1 100%);
-            }
-            .btn-danger {
-                background: #b91c1c;
-            }
-            .btn:disabled {
-                opacity: 0.6;
-                cursor: not-allowed;
-            }
-            .volume-row {
-                display: flex;
-                align-items: center;
-                gap: 8px;
-                margin-top: 6px;
-                font-size: 0.8em;
-                color: #9ca3af;
-            }
-            .volume-row input[type=range] {
-                flex: 1;
-            }
-            @keyframes pulse {
-                0%, 100% { transform: scale(1); opacity: 1; }
-                50% { transform: scale(1.05); opacity: 0.9; }
-            }
-            @keyframes blink {
-                0%, 100% { opacity: 1; }
-                50% { opacity: 0.3; }
-            }
-            </style>
-        </head>
-        <body>
-            <div id="video-container">
-                <div id="video-area">
-                    <video id="localVideo" autoplay playsinline muted></video>
-                    <div id="placeholder">
-                        <div class="avatar">
-                            <span style="font-size: 46px;">👤</span>
-                        </div>
-                        <p style="margin: 0; font-size: 1.05em;">Click <strong>Start Camera</strong> to begin</p>
-                        <p style="margin: 4px 0 0; font-size: 0.85em; opacity: 0.8;">
-                            Your browser will ask for camera & microphone permission
-                        </p>
-                    </div>
-                    <div class="status-badge" id="statusBadge">
-                        <span class="status-dot" id="statusDot"></span>
-                        <span id="statusText">Offline</span>
-                    </div>
-                    <div class="quality-badge" id="qualityBadge">
-                        HD 1080p
-                    </div>
-                </div>
-                <div id="info-bar">
-                    <div>📹 Candidate Video Stream</div>
-                    <div id="audioIndicator">🎤 Audio: On</div>
-                </div>
-            </div>
-            <div id="controls">
-                <button class="btn btn-primary" id="camBtn" onclick="toggleCamera()">▶ Start Camera</button>
-                <button class="btn" id="micBtn" onclick="toggleMic()" disabled>🎤 Mute</button>
-                <button class="btn btn-danger" id="endBtn" onclick="endCall()" disabled>📞 End</button>
-            </div>
-            <div class="volume-row">
-                <span>🔊 Volume</span>
-                <input id="volSlider" type="range" min="0" max="100" value="70" oninput="setVolume(this.value)">
-                <span id="volLabel">70%</span>
-            </div>
-            <script>
-            let localStream = null;
-            let videoOn = false;
-            let micMuted = false;
-
-            const videoEl = document.getElementById('localVideo');
-            const placeholderEl = document.getElementById('placeholder');
-            const statusDot = document.getElementById('statusDot');
-            const statusText = document.getElementById('statusText');
-            const audioIndicator = document.getElementById('audioIndicator');
-            const camBtn = document.getElementById('camBtn');
-            const micBtn = document.getElementById('micBtn');
-            const endBtn = document.getElementById('endBtn');
-            const volLabel = document.getElementById('volLabel');
-
-            async function startCamera() {
-                try {
-                    localStream = await navigator.mediaDevices.getUserMedia({
-                        video: { width: { ideal: 1280 }, height: { ideal: 720 }, facingMode: 'user' },
-                        audio: true
-                    });
-                    videoEl.srcObject = localStream;
-                    videoEl.style.display = 'block';
-                    videoEl.volume = 0.7;
-                    placeholderEl.style.display = 'none';
-                    statusDot.style.background = '#22c55e';
-                    statusText.textContent = 'Live';
-                    audioIndicator.textContent = '🎤 Audio: On';
-                    camBtn.textContent = '⏸ Stop Camera';
-                    videoOn = true;
-                    micBtn.disabled = false;
-                    endBtn.disabled = false;
-                } catch (err) {
-                    console.error('Error accessing camera/microphone:', err);
-                    alert('Unable to access camera or microphone.\\n\\nPlease check browser permissions and that your devices are not in use by another app.\\n\\nError: ' + err.message);
-                }
-            }
-
-            function stopCamera() {
-                if (localStream) {
-                    localStream.getTracks().forEach(t => t.stop());
-                }
-                localStream = null;
-                videoEl.srcObject = null;
-                videoEl.style.display = 'none';
-                placeholderEl.style.display = 'flex';
-                statusDot.style.background = '#ef4444';
-                statusText.textContent = 'Offline';
-                audioIndicator.textContent = '🎤 Audio: Off';
-                camBtn.textContent = '▶ Start Camera';
-                videoOn = false;
-                micMuted = false;
-                micBtn.disabled = true;
-                endBtn.disabled = true;
-            }
-
-            function toggleCamera() {
-                if (!videoOn) {
-                    startCamera();
-                } else {
-                    stopCamera();
-                }
-            }
-
-            function toggleMic() {
-                if (!localStream) return;
-                localStream.getAudioTracks().forEach(t => { t.enabled = !t.enabled; });
-                micMuted = !micMuted;
-                if (micMuted) {
-                    audioIndicator.textContent = '🎤 Audio: Muted';
-                    micBtn.textContent = '🎤 Unmute';
-                } else {
-                    audioIndicator.textContent = '🎤 Audio: On';
-                    micBtn.textContent = '🎤 Mute';
-                }
-            }
-
-            function endCall() {
-                stopCamera();
-                alert('Interview session ended.');
-            }
-
-            function setVolume(v) {
-                if (videoEl) {
-                    videoEl.volume = v / 100;
-                }
-                if (volLabel) {
-                    volLabel.textContent = v + '%';
-                }
-            }
-            </script>
-        </body>
-        </html>
-        """
-        # Increase height so that the volume slider and labels are fully visible
-        components.html(video_html, height=430, scrolling=False)
-
-    # Interview controls (high-level status only; actual media control is handled in the embedded component)
+    # Real webcam video interface using browser camera & microphone (getUserMedia).
+    # Static assets are served once and the iframe stays mounted across reruns,
+    # so code-analysis interactions never restart the camera stream.
+    video_state = video_interview(
+        end_session=st.session_state.video_end_requests,
+        key="video_interview",
+        default={'camera_on': False, 'mic_muted': False}
+    ) or {}
+    
+    # Interview controls; media is handled in the component, which reports its state back
     st.markdown("### 🎛️ Interview Controls")
+    if video_state.get('camera_on'):
+        st.caption("🟢 Camera live" + (" · 🎤 muted" if video_state.get('mic_muted') else ""))
+    else:
+        st.caption("⚪ Camera offline")
     control_col1, control_col2, control_col3 = st.columns(3)
     with control_col1:
         st.button("📝 Add Note", use_container_width=True, key="note_btn")
     with control_col2:
         st.button("⏱ Mark Timestamp", use_container_width=True, key="timestamp_btn")
     with control_col3:
-        if st.button("📞 End Session", use_container_width=True, key="session_end_btn", type="primary"):
-            st.warning("Interview session marked as ended (video can still be controlled in the panel above).")
+        if st.button("📞 End Session", use_container_width=True, key="session_end_btn", type="primary",
+                     on_click=request_video_end):
+            st.warning("Interview session marked as ended.")
     
     st.markdown("---")
     
@@ -537,8 +568,7 @@ with left_col:
     
     if uploaded_file:
         st.success(f"✅ **Received:** {uploaded_file.name}")
-        st.caption(f"📊 File size: {len(uploaded_file.read())} bytes")
-        uploaded_file.seek(0)  # Reset file pointer
+        st.caption(f"📊 File size: {uploaded_file.size} bytes")
     
     # AI Enhancement section
     st.markdown("---")
@@ -561,12 +591,17 @@ with left_col:
             index=default_index,
             help="Choose which AWS Bedrock model to use for AI enhancement"
         )
+        if model_options[selected_model_display] != st.session_state.selected_model_id:
+            # Results for the previous model are no longer wanted
+            jobs.cancel()
         st.session_state.selected_model_id = model_options[selected_model_display]
         
         # Show model info
         selected_model = next((m for m in available_models if m['modelId'] == st.session_state.selected_model_id), None)
         if selected_model:
             st.caption(f"🤖 Provider: {selected_model['providerName']}")
+    else:
+        jobs.cancel()
 
 with right_col:
     # Code Analysis Panel
@@ -587,14 +622,63 @@ with right_col:
         with placeholder_col4:
             st.metric("Functions", "-")
     else:
-        code_bytes = uploaded_file.read()
-        code_text = code_bytes.decode("utf-8", errors="ignore")
+        uploaded_file.seek(0)
+        streamed = uploaded_file.size > STREAM_ANALYSIS_BYTES
+        # Analyse each upload once per session; a degraded (timed out) analysis is not retried on every rerun
+        upload_key = (getattr(uploaded_file, 'file_id', None), uploaded_file.name, uploaded_file.size)
+        cached_analysis = st.session_state.get('upload_analysis')
+        
+        if upload_key[0] is not None and cached_analysis and cached_analysis[0] == upload_key:
+            _, analysis, code_hash = cached_analysis
+        else:
+            with st.spinner("Analyzing code..."):
+                analysis, code_hash = analyze_upload(uploaded_file, streamed, profile=analysis_profile_options)
+            if analysis.get('profile'):
+                save_profile('analysis', analysis.pop('profile'))
+            # The source is kept once, in the analysis' buffer, not next to it
+            st.session_state.upload_analysis = (upload_key, analysis, code_hash)
+            # Indexed once per upload, like the analysis itself; the index only reads static results
+            if SYMBOL_INDEX_DB and not analysis.get('truncated') and not analysis.get('degraded'):
+                get_symbol_index().add(analysis, code_hash, uploaded_file.name, st.session_state.username or '')
+        code_text = upload_source(uploaded_file, analysis, streamed)
         
-        with st.spinner("Analyzing code..."):
-            analysis = analyzer.analyze(code_text, uploaded_file.name)
-            if use_ai and analysis['functions']:
-                with st.spinner(f"Enhancing function summaries with AI ({selected_model_display if use_ai else ''})..."):
-                    analysis = bedrock.enhance_analysis(analysis, st.session_state.selected_model_id)
+        # AI summaries run in the background; static results render without waiting for them
+        summary_progress = None
+        if use_ai and analysis['functions']:
+            model_id = st.session_state.selected_model_id
+            if st.session_state.get('summary_progress_key') != (code_hash, model_id):
+                st.session_state.summary_progress_key = (code_hash, model_id)
+                # Filled in by the enhance job, summary by summary, under each function's index
+                st.session_state.summary_progress = {}
+            progress = st.session_state.summary_progress
+            enhance_job = jobs.submit(
+                "enhance",
+                (code_hash, model_id),
+                lambda: bedrock.aenhance_analysis(dict(analysis), model_id, progress=progress)
+            )
+            enhanced = job_result(enhance_job)
+            if enhanced is not None:
+                analysis = enhanced
+            else:
+                summary_progress = progress
+        
+        if analysis.get('truncated'):
+            st.warning(f"File is larger than {MAX_ANALYSIS_BYTES // (1024 * 1024)} MB; only the first "
+                       f"{analysis['bytes_read'] // (1024 * 1024)} MB were analyzed.")
+        
+        if analysis.get('degraded'):
+            st.warning(f"⚠️ Full analysis was stopped ({analysis['degraded']}); "
+                       f"showing the language and line count only.")
+        
+        similarity_index = get_similarity_index()
+        if similarity_index is not None:
+            matches = similarity_index.query_analysis(analysis)
+            if matches['files'] or matches['functions']:
+                lines = [f"- file ~ `{m['label']}` ({m['similarity']:.0%})" for m in matches['files'][:3]]
+                for func_name, func_matches in matches['functions'].items():
+                    best = func_matches[0]
+                    lines.append(f"- `{func_name}` ~ `{best['label']}:{best['function']}` ({best['similarity']:.0%})")
+                st.warning("🔁 Near-duplicates of known code found:\n" + "\n".join(lines[:10]))
         
         st.subheader("📊 Overview")
         metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
@@ -673,12 +757,10 @@ with right_col:
                     key="target_language_selector",
                     label_visibility="visible"
                 )
-                # Clear conversion cache if target language changed
+                # Stored conversions are keyed by target; only the jobs for the old one need to go
                 if st.session_state.target_language != selected_target:
-                    # Clear all conversion caches
-                    keys_to_remove = [key for key in st.session_state.keys() if key.startswith("converted_")]
-                    for key in keys_to_remove:
-                        del st.session_state[key]
+                    # Abort conversions still running for the old target (and forget failed ones)
+                    jobs.cancel("convert:")
                 st.session_state.target_language = selected_target
         else:
             metric_col1.metric("Language", detected_language)
@@ -686,6 +768,18 @@ with right_col:
         metric_col2.metric("Libraries", len(analysis['libraries']))
         metric_col3.metric("Lines of Code", analysis['loc'])
         metric_col4.metric("Functions", len(analysis['functions']))
+        file_metrics = analysis.get('metrics')
+        # Per-function LOC, nesting and complexity, found by name and first line (1-based)
+        function_metrics = {}
+        if file_metrics:
+            st.caption(
+                f"{file_metrics['code']} code · {file_metrics['comment']} comment · "
+                f"{file_metrics['blank']} blank lines · max nesting {file_metrics['max_nesting']} · "
+                f"complexity {file_metrics['complexity']} (max {file_metrics['max_complexity']} per function)"
+            )
+            for entry in file_metrics['functions']:
+                function_metrics.setdefault((entry['name'], entry['line']), entry)
+                function_metrics.setdefault(entry['name'], entry)
         
         st.subheader("📚 Libraries Used")
         if analysis['libraries']:
@@ -694,33 +788,67 @@ with right_col:
             st.write("— No external libraries detected")
         
         st.subheader("🌳 Code Structure Tree")
-        if analysis.get('tree_graphviz'):
+        code_tree = analysis.get('code_tree')
+        if code_tree:
+            if not isinstance(code_tree, CodeTree):
+                code_tree = CodeTree.from_dicts(code_tree)
+            collapsed = ()
+            if len(code_tree) > TREE_DETAIL_LIMIT:
+                # Level of detail: large trees show classes as method counts until expanded
+                collapsible = code_tree.collapsible()
+                expanded = st.multiselect(
+                    "Expand classes",
+                    collapsible,
+                    key=f"tree_expanded_{code_hash}",
+                    help="Large file: classes are collapsed to their method counts"
+                )
+                collapsed = set(collapsible) - set(expanded)
+            tree_dot = code_tree.to_dot(collapsed=collapsed, max_nodes=TREE_MAX_NODES)
+            # Laid out once per graph on the server; the browser only displays the SVG
+            tree_svg = render_svg(tree_dot)
             try:
-                st.graphviz_chart(analysis['tree_graphviz'])
+                if tree_svg:
+                    st.image(tree_svg)
+                else:
+                    st.graphviz_chart(tree_dot)
             except ImportError:
                 st.warning("Graphviz not installed. Install with: pip install graphviz")
-                tree = analysis.get('code_tree', [])
-                if tree:
-                    tree_text = format_tree_text(tree)
-                    st.code(tree_text, language="text")
-                else:
-                    st.write("📄 (Simple script - no classes or functions)")
+                st.code(format_tree_text(code_tree), language="text")
             except Exception as e:
                 st.error(f"Error rendering tree: {str(e)}")
-                tree = analysis.get('code_tree', [])
-                if tree:
-                    tree_text = format_tree_text(tree)
-                    st.code(tree_text, language="text")
+                st.code(format_tree_text(code_tree), language="text")
         else:
             st.write("📄 (Simple script - no classes or functions)")
         
         st.subheader("🔧 Function Inventory")
-        if analysis['functions']:
+        ai_status = st.empty()
+        if use_ai:
+            # Start every pending conversion up front so they run concurrently
             for func_data in analysis['functions']:
+                if len(func_data) == 3:
+                    func_name, _, func_code = func_data
+                    key = conversion_key(func_code, st.session_state.target_language, detected_language.title())
+                    if bedrock.conversions.get(key) is None:
+                        conversion_job(func_name, func_code, st.session_state.target_language, detected_language.title())
+        if analysis['functions']:
+            for func_index, func_data in enumerate(analysis['functions']):
                 if len(func_data) == 3:
                     func_name, func_summary, func_code = func_data
                     with st.expander(f"`{func_name}`", expanded=False):
-                        st.write(func_summary)
+                        func_line = getattr(func_data, 'start_line', None)
+                        func_metrics = function_metrics.get((func_name, func_line + 1 if func_line is not None else None)) \
+                            or function_metrics.get(func_name)
+                        if func_metrics:
+                            st.caption(f"{func_metrics['loc']} LOC · nesting {func_metrics['max_nesting']} · "
+                                       f"complexity {func_metrics['complexity']}")
+                        if summary_progress is not None and func_summary.startswith(("Function:", "Function with")):
+                            defer_ai_result(
+                                f"AI summary · {func_summary}",
+                                lambda i=func_index: summary_progress.get(i),
+                                st.write
+                            )
+                        else:
+                            st.write(func_summary)
                         
                         # Get language for syntax highlighting
                         detected_language = analysis.get('language', 'python').lower()
@@ -759,69 +887,20 @@ with right_col:
                             
                             # Second tab - converted language
                             with tabs[1]:
-                                # Use a unique key for each function to cache the conversion
-                                conversion_key = f"converted_{func_name}_{target_lang}_{hash(func_code)}"
-                                
-                                if conversion_key not in st.session_state:
-                                    # Convert the code
-                                    with st.spinner(f"Converting {func_name} to {target_lang}..."):
-                                        converted_code = bedrock.convert_function_to_language(
-                                            func_code, 
-                                            target_lang, 
-                                            detected_language.title(),
-                                            st.session_state.selected_model_id
-                                        )
-                                        st.session_state[conversion_key] = converted_code
+                                # Stored per session within a byte budget, backed by the shared response cache
+                                converted_code = bedrock.conversions.get(
+                                    conversion_key(func_code, target_lang, original_lang_display)
+                                )
+                                if converted_code is None:
+                                    job = conversion_job(func_name, func_code, target_lang, original_lang_display)
+                                    converted_code = conversion_result(job)
                                 
-                                converted_code = st.session_state[conversion_key]
-                                
-                                # Check if result is an error
-                                if converted_code.startswith("MODEL_ERROR:"):
-                                    error_msg = converted_code.replace("MODEL_ERROR:", "").strip()
-                                    st.error("⚠️ **Model Error**")
-                                    st.warning(error_msg)
-                                    st.info("💡 **Suggestion**: Please try selecting a different model from the AI Enhancement section (e.g., switch to Titan Text Lite). Some models may have limitations with certain code patterns or languages.")
-                                elif converted_code.startswith("HTTP_ERROR:"):
-                                    error_msg = converted_code.replace("HTTP_ERROR:", "").strip()
-                                    st.error("⚠️ **Connection Error**")
-                                    st.warning(error_msg)
-                                    st.info("💡 **Suggestion**: This is a network or authentication issue, not a model problem. Please check your API key and network connection.")
-                                elif converted_code.startswith("SYSTEM_ERROR:"):
-                                    error_msg = converted_code.replace("SYSTEM_ERROR:", "").strip()
-                                    st.error("⚠️ **System Error**")
-                                    st.warning(error_msg)
-                                    st.info("💡 **Suggestion**: Please try again or contact support if the problem persists.")
-                                elif converted_code.startswith("// Error:") or converted_code.startswith("Error:"):
-                                    st.error(converted_code.replace("// Error:", "").replace("Error:", "").strip())
+                                if converted_code is not None:
+                                    render_conversion(converted_code, target_lang)
                                 else:
-                                    # Map target language to syntax highlighting (40+ languages)
-                                    target_lang_map = {
-                                        # Mainstream Languages
-                                        "Python": "python", "Java": "java", "JavaScript": "javascript",
-                                        "TypeScript": "typescript", "C": "c", "C++": "cpp", "C#": "csharp",
-                                        # Modern Systems Languages
-                                        "Rust": "rust", "Go": "go", "Swift": "swift", 
-                                        "Kotlin": "kotlin", "Dart": "dart", "Zig": "zig",
-                                        # Functional & Scripting
-                                        "Ruby": "ruby", "PHP": "php", "Perl": "perl", 
-                                        "Lua": "lua", "Scala": "scala", "Haskell": "haskell",
-                                        "F#": "fsharp", "Elixir": "elixir",
-                                        # Data Science & Scientific
-                                        "R": "r", "MATLAB": "matlab", "Julia": "julia", "Fortran": "fortran",
-                                        # Web & Frontend
-                                        "HTML": "html", "CSS": "css", "Vue": "vue", 
-                                        "Svelte": "svelte", "CoffeeScript": "coffeescript", "Elm": "elm",
-                                        # Systems & Low-level
-                                        "Assembly": "asm", "Nim": "nim", "Crystal": "crystal", "D": "d",
-                                        # Legacy & Enterprise
-                                        "COBOL": "cobol", "Pascal": "pascal", "Ada": "ada",
-                                        # Other Popular
-                                        "Shell": "bash", "Bash": "bash", "PowerShell": "powershell", 
-                                        "SQL": "sql", "Groovy": "groovy",
-                                        # Functional & Logic
-                                        "Clojure": "clojure", "Erlang": "erlang", "OCaml": "ocaml"
-                                    }
-                                    st.code(converted_code, language=target_lang_map.get(target_lang, "text"))
+                                    defer_ai_result(f"Converting to {target_lang}...",
+                                                    lambda job=job: conversion_result(job),
+                                                    lambda converted_code, target_lang=target_lang: render_conversion(converted_code, target_lang))
                         else:
                             st.code(func_code, language=code_lang)
                 else:
@@ -852,5 +931,41 @@ with right_col:
                 'kotlin': 'kotlin',
             }
             code_lang = lang_map.get(detected_language, 'text')
+            if streamed:
+                st.caption(f"Showing the first {SOURCE_PREVIEW_BYTES // 1024} KB of {uploaded_file.size // 1024} KB")
             st.code(code_text, language=code_lang)
-            
\ No newline at end of file
+
+# AI usage counters for this session
+if use_ai:
+    with st.sidebar:
+        st.caption(f"AI calls: {bedrock.stats['model_calls']} · saved by deduplication: {bedrock.stats['saved_calls']}"
+                   f" · from cache: {bedrock.stats['cache_hits']}")
+        if bedrock.stats['input_tokens'] or bedrock.stats['output_tokens']:
+            st.caption(f"Tokens: {bedrock.stats['input_tokens']:,} in · {bedrock.stats['output_tokens']:,} out")
+        store = bedrock.conversions.usage()
+        st.caption(f"Session memory: {store['bytes'] / 1024:,.0f} KB of {store['max_bytes'] / 1024:,.0f} KB"
+                   f" · {store['entries']} conversion(s) kept · {store['evictions']} evicted")
+        queued = sum(bedrock.scheduler.waiting().values())
+        if queued:
+            st.caption(f"{queued} AI request(s) waiting for the shared Bedrock quota")
+
+# Everything static is on the page; now fill in AI results as they arrive
+if pending_ai:
+    fill_pending_ai(ai_status, page_started + AI_PAGE_DEADLINE)
+
+rerun_profiler = st.session_state.pop('rerun_profiler', None)
+if rerun_profiler is not None:
+    rerun_report = rerun_profiler.stop()
+    if rerun_report is not None:
+        save_profile('rerun', rerun_report)
+if is_admin():
+    with st.sidebar:
+        profiling_panel()
+if pending_ai:
+    @st.fragment(run_every=AI_REFRESH_SECONDS)
+    def refresh_when_ready():
+        """Rerun the page once another pending AI result has arrived"""
+        if any(poll() is not None for _, poll, _ in pending_ai):
+            st.rerun()
+    
+    refresh_when_ready()
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+
+# One long-lived event loop per process, running in a daemon thread. Sync
+# callers (the Streamlit script thread) hand coroutines to it, so pooled
+# HTTP connections and semaphores outlive a single call.
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared background event loop, starting it on first use"""
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name="async-runtime", daemon=True)
+            _thread.start()
+    return _loop
+
+
+def in_loop_thread() -> bool:
+    """Whether the caller is running on the background loop itself"""
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def submit(coro: Coroutine):
+    """Schedule a coroutine on the background loop and return a concurrent Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the background loop and block until it finishes"""
+    if in_loop_thread():
+        coro.close()
+        raise RuntimeError("run_sync() called from the background loop; await the coroutine instead")
+    future = submit(coro)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        # Timeouts and interrupts of the waiting thread cancel the coroutine too
+        future.cancel()
+        raise
@@ -1,45 +1,225 @@
 import os
-import boto3
+import re
+import sys
 import json
-from dotenv import load_dotenv
-from typing import Dict
-import requests
+import time
+import random
+import asyncio
+import hashlib
+import weakref
+import functools
+from typing import Awaitable, Callable, Dict, Optional
 
-parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-env_path = os.path.join(parent_dir, '.env')
-if os.path.exists(env_path):
-    load_dotenv(env_path)
-else:
-    load_dotenv()
+from async_runtime import run_sync
+from code_analyzer import CodeAnalyzer
+from model_response import ModelResponse
+from model_router import AUTO_MODEL_ID, ModelRouter, default_router
+from quota_scheduler import BACKGROUND, INTERACTIVE, QuotaScheduler, default_scheduler
+from region_pool import RegionPool, default_pool
+from session_store import SessionStore
+from source_buffer import FunctionRecord
+
+# boto3, requests and python-dotenv are imported on first AI use so that
+# importing this module (and starting a Streamlit worker) stays cheap.
+_env_loaded = False
+
+
+def _load_env():
+    """Load the .env file once, on first use"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    from dotenv import load_dotenv
+    parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env_path = os.path.join(parent_dir, '.env')
+    if os.path.exists(env_path):
+        load_dotenv(env_path)
+    else:
+        load_dotenv()
+    _env_loaded = True
+
+
+@functools.lru_cache(maxsize=None)
+def _get_boto3_client(region: str, profile: str = '', access_key_id: str = ''):
+    """Create one bedrock-runtime client per region and credential set"""
+    # access_key_id is only part of the cache key; boto3 reads it from the environment
+    import boto3
+    session = boto3.session.Session(profile_name=profile or None)
+    return session.client('bedrock-runtime', region_name=region)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_http_session(region: str, bearer_token: str):
+    """Create one pooled HTTP session per region and bearer token"""
+    import requests
+    return requests.Session()
+
+
+# event loop -> {(keep-alive connections, timeout): httpx.AsyncClient}, shared by every helper on the loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _get_async_client(connections: int, timeout: float):
+    """Return the pooled async HTTP client for the running loop and this configuration"""
+    import httpx
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get((connections, timeout))
+    if client is None:
+        # Each helper bounds its own calls with its semaphore and the scheduler bounds them
+        # all, so the pool only caps the idle connections it keeps
+        client = clients[(connections, timeout)] = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=connections),
+            timeout=timeout
+        )
+    return client
+
+
+def _is_http_error(e: Exception) -> bool:
+    """Check for a requests/httpx HTTP status error without importing either"""
+    requests = sys.modules.get('requests')
+    if requests is not None and isinstance(e, requests.exceptions.HTTPError):
+        return True
+    httpx = sys.modules.get('httpx')
+    return httpx is not None and isinstance(e, httpx.HTTPStatusError)
+
+
+def _should_fail_over(e: Exception) -> bool:
+    """Whether another region might succeed where this error came from"""
+    response = getattr(e, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is not None:
+        # Throttling, server errors, and model access (which is granted per region)
+        return status in (403, 408, 429) or status >= 500
+    if isinstance(response, dict) and 'Error' in response:
+        # botocore ClientError: a malformed request fails the same way everywhere
+        return response['Error'].get('Code') != 'ValidationException'
+    return not isinstance(e, (ValueError, TypeError, KeyError))
+
+
+def _parse_region_latency(value: str) -> Dict[str, Optional[float]]:
+    """Parse BEDROCK_MOCK_REGION_LATENCY, e.g. 'us-east-1=0.5,eu-west-1=down'"""
+    latencies = {}
+    for item in value.split(','):
+        if '=' in item:
+            region, latency = item.split('=', 1)
+            latencies[region.strip()] = None if latency.strip() == 'down' else float(latency)
+    return latencies
+
+
+def _env_flag(name: str) -> bool:
+    """Read a boolean environment variable"""
+    return os.getenv(name, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _has_httpx() -> bool:
+    """Whether the optional non-blocking HTTP client is installed"""
+    try:
+        import httpx  # noqa: F401
+        return True
+    except ImportError:
+        return False
 
 
 class BedrockHelper:
-    def __init__(self):
+    # Part of every body key; bumped when normalize_code changes, so cached answers keyed the old way are not reused
+    BODY_KEY_VERSION = 2
+    
+    def __init__(self, region: str = 'us-west-2', router: ModelRouter = None,
+                 max_concurrency: int = None, call_timeout: float = 60.0, mock: bool = None,
+                 scheduler: QuotaScheduler = None, session_id: str = None, response_cache=None,
+                 regions: RegionPool = None):
+        # Regions to call (BEDROCK_REGIONS), with health tracking and hedging shared across sessions
+        self.regions = regions or default_pool(region)
+        self.region = self.regions.regions[0]
+        # Mock mode answers locally without AWS (BEDROCK_MOCK=1); used for load tests
+        self.mock = mock
+        self.mock_latency = float(os.getenv('BEDROCK_MOCK_LATENCY', '0.2'))
+        # Injected delays: per-region latency ('down' fails every call) and a slow tail of calls
+        self.mock_region_latency = _parse_region_latency(os.getenv('BEDROCK_MOCK_REGION_LATENCY', ''))
+        self.mock_tail_rate = float(os.getenv('BEDROCK_MOCK_TAIL_RATE', '0'))
+        self.mock_tail_latency = float(os.getenv('BEDROCK_MOCK_TAIL_LATENCY', '2.0'))
+        # Concurrent model calls per event loop, and the default per-call deadline in seconds
+        self.max_concurrency = max_concurrency or int(os.getenv('BEDROCK_MAX_CONCURRENCY', '4'))
+        self.call_timeout = call_timeout
+        # Semaphore and HTTP client per event loop (both are bound to the loop that created them);
+        # the client is shared with every other helper on that loop
+        self._loop_state = weakref.WeakKeyDictionary()
+        self.router = router or default_router
+        # Per-model request quota shared with every other session in the process
+        self.scheduler = scheduler or default_scheduler
+        self.session_id = session_id or os.urandom(8).hex()
+        self._auth_resolved = False
+        self.bearer_token = None
+        self.use_bearer_token = False
+        self._analyzer = CodeAnalyzer()
+        # Successful conversions this session has used, within a byte budget; evicted ones
+        # are read back from the response cache instead of being requested again
+        self.conversions = SessionStore(int(os.getenv('SESSION_STORE_BYTES', str(2 * 1024 * 1024))),
+                                        load=self._load_cached)
+        # Persistent responses shared across sessions (response_cache.py); resolved on first use
+        self._response_cache = response_cache
+        self._cache_resolved = response_cache is not None
+        # model_calls: requests sent to Bedrock; saved_calls: requests skipped as duplicates;
+        # cache_hits: requests answered from the persistent response cache; tokens as reported by the models
+        self.stats = {'model_calls': 0, 'saved_calls': 0, 'cache_hits': 0, 'input_tokens': 0, 'output_tokens': 0}
+        # Per model: calls, tokens and seconds spent on the wire
+        self.usage: Dict[str, Dict[str, float]] = {}
+    
+    def _resolve_auth(self):
+        """Pick the authentication mode on first use"""
+        if self._auth_resolved:
+            return
+        _load_env()
+        if self.mock is None:
+            self.mock = _env_flag('BEDROCK_MOCK')
         # Check for bearer token authentication
         bearer_token = os.getenv('AWS_BEARER_TOKEN_BEDROCK')
         if bearer_token:
-            # Use bearer token authentication
+            # Use bearer token authentication (direct HTTP requests)
             self.bearer_token = bearer_token
             self.use_bearer_token = True
-            self.region = 'us-west-2'
-            self.bedrock_runtime = None  # Will use direct HTTP requests
         else:
             # Use default AWS credentials
             self.use_bearer_token = False
-            self.bedrock_runtime = boto3.client('bedrock-runtime', region_name='us-west-2')
+        self._auth_resolved = True
+    
+    @property
+    def response_cache(self):
+        """Persistent response cache, or None when BEDROCK_RESPONSE_CACHE is empty"""
+        if not self._cache_resolved:
+            self._resolve_auth()
+            from response_cache import default_cache
+            self._response_cache = default_cache()
+            self._cache_resolved = True
+        return self._response_cache
     
-    def _invoke_model_with_bearer_token(self, model_id: str, body: dict) -> dict:
+    @property
+    def bedrock_runtime(self):
+        """boto3 bedrock-runtime client, or None in bearer token mode"""
+        self._resolve_auth()
+        if self.use_bearer_token:
+            return None
+        return _get_boto3_client(
+            self.region,
+            os.getenv('AWS_PROFILE', ''),
+            os.getenv('AWS_ACCESS_KEY_ID', '')
+        )
+    
+    def _invoke_model_with_bearer_token(self, model_id: str, body: dict, region: str = None) -> ModelResponse:
         """Invoke Bedrock model using bearer token authentication"""
-        url = f"https://bedrock-runtime.{self.region}.amazonaws.com/model/{model_id}/invoke"
+        import requests
+        region = region or self.region
+        url = f"https://bedrock-runtime.{region}.amazonaws.com/model/{model_id}/invoke"
         headers = {
             'Authorization': f'Bearer {self.bearer_token}',
             'Content-Type': 'application/json',
             'Accept': 'application/json'
         }
         try:
-            response = requests.post(url, headers=headers, json=body, timeout=60)
+            session = _get_http_session(region, self.bearer_token)
+            response = session.post(url, headers=headers, json=body, timeout=60)
             response.raise_for_status()
-            return response.json()
+            return ModelResponse.from_bytes(model_id, response.content)
         except requests.exceptions.HTTPError as e:
             # Re-raise HTTP errors to be handled by the caller
             raise
@@ -47,57 +227,405 @@ class BedrockHelper:
             # Handle other request errors
             raise Exception(f"Request failed: {str(e)}")
     
-    def _invoke_model(self, model_id: str, body: dict, content_type: str = 'application/json'):
+    def _invoke_model(self, model_id: str, body: dict, content_type: str = 'application/json',
+                      region: str = None) -> ModelResponse:
         """Unified method to invoke model with either bearer token or boto3"""
+        self._resolve_auth()
         if self.use_bearer_token:
-            result = self._invoke_model_with_bearer_token(model_id, body)
-            # Convert to boto3-like response format
-            class ResponseBody:
-                def __init__(self, data):
-                    self.data = data
-                def read(self):
-                    return json.dumps(self.data).encode('utf-8')
-            return {'body': ResponseBody(result)}
+            return self._invoke_model_with_bearer_token(model_id, body, region)
         else:
-            return self.bedrock_runtime.invoke_model(
+            client = self.bedrock_runtime if region in (None, self.region) else _get_boto3_client(
+                region,
+                os.getenv('AWS_PROFILE', ''),
+                os.getenv('AWS_ACCESS_KEY_ID', '')
+            )
+            response = client.invoke_model(
                 modelId=model_id,
                 body=json.dumps(body),
                 contentType=content_type
             )
+            return ModelResponse.from_bytes(model_id, response['body'].read())
+    
+    def _state_for_loop(self) -> Dict:
+        """Semaphore and pooled async HTTP client for the running event loop"""
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.get(loop)
+        if state is None:
+            state = {'semaphore': asyncio.Semaphore(self.max_concurrency), 'client': None}
+            self._loop_state[loop] = state
+        if state['client'] is None and self.use_bearer_token and not self.mock and _has_httpx():
+            # Room for a hedge next to every call in flight
+            connections = self.max_concurrency * (2 if self.regions.hedge else 1)
+            state['client'] = _get_async_client(connections, self.call_timeout)
+        return state
+    
+    async def _ainvoke_model_with_bearer_token(self, client, model_id: str, body: dict,
+                                               region: str = None) -> ModelResponse:
+        """Invoke Bedrock model over the non-blocking HTTP client"""
+        import httpx
+        url = f"https://bedrock-runtime.{region or self.region}.amazonaws.com/model/{model_id}/invoke"
+        headers = {
+            'Authorization': f'Bearer {self.bearer_token}',
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+        try:
+            response = await client.post(url, headers=headers, json=body)
+            response.raise_for_status()
+            return ModelResponse.from_bytes(model_id, response.content)
+        except httpx.HTTPStatusError:
+            # Re-raise HTTP errors to be handled by the caller
+            raise
+        except httpx.HTTPError as e:
+            raise Exception(f"Request failed: {str(e)}")
+    
+    async def _ainvoke_model(self, model_id: str, body: dict, content_type: str = 'application/json',
+                             deadline: Optional[float] = None, priority: int = BACKGROUND) -> ModelResponse:
+        """Async _invoke_model with a quota, a concurrency limit and a per-call deadline
+        
+        deadline is an absolute time.monotonic() value; the call also never
+        runs longer than call_timeout. Time spent queued for the model's quota
+        counts against the deadline. Cancelling the awaiting task aborts
+        the HTTP request (boto3 calls run in a worker thread and are abandoned).
+        The request itself is hedged and failed over across regions
+        (_ainvoke_regions).
+        """
+        self._resolve_auth()
+        state = self._state_for_loop()
+        timeout = self.call_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            raise TimeoutError("Model call deadline already passed")
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self.scheduler.acquire(model_id, self.session_id, priority), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Model call deadline passed after waiting {timeout:.1f}s for the {model_id} quota")
+        async with state['semaphore']:
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                raise TimeoutError(f"Model call deadline passed after waiting {timeout:.1f}s for a free slot")
+            self.stats['model_calls'] += 1
+            sent = time.monotonic()
+            try:
+                response = await self._ainvoke_regions(state, model_id, body, content_type, remaining)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Model call exceeded its {timeout:.1f}s deadline")
+        response.latency = time.monotonic() - sent
+        self._record_usage(response)
+        return response
+    
+    async def _ainvoke_region(self, state: Dict, region: str, model_id: str, body: dict,
+                              content_type: str) -> ModelResponse:
+        """One request to one region, with its latency or failure fed back to the region pool"""
+        if self.mock:
+            call = self._amock_invoke(model_id, body, region)
+        elif state['client'] is not None:
+            call = self._ainvoke_model_with_bearer_token(state['client'], model_id, body, region)
+        else:
+            # boto3 (or requests without httpx) is blocking; keep it off the event loop
+            call = asyncio.to_thread(self._invoke_model, model_id, body, content_type, region)
+        start = time.monotonic()
+        try:
+            response = await call
+        except Exception as e:
+            self.regions.record(region, time.monotonic() - start, ok=not _should_fail_over(e))
+            raise
+        self.regions.record(region, time.monotonic() - start)
+        return response
+    
+    async def _ainvoke_regions(self, state: Dict, model_id: str, body: dict, content_type: str,
+                               timeout: float) -> ModelResponse:
+        """Send to the best region; hedge to the next one past its p95 latency, fail over on errors
+        
+        The first successful response wins and any request still running is
+        cancelled (a cancelled request is not a latency sample). Errors that
+        another region would repeat (bad requests) are raised at once. After
+        `timeout` seconds the regions still running are recorded as timed
+        out and asyncio.TimeoutError is raised.
+        """
+        regions = self.regions.ordered()
+        self.regions.count('calls')
+        # task -> (kind, region, start time)
+        running = {}
+        error = None
+        next_region = 0
+        
+        def send(kind: str):
+            nonlocal next_region
+            region = regions[next_region % len(regions)]
+            next_region += 1
+            task = asyncio.ensure_future(self._ainvoke_region(state, region, model_id, body, content_type))
+            running[task] = (kind, region, time.monotonic())
+        
+        deadline = time.monotonic() + timeout
+        send('primary')
+        hedge_after = self.regions.hedge_after(regions[0])
+        hedge_at = None if hedge_after is None else time.monotonic() + hedge_after
+        try:
+            while running:
+                wake = deadline if hedge_at is None else min(hedge_at, deadline)
+                done, _ = await asyncio.wait(running, timeout=max(0.0, wake - time.monotonic()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    now = time.monotonic()
+                    if hedge_at is None or now >= deadline:
+                        for _, region, started in running.values():
+                            self.regions.timed_out(region, now - started)
+                        raise asyncio.TimeoutError()
+                    # Past the primary region's p95: duplicate the request
+                    hedge_at = None
+                    self.regions.count('hedges')
+                    send('hedge')
+                    continue
+                for task in done:
+                    kind, _, _ = running.pop(task)
+                    if task.exception() is None:
+                        if kind == 'hedge':
+                            self.regions.count('hedge_wins')
+                        return task.result()
+                    error = task.exception()
+                    if not _should_fail_over(error):
+                        raise error
+                    if next_region < len(regions):
+                        self.regions.count('failovers')
+                        send('failover')
+            raise error
+        finally:
+            for task in running:
+                task.cancel()
+    
+    def _record_usage(self, response: ModelResponse):
+        """Add a response's tokens and wire time to the helper's counters"""
+        self.stats['input_tokens'] += response.input_tokens
+        self.stats['output_tokens'] += response.output_tokens
+        usage = self.usage.setdefault(response.model_id, {'calls': 0, 'input_tokens': 0, 'output_tokens': 0, 'seconds': 0.0})
+        usage['calls'] += 1
+        usage['input_tokens'] += response.input_tokens
+        usage['output_tokens'] += response.output_tokens
+        usage['seconds'] += response.latency
+    
+    async def _amock_invoke(self, model_id: str, body: dict, region: str = None) -> ModelResponse:
+        """Offline stand-in for Bedrock that answers in the provider's response format"""
+        latency = self.mock_region_latency.get(region, self.mock_latency)
+        if latency is None:
+            raise ConnectionError(f"Mock region {region} is down")
+        if self.mock_tail_rate and random.random() < self.mock_tail_rate:
+            latency += self.mock_tail_latency
+        await asyncio.sleep(latency)
+        prompt = body['messages'][0]['content'] if 'messages' in body else body.get('inputText', '')
+        conversion = re.search(r'function to (.+?)\. .*?code:\n(.*)\n\nConverted', prompt, re.S)
+        if conversion:
+            target, code = conversion.groups()
+            text = f"// Mock {target} conversion\n" + '\n'.join('// ' + line for line in code.splitlines())
+        else:
+            text = f"Mock summary of a {len(prompt.splitlines())}-line prompt."
+        if 'claude' in model_id.lower():
+            payload = {'content': [{'type': 'text', 'text': text}], 'stop_reason': 'end_turn',
+                       'usage': {'input_tokens': len(prompt) // 4, 'output_tokens': len(text) // 4}}
+        else:
+            payload = {'inputTextTokenCount': len(prompt) // 4,
+                       'results': [{'tokenCount': len(text) // 4, 'outputText': text, 'completionReason': 'FINISH'}]}
+        return ModelResponse.from_payload(model_id, payload)
+    
+    async def aclose(self):
+        """Close the pooled HTTP clients of the running event loop
+        
+        The clients are shared by every helper on the loop, so only the owner
+        of a short-lived loop (such as precompute.py) should call this; the
+        app's background loop keeps one pool for the life of the process.
+        """
+        loop = asyncio.get_running_loop()
+        self._loop_state.pop(loop, None)
+        for client in _async_clients.pop(loop, {}).values():
+            await client.aclose()
     
     def get_available_models(self):
         """Get list of available Bedrock foundation models"""
-        # Return a conservative list of well-tested models
-        # Default model (amazon.titan-text-lite-v1) is first
-        return [
-            {'modelId': 'amazon.titan-text-lite-v1', 'modelName': 'Amazon Titan Text Lite', 'providerName': 'Amazon'},
-            {'modelId': 'amazon.titan-text-express-v1', 'modelName': 'Amazon Titan Text Express', 'providerName': 'Amazon'},
-        ]
+        # The models the router may use (BEDROCK_MODELS); the default, amazon.titan-text-lite-v1, is first,
+        # followed by the router
+        models = [{'modelId': m['modelId'], 'modelName': m['modelName'], 'providerName': m['providerName']}
+                  for m in self.router.models]
+        models.insert(1, {'modelId': AUTO_MODEL_ID, 'modelName': 'Auto (route by task and size)', 'providerName': 'Router'})
+        return models
+    
+    async def _acall_with_routing(self, task: str, func_code: str, model_id: str,
+                                  call: Callable[[str], Awaitable[str]], deadline: Optional[float] = None) -> str:
+        """Await call(model_id), routing and falling back between models when model_id is 'auto'
+        
+        Any failed result (model errors, access denied, throttling, timeouts)
+        moves on to the next candidate, unless the request's own deadline
+        has passed: no other model could answer in time either.
+        """
+        if model_id == AUTO_MODEL_ID:
+            candidates = self.router.route(task, func_code)
+        else:
+            candidates = [model_id]
+        result = ""
+        for candidate in candidates:
+            start = time.perf_counter()
+            result = await call(candidate)
+            ok = not self._is_failed(task, result)
+            self.router.record(candidate, time.perf_counter() - start, ok)
+            if ok or (deadline is not None and time.monotonic() >= deadline):
+                break
+        return result
+    
+    @staticmethod
+    def _is_failed(task: str, result: str) -> bool:
+        """Whether a result is an error or fallback that should be retried rather than reused"""
+        if task == 'conversion':
+            return result.startswith(("MODEL_ERROR:", "HTTP_ERROR:", "SYSTEM_ERROR:", "// Error:"))
+        return result.startswith("Function:")
+    
+    def cache_key(self, task: str, model_id: str, *parts: str) -> str:
+        """Response cache key; mock answers never share keys with real ones"""
+        from response_cache import ResponseCache
+        self._resolve_auth()
+        return ResponseCache.key(task, f"mock:{model_id}" if self.mock else model_id, *parts)
+    
+    def _load_cached(self, key: str) -> Optional[str]:
+        cache = self.response_cache
+        return cache.get(key) if cache is not None else None
+    
+    def summary_cache_key(self, func_code: str, language: str, model_id: str) -> str:
+        return self.cache_key('summary', model_id, self._body_key(func_code, language), language)
+    
+    def conversion_cache_key(self, func_code: str, target_language: str, source_language: str, model_id: str) -> str:
+        return self.cache_key('conversion', model_id, self._body_key(func_code, source_language),
+                              target_language, source_language)
+    
+    async def _acached(self, task: str, model_id: str, key: str, call: Callable[[], Awaitable[str]]) -> str:
+        """Answer from the response cache, or await call() and cache a successful result"""
+        cache = self.response_cache
+        if cache is None:
+            return await call()
+        # SQLite reads and commits block; the cache is thread-safe, so keep them off the event loop
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+        result = await call()
+        if not self._is_failed(task, result):
+            await asyncio.to_thread(cache.put, key, task, model_id, result)
+        return result
     
     def enhance_analysis(self, analysis: Dict, model_id: str = 'amazon.titan-text-lite-v1') -> Dict:
+        """Sync wrapper around aenhance_analysis"""
+        return run_sync(self.aenhance_analysis(analysis, model_id))
+    
+    async def aenhance_analysis(self, analysis: Dict, model_id: str = 'amazon.titan-text-lite-v1',
+                                deadline: Optional[float] = None,
+                                progress: Optional[Dict[int, str]] = None) -> Dict:
+        """Generate missing function summaries concurrently
+        
+        If progress is given, each summary is stored there under its
+        function's index as soon as it arrives, so callers can show partial
+        results while the rest are still running.
+        """
         try:
             language = analysis.get('language', 'Unknown')
-            enhanced_functions = []
-            for func_data in analysis['functions']:
+            # One model call per unique (normalised) body, fanned back out to duplicates
+            summaries = {}
+            # (function, body key of its pending summary or None)
+            slots = []
+            # body key -> indexes of the functions waiting for that summary
+            waiting = {}
+            for index, func_data in enumerate(analysis['functions']):
+                body_key = None
                 if len(func_data) == 3:
-                    func_name, func_summary, func_code = func_data
-                    # Enhance summary for any language
+                    func_name, func_summary = func_data[0], func_data[1]
+                    # Enhance summary for any language; the code is only read for these
                     if func_summary.startswith("Function:") or func_summary.startswith("Function with"):
-                        enhanced_summary = self._generate_function_summary(func_name, func_code, language, model_id)
-                        enhanced_functions.append((func_name, enhanced_summary, func_code))
-                    else:
-                        enhanced_functions.append((func_name, func_summary, func_code))
-                else:
-                    # Backward compatibility
+                        func_code = func_data[2]
+                        body_key = self._body_key(func_code, language)
+                        if body_key in summaries:
+                            self.stats['saved_calls'] += 1
+                        else:
+                            summaries[body_key] = self.asummarize_function(func_name, func_code, language,
+                                                                           model_id, deadline=deadline)
+                        waiting.setdefault(body_key, []).append(index)
+                # Functions with docstrings, and old 2-tuples, are kept as they are
+                slots.append((func_data, body_key))
+            
+            if progress is not None:
+                summaries = {key: self._publish(call, waiting[key], progress) for key, call in summaries.items()}
+            results = dict(zip(summaries, await asyncio.gather(*summaries.values())))
+            enhanced_functions = []
+            for func_data, body_key in slots:
+                if body_key is None:
                     enhanced_functions.append(func_data)
+                elif isinstance(func_data, FunctionRecord):
+                    enhanced_functions.append(func_data.with_summary(results[body_key]))
+                else:
+                    func_name, _, func_code = func_data
+                    enhanced_functions.append((func_name, results[body_key], func_code))
             
             analysis['functions'] = enhanced_functions
             return analysis
         except Exception:
             return analysis
     
+    @staticmethod
+    async def _publish(call: Awaitable[str], indexes, progress: Dict[int, str]) -> str:
+        """Await a summary and store it in progress for every function that shares it"""
+        summary = await call
+        for index in indexes:
+            progress[index] = summary
+        return summary
+    
+    async def asummarize_function(self, func_name: str, func_code: str, language: str = "Python",
+                                  model_id: str = 'amazon.titan-text-lite-v1',
+                                  deadline: Optional[float] = None) -> str:
+        """One-sentence summary of a function, from the response cache when possible"""
+        return await self._acached(
+            'summary', model_id, self.summary_cache_key(func_code, language, model_id),
+            lambda: self._acall_with_routing(
+                'summary', func_code, model_id,
+                functools.partial(self._agenerate_function_summary, func_name, func_code,
+                                  language, deadline=deadline),
+                deadline
+            )
+        )
+    
     def convert_function_to_language(self, func_code: str, target_language: str, source_language: str = "Python", model_id: str = 'amazon.titan-text-lite-v1') -> str:
         """Convert function from source language to target language using Bedrock"""
+        return run_sync(self.aconvert_function_to_language(func_code, target_language, source_language, model_id))
+    
+    async def aconvert_function_to_language(self, func_code: str, target_language: str, source_language: str = "Python",
+                                            model_id: str = 'amazon.titan-text-lite-v1',
+                                            deadline: Optional[float] = None) -> str:
+        """Async convert_function_to_language"""
+        key = self.conversion_cache_key(func_code, target_language, source_language, model_id)
+        # A single get(): an entry found by a separate membership test may be evicted before it is read.
+        # Entries missing from memory are read back from the response cache by _acached, off the event loop.
+        converted = self.conversions.get(key, load=False)
+        if converted is not None:
+            self.stats['saved_calls'] += 1
+            return converted
+        converted = await self._acached(
+            'conversion', model_id, key,
+            lambda: self._acall_with_routing(
+                'conversion', func_code, model_id,
+                functools.partial(self._aconvert_with_model, func_code, target_language, source_language,
+                                  deadline=deadline),
+                deadline
+            )
+        )
+        # Only successful conversions are reused; errors should be retried
+        if not self._is_failed('conversion', converted):
+            self.conversions.put(key, converted)
+        return converted
+    
+    def _body_key(self, func_code: str, language: str) -> str:
+        """Hash of a function body with comments and whitespace normalised away"""
+        normalized = self._analyzer.normalize_code(func_code, language)
+        return hashlib.sha1(f"{self.BODY_KEY_VERSION}\0{normalized}".encode('utf-8')).hexdigest()
+    
+    async def _aconvert_with_model(self, func_code: str, target_language: str, source_language: str, model_id: str,
+                                   deadline: Optional[float] = None) -> str:
+        """Convert a function with one specific model"""
         try:
             # Clean and prepare the code
             code_lines = func_code.strip().split('\n')
@@ -117,7 +645,8 @@ Converted {target_language} code:"""
             
             # Check if it's a Claude model (different API format)
             if 'claude' in model_id.lower():
-                return self._invoke_claude_model(model_id, prompt, max_tokens=400)
+                return await self._ainvoke_claude_model(model_id, prompt, max_tokens=400, deadline=deadline,
+                                                        priority=INTERACTIVE)
             else:
                 # Titan and other models
                 request_body = {
@@ -128,66 +657,56 @@ Converted {target_language} code:"""
                         "topP": 0.9
                     }
                 }
-                response = self._invoke_model(model_id, request_body)
-                result = json.loads(response['body'].read())
+                response = await self._ainvoke_model(model_id, request_body, deadline=deadline,
+                                                     priority=INTERACTIVE)
                 
-                # Check for errors in response (top level)
-                if 'message' in result:
-                    error_msg = result.get('message', 'Unknown error')
+                # Errors the model returned instead of an answer
+                if response.error:
+                    error_msg = response.error
                     # Check if it's the specific "unable to respond" error
                     if 'unable to respond' in error_msg.lower() or 'sorry' in error_msg.lower():
                         return f"MODEL_ERROR: The current model cannot process this request. Please try selecting a different model (e.g., Titan Text Lite) or simplify the code."
                     return f"MODEL_ERROR: {error_msg}"
                 
-                # Check for results array
-                if 'results' in result and len(result['results']) > 0:
-                    first_result = result['results'][0]
+                output_text = response.text
+                if output_text and output_text.strip():
+                    # Clean up the output - remove any explanatory text
+                    output = output_text.strip()
                     
-                    # Check for error message in result
-                    if 'message' in first_result:
-                        error_msg = first_result['message']
-                        if 'unable to respond' in error_msg.lower() or 'sorry' in error_msg.lower():
-                            return f"MODEL_ERROR: The current model cannot process this request. Please try selecting a different model (e.g., Titan Text Lite) or simplify the code."
-                        return f"MODEL_ERROR: {error_msg}"
+                    # Check if output contains error messages (non-model related errors)
+                    # Only check for specific error patterns, not generic words that might appear in code
+                    error_patterns = [
+                        'sorry - this model',
+                        'sorry, this model',
+                        'unable to respond',
+                        'cannot process this request',
+                        'this model is unable'
+                    ]
+                    output_lower = output.lower()
+                    # Check if the output is primarily an error message (short and contains error patterns)
+                    if len(output) < 200 and any(pattern in output_lower for pattern in error_patterns):
+                        # This is likely an error message from the model
+                        return f"MODEL_ERROR: {output}"
                     
-                    # Get output text
-                    output_text = first_result.get('outputText', '')
-                    if output_text and output_text.strip():
-                        # Clean up the output - remove any explanatory text
-                        output = output_text.strip()
-                        
-                        # Check if output contains error messages (non-model related errors)
-                        # Only check for specific error patterns, not generic words that might appear in code
-                        error_patterns = [
-                            'sorry - this model',
-                            'sorry, this model',
-                            'unable to respond',
-                            'cannot process this request',
-                            'this model is unable'
-                        ]
-                        output_lower = output.lower()
-                        # Check if the output is primarily an error message (short and contains error patterns)
-                        if len(output) < 200 and any(pattern in output_lower for pattern in error_patterns):
-                            # This is likely an error message from the model
-                            return f"MODEL_ERROR: {output}"
-                        
-                        # Try to extract just the code if there's extra text
-                        if '```' in output:
-                            # Extract code from markdown code blocks
-                            parts = output.split('```')
-                            for i, part in enumerate(parts):
-                                if i % 2 == 1:  # Odd indices are code blocks
-                                    code = part.strip()
-                                    if code.startswith(target_language.lower()) or code.startswith('python') or code.startswith('java'):
-                                        code = '\n'.join(code.split('\n')[1:])  # Remove language identifier
-                                    if code:
-                                        return code.strip()
-                        return output
+                    # Try to extract just the code if there's extra text
+                    if '```' in output:
+                        # Extract code from markdown code blocks
+                        parts = output.split('```')
+                        for i, part in enumerate(parts):
+                            if i % 2 == 1:  # Odd indices are code blocks
+                                code = part.strip()
+                                if code.startswith(target_language.lower()) or code.startswith('python') or code.startswith('java'):
+                                    code = '\n'.join(code.split('\n')[1:])  # Remove language identifier
+                                if code:
+                                    return code.strip()
+                    return output
                 
                 # If no output found, return error
-                return f"// Error: Unexpected response format from model. Response: {json.dumps(result)[:200]}"
-                
-        except requests.exceptions.HTTPError as e:
+                return f"// Error: Unexpected response format from model. Response: {json.dumps(response.payload)[:200]}"
+        
+        except Exception as e:
+            if not _is_http_error(e):
+                return self._format_system_error(e, target_language)
             # Handle HTTP errors (non-model related)
             error_msg = f"HTTP Error: {e.response.status_code}"
             if e.response.status_code == 401:
@@ -205,18 +724,21 @@ Converted {target_language} code:"""
             except:
                 pass
             return f"HTTP_ERROR: {error_msg}"
-        except Exception as e:
-            error_msg = str(e)
-            # Extract more detailed error if available
-            if hasattr(e, 'response'):
-                try:
-                    error_detail = json.loads(e.response['Error'].get('Message', ''))
-                    error_msg = error_detail.get('message', error_msg)
-                except:
-                    pass
-            return f"SYSTEM_ERROR: Error converting to {target_language}: {error_msg}"
     
-    def _invoke_claude_model(self, model_id: str, prompt: str, max_tokens: int = 400) -> str:
+    def _format_system_error(self, e: Exception, target_language: str) -> str:
+        """Format a non-HTTP conversion failure"""
+        error_msg = str(e)
+        # Extract more detailed error if available
+        if hasattr(e, 'response'):
+            try:
+                error_detail = json.loads(e.response['Error'].get('Message', ''))
+                error_msg = error_detail.get('message', error_msg)
+            except:
+                pass
+        return f"SYSTEM_ERROR: Error converting to {target_language}: {error_msg}"
+    
+    async def _ainvoke_claude_model(self, model_id: str, prompt: str, max_tokens: int = 400,
+                                    deadline: Optional[float] = None, priority: int = BACKGROUND) -> str:
         """Invoke Claude model with proper API format"""
         try:
             request_body = {
@@ -229,13 +751,19 @@ Converted {target_language} code:"""
                     }
                 ]
             }
-            response = self._invoke_model(model_id, request_body)
-            result = json.loads(response['body'].read())
-            return result['content'][0]['text'].strip()
+            response = await self._ainvoke_model(model_id, request_body, deadline=deadline, priority=priority)
+            if response.error:
+                raise Exception(response.error)
+            return response.text.strip()
         except Exception as e:
             raise Exception(f"Claude API error: {str(e)}")
     
     def _generate_function_summary(self, func_name: str, func_code: str = "", language: str = "Python", model_id: str = 'amazon.titan-text-lite-v1') -> str:
+        return run_sync(self._agenerate_function_summary(func_name, func_code, language, model_id))
+    
+    async def _agenerate_function_summary(self, func_name: str, func_code: str = "", language: str = "Python",
+                                          model_id: str = 'amazon.titan-text-lite-v1',
+                                          deadline: Optional[float] = None) -> str:
         try:
             if func_code:
                 prompt = f"""Analyze this {language} function and provide a concise one-sentence description of what it does:
@@ -248,7 +776,7 @@ Provide only a brief description in one sentence."""
             
             # Check if it's a Claude model (different API format)
             if 'claude' in model_id.lower():
-                return self._invoke_claude_model(model_id, prompt, max_tokens=100)
+                return await self._ainvoke_claude_model(model_id, prompt, max_tokens=100, deadline=deadline)
             else:
                 # Titan and other models
                 request_body = {
@@ -259,24 +787,16 @@ Provide only a brief description in one sentence."""
                         "topP": 0.9
                     }
                 }
-                response = self._invoke_model(model_id, request_body)
-                result = json.loads(response['body'].read())
+                response = await self._ainvoke_model(model_id, request_body, deadline=deadline)
                 
                 # Check for errors in response
-                if 'message' in result:
-                    return f"Function: {func_name} (Model error: {result['message']})"
-                
-                # Check for results array
-                if 'results' in result and len(result['results']) > 0:
-                    output_text = result['results'][0].get('outputText', '')
-                    if output_text:
-                        return output_text.strip()
-                    # Check for error in result
-                    if 'message' in result['results'][0]:
-                        return f"Function: {func_name} (Error: {result['results'][0]['message']})"
+                if response.error:
+                    return f"Function: {func_name} (Model error: {response.error})"
+                if response.text:
+                    return response.text.strip()
                 
                 return f"Function: {func_name}"
-                
+        
         except Exception as e:
             error_msg = str(e)
             # Extract more detailed error if available
@@ -1,6 +1,15 @@
 import ast
 import re
-from typing import Dict, List, Tuple, Any
+import codecs
+import itertools
+import textwrap
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import source_metrics
+from code_tree import CodeTree
+from source_buffer import FunctionRecord, SourceBuffer
 
 
 class CodeAnalyzer:
@@ -42,6 +51,117 @@ class CodeAnalyzer:
         '.md': 'Markdown',
     }
     
+    # Line comment markers per language; everything else uses C-style comments
+    LINE_COMMENTS = {
+        'Python': '#',
+        'Ruby': '#',
+        'Shell': '#',
+        'Bash': '#',
+        'Zsh': '#',
+        'PowerShell': '#',
+        'R': '#',
+        'YAML': '#',
+        'SQL': '--',
+    }
+    
+    # String literals are matched first so comment markers inside strings survive
+    _STRING_RE = r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')'
+    # Python's triple-quoted strings, which may span lines
+    _TRIPLE_STRING_RE = r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\''
+    # Languages whose line breaks and indentation are part of the program
+    INDENTED_LANGUAGES = {'Python', 'YAML'}
+    # Strings and comments, blanked out before counting braces; an unclosed /* runs to end of line
+    _BRACE_MASK_RE = re.compile(_STRING_RE + r'|//[^\n]*|/\*.*?(?:\*/|$)')
+    
+    # Regex patterns per language for parse_generic: (pattern, kind)
+    GENERIC_PATTERNS = {
+        'JavaScript': [
+            (r'import\s+.*?from\s+[\'"]([^\'"]+)[\'"]', 'import'),
+            (r'require\([\'"]([^\'"]+)[\'"]\)', 'require'),
+            (r'(?:function|const|let|var)\s+(\w+)\s*[=\(]', 'function'),
+        ],
+        'TypeScript': [
+            (r'import\s+.*?from\s+[\'"]([^\'"]+)[\'"]', 'import'),
+            (r'(?:function|const|let|var)\s+(\w+)\s*[=\(]', 'function'),
+        ],
+        'Java': [
+            (r'import\s+([\w.]+)', 'import'),
+            (r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(', 'function'),
+        ],
+        'C++': [
+            (r'#include\s*[<"]([^>"]+)[>"]', 'include'),
+            (r'(?:\w+\s+)*(\w+)\s*\([^)]*\)\s*\{', 'function'),
+        ],
+        'C': [
+            (r'#include\s*[<"]([^>"]+)[>"]', 'include'),
+            (r'(?:\w+\s+)*(\w+)\s*\([^)]*\)\s*\{', 'function'),
+        ],
+        'Go': [
+            (r'import\s+\([^)]*[\'"]([^\'"]+)[\'"]', 'import'),
+            (r'func\s+(\w+)', 'function'),
+        ],
+        'Rust': [
+            (r'use\s+([\w:]+)', 'use'),
+            (r'fn\s+(\w+)', 'function'),
+        ],
+        'C#': [
+            (r'using\s+([\w.]+)', 'using'),
+            (r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(', 'function'),
+        ],
+        'Ruby': [
+            (r'require\s+[\'"]([^\'"]+)[\'"]', 'require'),
+            (r'def\s+(\w+)', 'function'),
+        ],
+        'PHP': [
+            (r'require|include.*?[\'"]([^\'"]+)[\'"]', 'require'),
+            (r'function\s+(\w+)', 'function'),
+        ],
+        'Swift': [
+            (r'import\s+(\w+)', 'import'),
+            (r'func\s+(\w+)', 'function'),
+        ],
+        'Kotlin': [
+            (r'import\s+([\w.]+)', 'import'),
+            (r'fun\s+(\w+)', 'function'),
+        ],
+    }
+    
+    # Class and function declarations for build_generic_tree
+    TREE_CLASS_PATTERNS = {
+        'Java': r'class\s+(\w+)',
+        'C++': r'class\s+(\w+)',
+        'C#': r'class\s+(\w+)',
+        'JavaScript': r'class\s+(\w+)',
+        'TypeScript': r'class\s+(\w+)',
+    }
+    
+    TREE_FUNCTION_PATTERNS = {
+        'JavaScript': r'(?:function|const|let|var)\s+(\w+)\s*[=\(]',
+        'TypeScript': r'(?:function|const|let|var)\s+(\w+)\s*[=\(]',
+        'Java': r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(',
+        'C++': r'(?:\w+\s+)*(\w+)\s*\([^)]*\)\s*\{',
+        'C': r'(?:\w+\s+)*(\w+)\s*\([^)]*\)\s*\{',
+        'Go': r'func\s+(\w+)',
+        'Rust': r'fn\s+(\w+)',
+        'C#': r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(',
+        'Ruby': r'def\s+(\w+)',
+        'PHP': r'function\s+(\w+)',
+        'Swift': r'func\s+(\w+)',
+        'Kotlin': r'fun\s+(\w+)',
+    }
+    
+    # Streaming analysis: lines kept per function, longest line kept, and text sampled for language detection
+    FUNCTION_WINDOW = 20
+    MAX_LINE_CHARS = 10000
+    DETECT_SAMPLE_CHARS = 65536
+    # Files with at least this many lines may be scanned in parallel chunks (analyze(workers=...))
+    PARALLEL_MIN_LINES = 20000
+    
+    # Compiled GENERIC_PATTERNS / TREE_*_PATTERNS per language, filled on first use
+    _compiled = {}
+    # normalize_code patterns per language, filled on first use
+    _normalize_res = {}
+    
     def detect_language(self, filename: str, code_text: str = "") -> str:
         """Detect programming language from filename and optionally code content"""
         # First try extension
@@ -93,16 +213,61 @@ class CodeAnalyzer:
         
         return "Unknown"
     
-    def count_loc(self, text: str) -> int:
-        return sum(1 for line in text.splitlines() if line.strip())
+    def normalize_code(self, code: str, language: str) -> str:
+        """Strip comments and collapse whitespace so equivalent bodies compare equal
+        
+        String literals are kept as they are. For INDENTED_LANGUAGES, line
+        breaks and indentation (relative to the body's common indentation)
+        are kept too, since they change what the code does.
+        """
+        indented = language in self.INDENTED_LANGUAGES
+        if indented:
+            code = textwrap.dedent(code)
+        
+        def replace(match):
+            string, gap = match.group(1, 2)
+            if string:
+                return string
+            if indented and '\n' in gap:
+                # The last line break and the next line's indentation (a comment here ends the text)
+                tail = gap[gap.rfind('\n'):]
+                return tail if not tail.strip() else '\n'
+            return ' '
+        
+        return self._normalize_re(language).sub(replace, code).strip()
     
-    def parse_python(self, source: str) -> Tuple[List[str], List[Tuple[str, str, str]]]:
-        try:
-            tree = ast.parse(source)
-        except SyntaxError:
-            return [], []
+    @classmethod
+    def _normalize_re(cls, language: str):
+        """String literals (group 1), and runs of whitespace and comments (group 2)"""
+        pattern = cls._normalize_res.get(language)
+        if pattern is None:
+            strings = cls._STRING_RE
+            if language == 'Python':
+                strings = '(' + cls._TRIPLE_STRING_RE + '|' + strings[1:]
+            marker = cls.LINE_COMMENTS.get(language)
+            comments = re.escape(marker) + r'[^\n]*' if marker else r'//[^\n]*|/\*.*?\*/'
+            pattern = cls._normalize_res[language] = re.compile(strings + r'|((?:\s|' + comments + r')+)', re.S)
+        return pattern
+    
+    def count_loc(self, text: Union[str, Iterable[str]]) -> int:
+        """Non-blank lines in the whole text or an iterable of lines"""
+        return sum(1 for line in self._lines(text) if line.strip())
+    
+    def parse_python(self, source: str, buffer: Optional[SourceBuffer] = None,
+                     tree: Optional[ast.AST] = None) -> Tuple[List[str], List[FunctionRecord]]:
+        """Libraries and functions of Python source; function code stays in one shared buffer
+        
+        Pass the already parsed `tree` to avoid parsing the source again.
+        """
+        if tree is None:
+            try:
+                tree = ast.parse(source)
+            except SyntaxError:
+                return [], []
         
         libraries = set()
+        functions = []
+        buffer = buffer or SourceBuffer(source)
         for node in ast.walk(tree):
             if isinstance(node, ast.Import):
                 for n in node.names:
@@ -110,11 +275,7 @@ class CodeAnalyzer:
             elif isinstance(node, ast.ImportFrom):
                 if node.module:
                     libraries.add(node.module.split(".")[0])
-        
-        functions = []
-        source_lines = source.splitlines()
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
+            elif isinstance(node, ast.FunctionDef):
                 doc = ast.get_docstring(node)
                 if doc:
                     summary = doc.strip().split("\n")[0]
@@ -122,297 +283,612 @@ class CodeAnalyzer:
                     arg_names = [a.arg for a in node.args.args]
                     summary = f"Function with parameters: {', '.join(arg_names)}" if arg_names else "Function with no parameters"
                 
-                # Extract function source code
+                # Function source as a line range; without end_lineno it runs to the end of the file
                 start_line = node.lineno - 1
-                end_line = node.end_lineno if hasattr(node, 'end_lineno') else len(source_lines)
-                func_code = '\n'.join(source_lines[start_line:end_line])
-                
-                functions.append((node.name, summary, func_code))
+                end_line = getattr(node, 'end_lineno', None) or buffer.line_count()
+                functions.append(FunctionRecord(node.name, summary, buffer, start_line, end_line))
         
         return sorted(libraries), functions
     
-    def build_code_tree(self, source: str) -> List[Dict[str, Any]]:
-        """Build hierarchical code structure tree"""
-        try:
-            tree = ast.parse(source)
-        except SyntaxError:
-            return []
+    def build_code_tree(self, source: str, tree: Optional[ast.AST] = None) -> CodeTree:
+        """Build hierarchical code structure tree (from `tree` if the source is already parsed)"""
+        if tree is None:
+            try:
+                tree = ast.parse(source)
+            except SyntaxError:
+                return CodeTree()
         
-        structure = []
+        structure = CodeTree()
         
-        def visit_node(node, parent_name="", level=0):
+        def visit_node(node, parent=-1):
             if isinstance(node, ast.Module):
                 for child in ast.iter_child_nodes(node):
-                    visit_node(child, "", level)
+                    visit_node(child, parent)
             elif isinstance(node, ast.ClassDef):
-                class_info = {
-                    'type': 'class',
-                    'name': node.name,
-                    'parent': parent_name,
-                    'level': level,
-                    'children': []
-                }
-                structure.append(class_info)
+                index = structure.add('class', node.name, parent, node.lineno)
                 for child in ast.iter_child_nodes(node):
-                    visit_node(child, node.name, level + 1)
+                    visit_node(child, index)
             elif isinstance(node, ast.FunctionDef):
-                func_info = {
-                    'type': 'function',
-                    'name': node.name,
-                    'parent': parent_name,
-                    'level': level,
-                    'args': [a.arg for a in node.args.args if a.arg != 'self']
-                }
-                structure.append(func_info)
+                args = [a.arg for a in node.args.args if a.arg != 'self']
+                index = structure.add('function', node.name, parent, node.lineno, args)
                 for child in ast.iter_child_nodes(node):
-                    visit_node(child, node.name, level + 1)
+                    visit_node(child, index)
         
         visit_node(tree)
         return structure
     
-    def generate_tree_graphviz(self, code_tree: List[Dict[str, Any]] = None, source: str = None) -> str:
+    def generate_tree_graphviz(self, code_tree: CodeTree = None, source: str = None) -> str:
         """Generate Graphviz DOT format for code tree"""
         if code_tree is None:
             if source is None:
                 return None
             tree = self.build_code_tree(source)
-        else:
+        elif isinstance(code_tree, CodeTree):
             tree = code_tree
+        else:
+            # Legacy list of node dicts
+            tree = CodeTree.from_dicts(code_tree)
         
         if not tree:
             return None
         
-        lines = ['digraph CodeTree {', '    rankdir=TB;', '    node [shape=box, style=rounded];']
-        
-        # Group items by parent
-        items_by_parent = {}
-        root_items = []
-        
-        for item in tree:
-            if item['parent']:
-                if item['parent'] not in items_by_parent:
-                    items_by_parent[item['parent']] = []
-                items_by_parent[item['parent']].append(item)
-            else:
-                root_items.append(item)
-        
-        # Create node ID mapping
-        node_ids = {}
-        for item in tree:
-            node_id = f"{item['type']}_{item['name']}".replace('.', '_').replace('-', '_')
-            node_ids[item['name']] = node_id
-        
-        # Add root module node
-        lines.append('    Module [label="📄 Module", fillcolor="#e1f5ff", style="rounded,filled"];')
-        
-        # Add nodes
-        for item in tree:
-            node_id = node_ids[item['name']]
-            if item['type'] == 'class':
-                label = f"📦 {item['name']}"
-                color = "#ffe1f5"
-            else:
-                parent_prefix = f"{item['parent']}." if item['parent'] else ""
-                args_str = f"({', '.join(item['args'][:3])})" if item['args'] else "()"
-                if len(item['args']) > 3:
-                    args_str = args_str[:-1] + "...)"
-                label = f"⚙️ {parent_prefix}{item['name']}{args_str}"
-                color = "#e1ffe1"
-            
-            # Escape special characters in label
-            label = label.replace('"', '\\"')
-            lines.append(f'    {node_id} [label="{label}", fillcolor="{color}", style="rounded,filled"];')
-        
-        # Add edges
-        for item in tree:
-            node_id = node_ids[item['name']]
-            if item['parent']:
-                # Find parent in tree
-                parent_item = next((x for x in tree if x['name'] == item['parent']), None)
-                if parent_item:
-                    parent_id = node_ids[item['parent']]
-                    lines.append(f'    {parent_id} -> {node_id};')
-                else:
-                    lines.append(f'    Module -> {node_id};')
-            else:
-                lines.append(f'    Module -> {node_id};')
-        
-        lines.append('}')
-        return '\n'.join(lines)
+        return tree.to_dot()
     
-    def parse_generic(self, source: str, language: str) -> Tuple[List[str], List[Tuple[str, str, str]]]:
-        """Generic parser for non-Python languages using regex patterns"""
-        libraries = set()
+    def parse_generic(self, source: Union[str, Iterable[str]], language: str,
+                      buffer: Optional[SourceBuffer] = None) -> Tuple[List[str], List[FunctionRecord]]:
+        """Generic parser for non-Python languages using regex patterns
+        
+        source is the whole text or an iterable of lines. For text, each
+        function is the FUNCTION_WINDOW lines from its declaration, held as
+        a line range of one shared buffer; with lines, only the last
+        FUNCTION_WINDOW lines are held in memory and each function keeps a
+        copy of its window.
+        """
+        patterns = self.compiled_patterns(language)[0]
+        if isinstance(source, str):
+            scanner = _FunctionScanner(patterns, 0)
+            for line in source.splitlines():
+                scanner.feed(line)
+            buffer = buffer or SourceBuffer(source)
+            functions = [FunctionRecord(name, f"Function: {name}", buffer, line_index, line_index + self.FUNCTION_WINDOW)
+                         for name, line_index in scanner.starts]
+            return sorted(scanner.libraries), functions
+        scanner = _FunctionScanner(patterns, self.FUNCTION_WINDOW)
         functions = []
-        source_lines = source.splitlines()
-        
-        # Language-specific patterns
-        patterns = {
-            'JavaScript': [
-                (r'import\s+.*?from\s+[\'"]([^\'"]+)[\'"]', 'import'),
-                (r'require\([\'"]([^\'"]+)[\'"]\)', 'require'),
-                (r'(?:function|const|let|var)\s+(\w+)\s*[=\(]', 'function'),
-            ],
-            'TypeScript': [
-                (r'import\s+.*?from\s+[\'"]([^\'"]+)[\'"]', 'import'),
-                (r'(?:function|const|let|var)\s+(\w+)\s*[=\(]', 'function'),
-            ],
-            'Java': [
-                (r'import\s+([\w.]+)', 'import'),
-                (r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(', 'function'),
-            ],
-            'C++': [
-                (r'#include\s*[<"]([^>"]+)[>"]', 'include'),
-                (r'(?:\w+\s+)*(\w+)\s*\([^)]*\)\s*\{', 'function'),
-            ],
-            'C': [
-                (r'#include\s*[<"]([^>"]+)[>"]', 'include'),
-                (r'(?:\w+\s+)*(\w+)\s*\([^)]*\)\s*\{', 'function'),
-            ],
-            'Go': [
-                (r'import\s+\([^)]*[\'"]([^\'"]+)[\'"]', 'import'),
-                (r'func\s+(\w+)', 'function'),
-            ],
-            'Rust': [
-                (r'use\s+([\w:]+)', 'use'),
-                (r'fn\s+(\w+)', 'function'),
-            ],
-            'C#': [
-                (r'using\s+([\w.]+)', 'using'),
-                (r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(', 'function'),
-            ],
-            'Ruby': [
-                (r'require\s+[\'"]([^\'"]+)[\'"]', 'require'),
-                (r'def\s+(\w+)', 'function'),
-            ],
-            'PHP': [
-                (r'require|include.*?[\'"]([^\'"]+)[\'"]', 'require'),
-                (r'function\s+(\w+)', 'function'),
-            ],
-            'Swift': [
-                (r'import\s+(\w+)', 'import'),
-                (r'func\s+(\w+)', 'function'),
-            ],
-            'Kotlin': [
-                (r'import\s+([\w.]+)', 'import'),
-                (r'fun\s+(\w+)', 'function'),
-            ],
-        }
-        
-        lang_patterns = patterns.get(language, [])
-        
-        for line_num, line in enumerate(source_lines, 1):
-            for pattern, pattern_type in lang_patterns:
-                matches = re.finditer(pattern, line)
-                for match in matches:
-                    if pattern_type in ['import', 'require', 'include', 'use', 'using']:
-                        lib = match.group(1).split('/')[-1].split('.')[0]
-                        if lib and not lib.startswith('.'):
-                            libraries.add(lib)
-                    elif pattern_type == 'function':
-                        func_name = match.group(1)
-                        if func_name and func_name not in ['if', 'for', 'while', 'switch', 'case']:
-                            # Check if function already added
-                            if not any(f[0] == func_name for f in functions):
-                                # Extract function code (simplified - find next closing brace)
-                                func_code = self._extract_function_code(source_lines, line_num - 1, language)
-                                summary = f"Function: {func_name}"
-                                functions.append((func_name, summary, func_code))
-        
-        return sorted(libraries), functions
+        for line in source:
+            functions.extend(scanner.feed(line))
+        functions.extend(scanner.finish())
+        return sorted(scanner.libraries), functions
     
-    def _extract_function_code(self, source_lines: List[str], start_line: int, language: str) -> str:
-        """Extract function code block"""
-        if start_line >= len(source_lines):
-            return ""
-        
-        # Simple extraction: get function line and next few lines
-        end_line = min(start_line + 20, len(source_lines))
-        return '\n'.join(source_lines[start_line:end_line])
-    
-    def build_generic_tree(self, source: str, language: str) -> List[Dict[str, Any]]:
-        """Build generic code tree for non-Python languages"""
-        structure = []
-        source_lines = source.splitlines()
-        
-        # Extract classes and functions using regex
-        class_patterns = {
-            'Java': r'class\s+(\w+)',
-            'C++': r'class\s+(\w+)',
-            'C#': r'class\s+(\w+)',
-            'JavaScript': r'class\s+(\w+)',
-            'TypeScript': r'class\s+(\w+)',
-        }
-        
-        func_patterns = {
-            'JavaScript': r'(?:function|const|let|var)\s+(\w+)\s*[=\(]',
-            'TypeScript': r'(?:function|const|let|var)\s+(\w+)\s*[=\(]',
-            'Java': r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(',
-            'C++': r'(?:\w+\s+)*(\w+)\s*\([^)]*\)\s*\{',
-            'C': r'(?:\w+\s+)*(\w+)\s*\([^)]*\)\s*\{',
-            'Go': r'func\s+(\w+)',
-            'Rust': r'fn\s+(\w+)',
-            'C#': r'(?:public|private|protected)?\s*(?:static)?\s*\w+\s+(\w+)\s*\(',
-            'Ruby': r'def\s+(\w+)',
-            'PHP': r'function\s+(\w+)',
-            'Swift': r'func\s+(\w+)',
-            'Kotlin': r'fun\s+(\w+)',
-        }
+    def build_generic_tree(self, source: Union[str, Iterable[str]], language: str,
+                           spans: Optional[Dict[int, Tuple[int, int]]] = None) -> CodeTree:
+        """Build generic code tree for non-Python languages
+        
+        Braces are counted (outside strings and // comments) to nest methods
+        under their classes. Matches inside function bodies are skipped, since
+        for these regexes they are almost always calls rather than definitions.
+        If given, `spans` is filled with each function node's (last line,
+        deepest brace nesting in its body); the last line is 0 when the body
+        is never closed.
+        """
+        scanner = _TreeScanner(self, language)
+        for line_num, line in enumerate(self._lines(source), 1):
+            scanner.feed(line_num, line)
+        if spans is not None:
+            spans.update((node, tuple(span)) for node, span in scanner.spans.items())
+        return scanner.tree
+    
+    @classmethod
+    def compiled_patterns(cls, language: str) -> Tuple[list, Any, Any]:
+        """(parse_generic patterns, tree class pattern, tree function pattern), compiled once per language"""
+        compiled = cls._compiled.get(language)
+        if compiled is None:
+            compiled = (
+                [(re.compile(pattern), pattern_type) for pattern, pattern_type in cls.GENERIC_PATTERNS.get(language, [])],
+                re.compile(cls.TREE_CLASS_PATTERNS[language]) if language in cls.TREE_CLASS_PATTERNS else None,
+                re.compile(cls.TREE_FUNCTION_PATTERNS[language]) if language in cls.TREE_FUNCTION_PATTERNS else None,
+            )
+            cls._compiled[language] = compiled
+        return compiled
+    
+    @staticmethod
+    def _lines(source: Union[str, Iterable[str]]) -> Iterable[str]:
+        return source.splitlines() if isinstance(source, str) else source
+    
+    def split_top_level(self, source_lines: List[str], parts: int) -> List[int]:
+        """Line offsets splitting source_lines into about `parts` chunks
+        
+        Splits only fall on blank lines outside any brace block or /* */
+        comment, after a line that ends a block or statement ('}', ';' or
+        Ruby's 'end'), so each chunk can be scanned from a fresh state; a
+        declaration whose signature and body are parted by a blank line is
+        not split. Braces are counted on the raw text; if strings unbalance
+        the count, fewer (or no) split points are found, which costs speed
+        but not correctness.
+        """
+        target = max(1, len(source_lines) // parts)
+        bounds = [0]
+        depth = 0
+        in_comment = False
+        closed = True
+        for index, line in enumerate(source_lines):
+            depth += line.count('{') - line.count('}')
+            if '/*' in line or '*/' in line:
+                in_comment = line.rfind('/*') > line.rfind('*/')
+            stripped = line.strip()
+            if stripped:
+                closed = stripped[-1] in '};' or stripped == 'end' or stripped.endswith((' end', ';end'))
+            elif (depth == 0 and not in_comment and closed and len(bounds) < parts
+                    and index + 1 - bounds[-1] >= target):
+                bounds.append(index + 1)
+        bounds.append(len(source_lines))
+        return bounds
+    
+    def scan_generic_parallel(self, code_text: str, language: str, workers: int,
+                              buffer: Optional[SourceBuffer] = None,
+                              spans: Optional[Dict[int, Tuple[int, int]]] = None) -> Tuple[List[str], List[FunctionRecord], CodeTree]:
+        """parse_generic + build_generic_tree over top-level chunks in a process pool
+        
+        Chunk results are merged in file order: the first occurrence of a
+        function name or qualified class/method name wins, as in a serial
+        scan, and function code is a line range of the full source. `spans`
+        is filled as by build_generic_tree.
+        """
+        buffer = buffer or SourceBuffer(code_text)
+        source_lines = code_text.splitlines()
+        bounds = self.split_top_level(source_lines, workers * 4)
+        chunks = [('\n'.join(source_lines[start:end]), language, start)
+                  for start, end in zip(bounds, bounds[1:]) if end > start]
+        if len(chunks) < 2:
+            libraries, functions = self.parse_generic(code_text, language, buffer)
+            return libraries, functions, self.build_generic_tree(source_lines, language, spans)
         
-        class_pattern = class_patterns.get(language)
-        func_pattern = func_patterns.get(language)
+        try:
+            results = list(_get_pool(workers).map(_scan_chunk, chunks))
+        except Exception:
+            # A broken or unavailable pool must not fail the analysis; scan serially instead
+            _discard_pool(workers)
+            results = [_scan_chunk(chunk) for chunk in chunks]
         
-        seen_classes = set()
+        libraries = set()
+        functions = []
         seen_functions = set()
-        
-        for line_num, line in enumerate(source_lines, 1):
-            if class_pattern:
-                class_match = re.search(class_pattern, line)
-                if class_match:
-                    class_name = class_match.group(1)
-                    if class_name not in seen_classes:
-                        seen_classes.add(class_name)
-                        structure.append({
-                            'type': 'class',
-                            'name': class_name,
-                            'parent': '',
-                            'level': 0,
-                            'args': []
-                        })
-            
-            if func_pattern:
-                func_match = re.search(func_pattern, line)
-                if func_match:
-                    func_name = func_match.group(1)
-                    if func_name not in ['if', 'for', 'while', 'switch', 'case'] and func_name not in seen_functions:
-                        seen_functions.add(func_name)
-                        structure.append({
-                            'type': 'function',
-                            'name': func_name,
-                            'parent': '',
-                            'level': 0,
-                            'args': []
-                        })
-        
-        return structure
+        tree = CodeTree()
+        seen_nodes = {}
+        for chunk_libraries, starts, chunk_tree, chunk_spans in results:
+            libraries.update(chunk_libraries)
+            for name, line_index in starts:
+                if name not in seen_functions:
+                    seen_functions.add(name)
+                    functions.append(FunctionRecord(name, f"Function: {name}", buffer,
+                                                    line_index, line_index + self.FUNCTION_WINDOW))
+            # Re-parent chunk nodes; repeated declarations map onto the first one, as in _TreeScanner
+            local = []
+            for index, name in enumerate(chunk_tree.names):
+                parent = chunk_tree.parents[index]
+                parent = local[parent] if parent >= 0 else -1
+                kind = chunk_tree.kind(index)
+                qualname = f"{tree.qualnames[parent]}.{name}" if parent >= 0 else name
+                node = seen_nodes.get((kind, qualname))
+                if node is None:
+                    node = seen_nodes[(kind, qualname)] = tree.add(
+                        kind, name, parent, chunk_tree.lines[index], chunk_tree.args[index])
+                local.append(node)
+            if spans is not None:
+                # Chunks split between top-level blocks, so no function spans two chunks
+                for index, span in chunk_spans.items():
+                    spans.setdefault(local[index], span)
+        return sorted(libraries), functions, tree
     
-    def analyze(self, code_text: str, filename: str) -> Dict:
+    def iter_lines(self, chunks: Iterable[Union[bytes, str]], max_bytes: Optional[int] = None) -> '_ChunkReader':
+        """Lines (without line endings) of a stream of byte or text chunks
+        
+        Bytes are decoded incrementally as UTF-8, so a multi-byte character
+        split across chunks is kept intact. Lines longer than MAX_LINE_CHARS
+        are cut short, and reading stops after max_bytes; the returned reader
+        records this in its truncated and long_lines attributes.
+        """
+        return _ChunkReader(chunks, max_bytes, self.MAX_LINE_CHARS)
+    
+    def analyze(self, code_text: str, filename: str, workers: Optional[int] = None) -> Dict:
+        """Analyze a whole file; with workers > 1, large non-Python files are scanned in parallel chunks"""
         language = self.detect_language(filename, code_text)
+        # Every function record points into this one copy of the source
+        buffer = SourceBuffer(code_text)
         
         if language == 'Python':
-            libraries, functions = self.parse_python(code_text)
-            code_tree = self.build_code_tree(code_text)
+            # Parsed once for the libraries, functions, tree and metrics
+            try:
+                tree = ast.parse(code_text)
+            except SyntaxError:
+                tree = None
+            if tree is not None:
+                libraries, functions = self.parse_python(code_text, buffer, tree)
+                code_tree = self.build_code_tree(code_text, tree)
+            else:
+                libraries, functions, code_tree = [], [], CodeTree()
+            metrics = source_metrics.python_metrics(code_text, tree)
             tree_graphviz = self.generate_tree_graphviz(code_tree=code_tree) if code_tree else None
         else:
-            libraries, functions = self.parse_generic(code_text, language)
-            code_tree = self.build_generic_tree(code_text, language)
+            spans = {}
+            if workers and workers > 1 and code_text.count('\n') >= self.PARALLEL_MIN_LINES:
+                libraries, functions, code_tree = self.scan_generic_parallel(code_text, language, workers, buffer, spans)
+            else:
+                libraries, functions = self.parse_generic(code_text, language, buffer)
+                code_tree = self.build_generic_tree(code_text, language, spans)
             tree_graphviz = self.generate_tree_graphviz(code_tree=code_tree) if code_tree else None
+            metrics = source_metrics.file_metrics(
+                code_text, self.LINE_COMMENTS.get(language),
+                _span_functions(code_tree, spans, buffer.line_count()) if spans else ()
+            )
         
         return {
             'language': language,
-            'loc': self.count_loc(code_text),
+            # Blank lines are those strip() empties, so this is count_loc without a second pass
+            'loc': metrics['lines'] - metrics['blank'],
             'libraries': libraries,
             'functions': functions,
             'code_tree': code_tree,
-            'tree_graphviz': tree_graphviz
+            'tree_graphviz': tree_graphviz,
+            'metrics': metrics
         }
+    
+    def analyze_stream(self, chunks: Iterable[Union[bytes, str]], filename: str, max_bytes: Optional[int] = None,
+                       on_function: Optional[Callable[[FunctionRecord], None]] = None) -> Dict:
+        """analyze() for a stream of byte (or text) chunks, e.g. a large upload
+        
+        Non-Python files are scanned line by line in a single pass, so memory
+        is bounded by the longest function window rather than the file size.
+        Each function is passed to on_function as soon as its code is
+        complete. Python needs the whole text for ast, so it is read in full
+        (up to max_bytes). 'truncated' is set when input past max_bytes was
+        dropped.
+        """
+        reader = self.iter_lines(chunks, max_bytes)
+        lines = iter(reader)
+        language = self.detect_language(filename)
+        head = []
+        if language == 'Unknown':
+            # Content detection only needs the start of the file
+            size = 0
+            for line in lines:
+                head.append(line)
+                size += len(line) + 1
+                if size >= self.DETECT_SAMPLE_CHARS:
+                    break
+            language = self.detect_language(filename, '\n'.join(head))
+        lines = itertools.chain(head, lines)
+        
+        if language == 'Python':
+            # Every line keeps its line break, so a trailing blank line is counted as analyze() counts it
+            lines = list(lines)
+            analysis = self.analyze('\n'.join(lines) + '\n' if lines else '', filename)
+        else:
+            functions = []
+            function_scanner = _FunctionScanner(self.compiled_patterns(language)[0], self.FUNCTION_WINDOW)
+            tree_scanner = _TreeScanner(self, language)
+            line_counter = source_metrics.LineCounter(self.LINE_COMMENTS.get(language))
+            # Code lines before each declaration and up to each function's closing line, and decision points per function
+            code_lines = 0
+            code_before = {}
+            code_through = {}
+            decisions = {}
+            # Lines of the function being read, counted in batches
+            current = -1
+            batch = []
+            code_tree = tree_scanner.tree
+            known = 0
+            line_num = 0
+            for line_num, line in enumerate(lines, 1):
+                is_code = line_counter.feed(line) == 'code'
+                code_lines += is_code
+                tree_scanner.feed(line_num, line)
+                for new in range(known, len(code_tree)):
+                    code_before[new] = code_lines - is_code
+                known = len(code_tree)
+                node = tree_scanner.function
+                if tree_scanner.closed:
+                    for closed in tree_scanner.closed:
+                        code_through[closed] = code_lines
+                    if node < 0:
+                        # The line that closes a function still belongs to it
+                        node = tree_scanner.closed[-1]
+                    tree_scanner.closed.clear()
+                if node != current or len(batch) >= 1000:
+                    if batch:
+                        decisions[current] = decisions.get(current, 0) + source_metrics.decision_points('\n'.join(batch))
+                        batch.clear()
+                    current = node
+                if node >= 0:
+                    batch.append(line)
+                for func in function_scanner.feed(line):
+                    functions.append(func)
+                    if on_function:
+                        on_function(func)
+            if batch:
+                decisions[current] = decisions.get(current, 0) + source_metrics.decision_points('\n'.join(batch))
+            for func in function_scanner.finish():
+                functions.append(func)
+                if on_function:
+                    on_function(func)
+            function_metrics = []
+            for node in sorted(tree_scanner.spans):
+                last, nesting = tree_scanner.spans[node]
+                loc = code_through.get(node, code_lines) - code_before[node]
+                function_metrics.append(source_metrics.function_entry(
+                    code_tree.names[node], code_tree.lines[node], last or line_num, loc, nesting,
+                    1 + decisions.get(node, 0)))
+            metrics = line_counter.counts
+            analysis = {
+                'language': language,
+                # Blank lines are those strip() empties, so this is count_loc over the stream
+                'loc': metrics['lines'] - metrics['blank'],
+                'libraries': sorted(function_scanner.libraries),
+                'functions': functions,
+                'code_tree': code_tree,
+                'tree_graphviz': self.generate_tree_graphviz(code_tree=code_tree) if code_tree else None,
+                'metrics': source_metrics.summarize(metrics, function_metrics)
+            }
+        
+        analysis['truncated'] = reader.truncated
+        analysis['bytes_read'] = reader.bytes_read
+        return analysis
+
+
+# Brace and statement-end events for _TreeScanner
+_BRACE_EVENT_RE = re.compile(r'[{};]')
+
+# Process pools for scan_generic_parallel, one per worker count
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(workers: int):
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            import multiprocessing
+            # spawn, not fork: the Streamlit server process is multi-threaded
+            pool = _pools[workers] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        return pool
+
+
+def _discard_pool(workers: int):
+    with _pools_lock:
+        pool = _pools.pop(workers, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _span_functions(tree: CodeTree, spans: Dict[int, Tuple[int, int]], line_count: int) -> List[Tuple[str, int, int, int, None]]:
+    """source_metrics.file_metrics entries for the function spans of a generic tree, in file order"""
+    return [(tree.names[node], tree.lines[node], spans[node][0] or line_count, spans[node][1], None)
+            for node in sorted(spans)]
+
+
+def _scan_chunk(args: Tuple[str, str, int]) -> Tuple[List[str], List[Tuple[str, int]], CodeTree, Dict[int, Tuple[int, int]]]:
+    """Worker: scan one chunk; returns libraries, (name, absolute line) starts, the chunk's tree and its function spans"""
+    text, language, first_line = args
+    analyzer = CodeAnalyzer()
+    function_scanner = _FunctionScanner(analyzer.compiled_patterns(language)[0], 0)
+    tree_scanner = _TreeScanner(analyzer, language)
+    for line_num, line in enumerate(text.split('\n'), first_line + 1):
+        function_scanner.feed(line)
+        tree_scanner.feed(line_num, line)
+    starts = [(name, first_line + line_index) for name, line_index in function_scanner.starts]
+    spans = {node: tuple(span) for node, span in tree_scanner.spans.items()}
+    return sorted(function_scanner.libraries), starts, tree_scanner.tree, spans
+
+
+class _ChunkReader:
+    """Iterates the lines of a stream of chunks; see CodeAnalyzer.iter_lines"""
+    
+    def __init__(self, chunks: Iterable[Union[bytes, str]], max_bytes: Optional[int], max_line_chars: int):
+        self.chunks = chunks
+        self.max_bytes = max_bytes
+        self.max_line_chars = max_line_chars
+        self.bytes_read = 0
+        self.truncated = False
+        self.long_lines = 0
+        self._buffer = ''
+        self._skipping = False
+    
+    def __iter__(self) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        for chunk in self.chunks:
+            if self.max_bytes is not None and self.bytes_read + len(chunk) > self.max_bytes:
+                chunk = chunk[:max(0, self.max_bytes - self.bytes_read)]
+                self.truncated = True
+            self.bytes_read += len(chunk)
+            text = chunk if isinstance(chunk, str) else decoder.decode(chunk)
+            yield from self._split(text)
+            if self.truncated:
+                break
+        if not self.truncated:
+            self._buffer += decoder.decode(b'', final=True)
+        if self._buffer and not self._skipping:
+            yield self._buffer
+        self._buffer = ''
+    
+    @staticmethod
+    def _is_partial(part: str) -> bool:
+        # No line ending yet, or a '\r' that may be the first half of '\r\n'
+        return part.endswith('\r') or part.splitlines()[0] == part
+    
+    def _split(self, text: str) -> Iterator[str]:
+        if self._skipping:
+            # Dropping the rest of an over-long line up to its line ending
+            parts = text.splitlines(keepends=True)
+            if not parts or parts[0].splitlines()[0] == parts[0]:
+                return
+            self._skipping = False
+            text = text[len(parts[0]):]
+        parts = (self._buffer + text).splitlines(keepends=True)
+        self._buffer = parts.pop() if parts and self._is_partial(parts[-1]) else ''
+        for part in parts:
+            line = part.splitlines()[0]
+            if len(line) > self.max_line_chars:
+                line = line[:self.max_line_chars]
+                self.long_lines += 1
+            yield line
+        if len(self._buffer) > self.max_line_chars:
+            yield self._buffer[:self.max_line_chars]
+            self.long_lines += 1
+            self._buffer = ''
+            self._skipping = True
+
+
+class _FunctionScanner:
+    """Line-at-a-time parse_generic: functions are returned once their code window is complete
+    
+    With a window of 0 no code is collected; only starts and libraries are recorded.
+    """
+    
+    def __init__(self, patterns: list, window: int):
+        self.patterns = patterns
+        self.window = window
+        self.libraries = set()
+        # (name, 0-based line) of every function found, in order
+        self.starts = []
+        self._seen = set()
+        self._line_index = 0
+        # [name, summary, lines] for functions still collecting their window
+        self._pending = deque()
+    
+    def feed(self, line: str) -> List[FunctionRecord]:
+        for pending in self._pending:
+            pending[2].append(line)
+        for pattern, pattern_type in self.patterns:
+            for match in pattern.finditer(line):
+                if pattern_type in ['import', 'require', 'include', 'use', 'using']:
+                    lib = match.group(1).split('/')[-1].split('.')[0]
+                    if lib and not lib.startswith('.'):
+                        self.libraries.add(lib)
+                elif pattern_type == 'function':
+                    func_name = match.group(1)
+                    if func_name and func_name not in ['if', 'for', 'while', 'switch', 'case'] \
+                            and func_name not in self._seen:
+                        self._seen.add(func_name)
+                        self.starts.append((func_name, self._line_index))
+                        if self.window:
+                            self._pending.append([func_name, f"Function: {func_name}", [line]])
+        self._line_index += 1
+        done = []
+        while self._pending and len(self._pending[0][2]) >= self.window:
+            done.append(self._complete(self._pending.popleft()))
+        return done
+    
+    def finish(self) -> List[FunctionRecord]:
+        """Functions whose window was cut short by the end of the input"""
+        done = [self._complete(pending) for pending in self._pending]
+        self._pending.clear()
+        return done
+    
+    @staticmethod
+    def _complete(pending: list) -> FunctionRecord:
+        return FunctionRecord.from_code(pending[0], pending[1], '\n'.join(pending[2]))
+
+
+class _TreeScanner:
+    """Line-at-a-time build_generic_tree"""
+    
+    def __init__(self, analyzer: CodeAnalyzer, language: str):
+        self.analyzer = analyzer
+        _, self.class_pattern, self.func_pattern = analyzer.compiled_patterns(language)
+        self.tree = CodeTree()
+        # (kind, qualname) -> node; a repeated declaration (e.g. after a forward declaration) reuses the first
+        self.seen = {}
+        # Open scopes as (node index, brace depth of its body); pending waits for its opening brace
+        self.scopes = []
+        self.pending = None
+        self.depth = 0
+        self.in_comment = False
+        # Function node -> [last line, deepest brace nesting below its body]
+        self.spans = {}
+        # Functions whose body has closed since the caller last emptied this list
+        self.closed = []
+    
+    @property
+    def function(self) -> int:
+        """Node of the function whose (first) body is open, or -1"""
+        scopes = self.scopes
+        if scopes:
+            span = self.spans.get(scopes[-1][0])
+            if span is not None and not span[0]:
+                return scopes[-1][0]
+        return -1
+    
+    def feed(self, line_num: int, line: str):
+        structure = self.tree
+        scopes = self.scopes
+        if self.in_comment:
+            # Still inside a /* ... */ block from an earlier line
+            end = line.find('*/')
+            if end < 0:
+                return
+            line = ' ' * (end + 2) + line[end + 2:]
+            self.in_comment = False
+        masked = line
+        # Only lines that can hold a string or comment need masking
+        if '"' in line or "'" in line or '/' in line:
+            masked_parts = []
+            last = 0
+            for m in self.analyzer._BRACE_MASK_RE.finditer(line):
+                masked_parts.append(line[last:m.start()] + ' ' * len(m.group(0)))
+                last = m.end()
+                self.in_comment = m.group(0).startswith('/*') and not m.group(0).endswith('*/')
+            masked = ''.join(masked_parts) + line[last:]
+        events = [(m.start(), m.group(0)) for m in _BRACE_EVENT_RE.finditer(masked)]
+        if self.class_pattern:
+            class_match = self.class_pattern.search(masked)
+            if class_match:
+                events.append((class_match.start(), 'class', class_match.group(1)))
+        if self.func_pattern:
+            func_match = self.func_pattern.search(masked)
+            if func_match:
+                events.append((func_match.start(), 'function', func_match.group(1)))
+        
+        if not events:
+            return
+        if len(events) > 1:
+            events.sort(key=lambda e: e[0])
+        for event in events:
+            kind = event[1]
+            if kind == '{':
+                self.depth += 1
+                if self.pending is not None:
+                    scopes.append((self.pending, self.depth))
+                    # A repeated declaration (overload, redefinition) keeps the span of the first body
+                    if structure.kind(self.pending) == 'function' and self.pending not in self.spans:
+                        self.spans[self.pending] = [0, 0]
+                    self.pending = None
+                elif scopes and scopes[-1][0] in self.spans:
+                    # A block inside a function body
+                    span = self.spans[scopes[-1][0]]
+                    if not span[0]:
+                        span[1] = max(span[1], self.depth - scopes[-1][1])
+            elif kind == '}':
+                self.depth = max(0, self.depth - 1)
+                while scopes and scopes[-1][1] > self.depth:
+                    node = scopes.pop()[0]
+                    span = self.spans.get(node)
+                    if span is not None and not span[0]:
+                        span[0] = line_num
+                        self.closed.append(node)
+            elif kind == ';':
+                # Declaration without a body (abstract method, prototype)
+                self.pending = None
+            else:
+                name = event[2]
+                parent = scopes[-1][0] if scopes else -1
+                if parent >= 0 and structure.kind(parent) == 'function':
+                    continue
+                if kind == 'function' and name in ['if', 'for', 'while', 'switch', 'case']:
+                    continue
+                qualname = f"{structure.qualnames[parent]}.{name}" if parent >= 0 else name
+                existing = self.seen.get((kind, qualname))
+                if existing is not None:
+                    self.pending = existing
+                    continue
+                self.pending = self.seen[(kind, qualname)] = structure.add(kind, name, parent, line_num)
@@ -0,0 +1,229 @@
+from array import array
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Sequence
+
+# Node kinds, stored as small integers
+KINDS = ('class', 'function')
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+EMPTY_TREE_TEXT = "📄 (Simple script - no classes or functions)"
+
+
+class CodeTree:
+    """Compact class/function hierarchy
+
+    Nodes are stored column-wise and addressed by index; parents are integer
+    indices (-1 for top-level nodes), so identically named classes or
+    methods never collide. Children are looked up through a CSR-style
+    offset table that is built once on first use and shared by the DOT,
+    text and JSON renderers.
+
+    Iterating yields the legacy node dicts ({'type', 'name', 'parent',
+    'level', 'args'} plus 'qualname' and 'line') for older consumers.
+    """
+
+    __slots__ = ('kinds', 'names', 'parents', 'levels', 'lines', 'args', 'qualnames',
+                 '_child_offsets', '_child_nodes')
+
+    def __init__(self):
+        self.kinds = array('B')
+        self.names: List[str] = []
+        self.parents = array('i')
+        self.levels = array('H')
+        self.lines = array('I')
+        self.args: List[tuple] = []
+        self.qualnames: List[str] = []
+        self._child_offsets = None
+        self._child_nodes = None
+
+    def add(self, kind: str, name: str, parent: int = -1, line: int = 0, args: Sequence[str] = ()) -> int:
+        """Append a node (parents must be added before their children); return its index"""
+        index = len(self.names)
+        self.kinds.append(_KIND_CODES[kind])
+        self.names.append(name)
+        self.parents.append(parent)
+        self.levels.append(self.levels[parent] + 1 if parent >= 0 else 0)
+        self.lines.append(line)
+        self.args.append(tuple(args))
+        self.qualnames.append(f"{self.qualnames[parent]}.{name}" if parent >= 0 else name)
+        self._child_offsets = None
+        return index
+
+    @classmethod
+    def from_dicts(cls, items: Iterable[Dict[str, Any]]) -> 'CodeTree':
+        """Build from legacy node dicts whose 'parent' is a name, or from to_dicts() output
+
+        A 'parent_index' (as written by to_dicts) is used as is; only a bare
+        name is resolved, to the latest node called that.
+        """
+        tree = cls()
+        last_by_name = {}
+        for item in items:
+            parent = item.get('parent_index')
+            if parent is None:
+                parent = last_by_name.get(item.get('parent') or '', -1)
+            index = tree.add(item['type'], item['name'], parent, item.get('line', 0), item.get('args', ()))
+            last_by_name[item['name']] = index
+        return tree
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self.node(i) for i in range(len(self.names)))
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return self.node(range(len(self.names))[index])
+
+    def kind(self, index: int) -> str:
+        return KINDS[self.kinds[index]]
+
+    def node(self, index: int) -> Dict[str, Any]:
+        """Legacy dict view of one node"""
+        parent = self.parents[index]
+        return {
+            'type': self.kind(index),
+            'name': self.names[index],
+            'parent': self.names[parent] if parent >= 0 else '',
+            'level': self.levels[index],
+            'args': list(self.args[index]),
+            'qualname': self.qualnames[index],
+            'line': self.lines[index],
+        }
+
+    def _build_index(self):
+        # Counting sort by parent; slot 0 holds the top-level nodes, slot i + 1 the children of node i
+        count = len(self.names)
+        offsets = array('I', bytes(4 * (count + 2)))
+        for parent in self.parents:
+            offsets[parent + 2] += 1
+        for i in range(1, count + 2):
+            offsets[i] += offsets[i - 1]
+        cursor = offsets[:-1]
+        nodes = array('I', bytes(4 * count))
+        for index, parent in enumerate(self.parents):
+            nodes[cursor[parent + 1]] = index
+            cursor[parent + 1] += 1
+        self._child_nodes = nodes
+        self._child_offsets = offsets
+
+    def children(self, index: int = -1) -> Sequence[int]:
+        """Indices of the direct children of a node, or of the top-level nodes for -1"""
+        if self._child_offsets is None:
+            self._build_index()
+        return self._child_nodes[self._child_offsets[index + 1]:self._child_offsets[index + 2]]
+
+    def function_counts(self) -> array:
+        """Number of functions below each node, e.g. the methods of a class"""
+        counts = array('I', bytes(4 * len(self.names)))
+        # Children always follow their parents, so one reverse pass accumulates subtrees
+        for index in range(len(self.names) - 1, -1, -1):
+            parent = self.parents[index]
+            if parent >= 0:
+                counts[parent] += counts[index] + (self.kinds[index] == _KIND_CODES['function'])
+        return counts
+
+    def collapsible(self) -> List[str]:
+        """Qualified names of classes with members, largest first"""
+        counts = self.function_counts()
+        classes = [index for index in range(len(self.names))
+                   if self.kinds[index] == _KIND_CODES['class'] and self.children(index)]
+        classes.sort(key=lambda index: (-counts[index], self.lines[index]))
+        return [self.qualnames[index] for index in classes]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """JSON-ready list of nodes, with 'parent_index' alongside the legacy fields"""
+        nodes = []
+        for index in range(len(self.names)):
+            node = self.node(index)
+            node['parent_index'] = self.parents[index]
+            nodes.append(node)
+        return nodes
+
+    def _signature(self, index: int, max_args: int = None) -> str:
+        args = self.args[index]
+        if max_args is not None and len(args) > max_args:
+            return f"({', '.join(args[:max_args])}...)"
+        return f"({', '.join(args)})"
+
+    def to_dot(self, collapsed: Collection[str] = (), max_nodes: int = None) -> str:
+        """Graphviz DOT source
+
+        Classes whose qualified name is in collapsed are drawn as one node
+        with a method count and their members are left out. At most
+        max_nodes nodes are drawn; the rest are summarised in one node.
+        """
+        lines = ['digraph CodeTree {', '    rankdir=TB;', '    node [shape=box, style=rounded];']
+        lines.append('    Module [label="📄 Module", fillcolor="#e1f5ff", style="rounded,filled"];')
+        counts = self.function_counts() if collapsed else None
+        edges = []
+        drawn = 0
+        # Nodes drawn or hidden inside a collapsed class
+        covered = 0
+        # Pre-order walk so a node cap keeps the upper levels of the tree
+        stack = list(reversed(self.children()))
+        while stack:
+            if max_nodes is not None and drawn >= max_nodes:
+                hidden = len(self.names) - covered
+                lines.append(f'    more [label="… {hidden} more", shape=plaintext];')
+                edges.append('    Module -> more;')
+                break
+            index = stack.pop()
+            drawn += 1
+            covered += 1
+            name = self.names[index]
+            parent = self.parents[index]
+            is_collapsed = False
+            if self.kinds[index] == _KIND_CODES['class']:
+                label = f"📦 {name}"
+                color = "#ffe1f5"
+                if collapsed and self.qualnames[index] in collapsed:
+                    is_collapsed = True
+                    label += f" ({counts[index]} methods)"
+                    covered += self._subtree_size(index) - 1
+            else:
+                parent_prefix = f"{self.names[parent]}." if parent >= 0 else ""
+                label = f"⚙️ {parent_prefix}{name}{self._signature(index, 3)}"
+                color = "#e1ffe1"
+            # Escape special characters in label
+            label = label.replace('\\', '\\\\').replace('"', '\\"')
+            style = "rounded,filled,bold" if is_collapsed else "rounded,filled"
+            lines.append(f'    n{index} [label="{label}", fillcolor="{color}", style="{style}"];')
+            source = f"n{parent}" if parent >= 0 else "Module"
+            edges.append(f'    {source} -> n{index};')
+            if not is_collapsed:
+                stack.extend(reversed(self.children(index)))
+        lines.extend(edges)
+        lines.append('}')
+        return '\n'.join(lines)
+
+    def _subtree_size(self, index: int) -> int:
+        """Number of nodes in the subtree rooted at index"""
+        size = 0
+        stack = [index]
+        while stack:
+            node = stack.pop()
+            size += 1
+            stack.extend(self.children(node))
+        return size
+
+    def to_text(self) -> str:
+        """Indented text rendering, e.g. for environments without Graphviz"""
+        if not self.names:
+            return EMPTY_TREE_TEXT
+        lines = ["📄 Module"]
+        # Explicit stack instead of recursion so deeply nested code cannot overflow
+        stack = [(index, "", i == 0) for i, index in enumerate(reversed(self.children()))]
+        while stack:
+            index, prefix, is_last = stack.pop()
+            connector = "└─ " if is_last else "├─ "
+            parent = self.parents[index]
+            if self.kinds[index] == _KIND_CODES['class']:
+                lines.append(f"{prefix}{connector}📦 Class: {self.names[index]}")
+            else:
+                icon = "🔧" if parent >= 0 else "⚙️"
+                parent_prefix = f"{self.names[parent]}." if parent >= 0 else ""
+                lines.append(f"{prefix}{connector}{icon} {parent_prefix}{self.names[index]}{self._signature(index)}")
+            child_prefix = prefix + ("   " if is_last else "│  ")
+            children = self.children(index)
+            stack.extend((child, child_prefix, i == 0) for i, child in enumerate(reversed(children)))
+        return "\n".join(lines)
@@ -0,0 +1,130 @@
+// Live interview video panel, served as static files by a Streamlit
+// component. The iframe stays mounted across reruns, so the camera stream
+// is acquired once and survives every code-analysis interaction.
+
+// Minimal Streamlit component protocol (no npm build needed)
+function sendToStreamlit(type, data) {
+    window.parent.postMessage(Object.assign({ isStreamlitMessage: true, type: type }, data), '*');
+}
+
+function reportState() {
+    sendToStreamlit('streamlit:setComponentValue', {
+        value: { camera_on: videoOn, mic_muted: micMuted },
+        dataType: 'json'
+    });
+}
+
+// Python increments end_session to ask the panel to hang up
+let lastEndSession = null;
+
+window.addEventListener('message', function (event) {
+    if (!event.data || event.data.type !== 'streamlit:render') {
+        return;
+    }
+    const args = event.data.args || {};
+    if (lastEndSession !== null && args.end_session !== lastEndSession && videoOn) {
+        stopCamera();
+    }
+    lastEndSession = args.end_session;
+});
+
+let localStream = null;
+let videoOn = false;
+let micMuted = false;
+
+const videoEl = document.getElementById('localVideo');
+const placeholderEl = document.getElementById('placeholder');
+const statusDot = document.getElementById('statusDot');
+const statusText = document.getElementById('statusText');
+const audioIndicator = document.getElementById('audioIndicator');
+const camBtn = document.getElementById('camBtn');
+const micBtn = document.getElementById('micBtn');
+const endBtn = document.getElementById('endBtn');
+const volLabel = document.getElementById('volLabel');
+
+async function startCamera() {
+    try {
+        localStream = await navigator.mediaDevices.getUserMedia({
+            video: { width: { ideal: 1280 }, height: { ideal: 720 }, facingMode: 'user' },
+            audio: true
+        });
+        videoEl.srcObject = localStream;
+        videoEl.style.display = 'block';
+        videoEl.volume = 0.7;
+        placeholderEl.style.display = 'none';
+        statusDot.style.background = '#22c55e';
+        statusText.textContent = 'Live';
+        audioIndicator.textContent = '🎤 Audio: On';
+        camBtn.textContent = '⏸ Stop Camera';
+        videoOn = true;
+        micBtn.disabled = false;
+        endBtn.disabled = false;
+        reportState();
+    } catch (err) {
+        console.error('Error accessing camera/microphone:', err);
+        alert('Unable to access camera or microphone.\n\nPlease check browser permissions and that your devices are not in use by another app.\n\nError: ' + err.message);
+    }
+}
+
+function stopCamera() {
+    if (localStream) {
+        localStream.getTracks().forEach(t => t.stop());
+    }
+    localStream = null;
+    videoEl.srcObject = null;
+    videoEl.style.display = 'none';
+    placeholderEl.style.display = 'flex';
+    statusDot.style.background = '#ef4444';
+    statusText.textContent = 'Offline';
+    audioIndicator.textContent = '🎤 Audio: Off';
+    camBtn.textContent = '▶ Start Camera';
+    videoOn = false;
+    micMuted = false;
+    micBtn.disabled = true;
+    endBtn.disabled = true;
+    reportState();
+}
+
+function toggleCamera() {
+    if (!videoOn) {
+        startCamera();
+    } else {
+        stopCamera();
+    }
+}
+
+function toggleMic() {
+    if (!localStream) return;
+    localStream.getAudioTracks().forEach(t => { t.enabled = !t.enabled; });
+    micMuted = !micMuted;
+    if (micMuted) {
+        audioIndicator.textContent = '🎤 Audio: Muted';
+        micBtn.textContent = '🎤 Unmute';
+    } else {
+        audioIndicator.textContent = '🎤 Audio: On';
+        micBtn.textContent = '🎤 Mute';
+    }
+    reportState();
+}
+
+function endCall() {
+    stopCamera();
+    alert('Interview session ended.');
+}
+
+function setVolume(v) {
+    if (videoEl) {
+        videoEl.volume = v / 100;
+    }
+    if (volLabel) {
+        volLabel.textContent = v + '%';
+    }
+}
+
+document.getElementById('camBtn').addEventListener('click', toggleCamera);
+document.getElementById('micBtn').addEventListener('click', toggleMic);
+document.getElementById('endBtn').addEventListener('click', endCall);
+document.getElementById('volSlider').addEventListener('input', function () { setVolume(this.value); });
+
+sendToStreamlit('streamlit:componentReady', { apiVersion: 1 });
+sendToStreamlit('streamlit:setFrameHeight', { height: document.body.scrollHeight + 10 });
@@ -0,0 +1,59 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# Laid-out SVGs kept in memory, keyed by a hash of the DOT source
+MAX_CACHED_SVGS = 128
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+# Set once the Graphviz package or its `dot` executable turns out to be missing
+_unavailable = False
+
+
+def dot_digest(dot: str) -> str:
+    return hashlib.sha256(dot.encode('utf-8')).hexdigest()
+
+
+def available() -> bool:
+    """Whether server-side layout has not (yet) failed for lack of Graphviz"""
+    return not _unavailable
+
+
+def render_svg(dot: str) -> Optional[str]:
+    """Lay out a DOT graph on the server and return SVG markup
+
+    Each distinct graph is laid out once; reruns and other sessions reuse
+    the cached SVG. Returns None when Graphviz is not installed or cannot
+    lay out the graph, so callers can fall back to client-side rendering.
+    """
+    global _unavailable
+    if _unavailable:
+        return None
+    key = dot_digest(dot)
+    with _lock:
+        svg = _cache.get(key)
+        if svg is not None:
+            _cache.move_to_end(key)
+            return svg
+
+    try:
+        import graphviz
+    except ImportError:
+        _unavailable = True
+        return None
+    try:
+        svg = graphviz.Source(dot).pipe(format='svg', encoding='utf-8')
+    except graphviz.ExecutableNotFound:
+        _unavailable = True
+        return None
+    except Exception:
+        # Layout errors are left to the client-side renderer to report
+        return None
+
+    with _lock:
+        _cache[key] = svg
+        while len(_cache) > MAX_CACHED_SVGS:
+            _cache.popitem(last=False)
+    return svg
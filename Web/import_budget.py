@@ -0,0 +1,81 @@
+"""Report cold-start import time for the web app modules
+
+Each module is imported in a fresh interpreter so that nothing is already
+cached in sys.modules. Exits with status 1 if any module exceeds its budget.
+
+    python import_budget.py [--runs 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Budgets in seconds; app.py includes the Streamlit import itself and
+# bedrock_helper includes asyncio, which Streamlit loads anyway
+BUDGETS = {
+    'code_analyzer': 0.05,
+    'bedrock_helper': 0.15,
+    'app': 3.0,
+}
+
+# Modules that must stay out of a cold start until AI is enabled
+LAZY_MODULES = ['boto3', 'botocore', 'requests', 'dotenv']
+
+_PROBE = """
+import json, sys, time, warnings
+warnings.simplefilter('ignore')
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str) -> Dict:
+    """Import one module in a fresh interpreter and time it"""
+    code = _PROBE.format(path=current_dir, module=module, lazy=LAZY_MODULES)
+    env = dict(os.environ, STREAMLIT_LOG_LEVEL='error')
+    proc = subprocess.run(
+        [sys.executable, '-c', code],
+        capture_output=True, text=True, cwd=current_dir, env=env
+    )
+    # Streamlit's bare-mode warnings go to stderr; the result is the last stdout line
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        return {'seconds': None, 'loaded': [], 'error': proc.stderr.strip()[-500:]}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help="Imports per module (median is reported)")
+    args = parser.parse_args()
+
+    over_budget = False
+    print(f"{'module':<16}{'median':>10}{'budget':>10}  lazy deps loaded")
+    for module, budget in BUDGETS.items():
+        results = [measure(module) for _ in range(args.runs)]
+        failed = next((r for r in results if r['seconds'] is None), None)
+        if failed:
+            print(f"{module:<16}{'error':>10}{budget:>10.3f}  {failed['error']}")
+            over_budget = True
+            continue
+        seconds = sorted(r['seconds'] for r in results)[len(results) // 2]
+        loaded = sorted(set(m for r in results for m in r['loaded']))
+        status = "" if seconds <= budget else "  OVER BUDGET"
+        # code_analyzer and bedrock_helper must not drag in the Bedrock stack
+        if module != 'app' and loaded:
+            status += "  EAGER IMPORT"
+        over_budget = over_budget or bool(status)
+        print(f"{module:<16}{seconds:>10.3f}{budget:>10.3f}  {', '.join(loaded) or '-'}{status}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import time
+import asyncio
+import threading
+from typing import Any, Callable, Coroutine, Dict, Hashable, Optional
+
+import async_runtime
+
+
+class Job:
+    """One model request running on the background event loop"""
+
+    def __init__(self, slot: str, key: Hashable, future):
+        self.slot = slot
+        self.key = key
+        self.future = future
+        self.started = time.monotonic()
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def cancelled(self) -> bool:
+        return self.future.cancelled()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block up to timeout seconds; return True once the job has finished"""
+        try:
+            self.future.exception(timeout)
+        except Exception:
+            # TimeoutError while still running, or CancelledError
+            pass
+        return self.future.done()
+
+    def result(self) -> Any:
+        return self.future.result(0)
+
+    def cancel(self) -> bool:
+        """Cancel the coroutine; an in-flight HTTP request is aborted"""
+        return self.future.cancel()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+class JobManager:
+    """Cancellable model jobs for one session
+
+    Each job occupies a slot (e.g. "enhance" or "convert:<function>") and
+    carries a key describing the request (target language, model, ...).
+    Submitting a different key to an occupied slot cancels the old job, so
+    a superseded request never competes with the one the user now wants;
+    submitting the same key returns the job already in flight.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, slot: str, key: Hashable, coro_factory: Callable[[], Coroutine]) -> Job:
+        with self._lock:
+            job = self._jobs.get(slot)
+            if job is not None and job.key == key and not job.cancelled():
+                return job
+            if job is not None:
+                job.cancel()
+            job = Job(slot, key, async_runtime.submit(coro_factory()))
+            self._jobs[slot] = job
+            return job
+
+    def get(self, slot: str, key: Hashable = None) -> Optional[Job]:
+        """Job in slot, or None if it was superseded by a different key"""
+        with self._lock:
+            job = self._jobs.get(slot)
+        if job is None or (key is not None and job.key != key):
+            return None
+        return job
+
+    def pop(self, slot: str) -> Optional[Job]:
+        """Forget a job, e.g. once its result has been stored"""
+        with self._lock:
+            return self._jobs.pop(slot, None)
+
+    def cancel(self, prefix: str = "") -> int:
+        """Cancel and forget every job whose slot starts with prefix"""
+        with self._lock:
+            slots = [slot for slot in self._jobs if slot.startswith(prefix)]
+            jobs = [self._jobs.pop(slot) for slot in slots]
+        return sum(1 for job in jobs if job.cancel())
+
+    def pending(self, prefix: str = "") -> int:
+        """Number of unfinished jobs whose slot starts with prefix"""
+        with self._lock:
+            return sum(1 for slot, job in self._jobs.items() if slot.startswith(prefix) and not job.done())
+
+
+class QueuedJob:
+    """A job in a JobQueue, visible to any thread"""
+
+    def __init__(self, job_id: str, key: Hashable, kind: str):
+        self.id = job_id
+        self.key = key
+        self.kind = kind
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job finishes; return False on timeout"""
+        return self._done.wait(timeout)
+
+    def to_dict(self, include_result: bool = True) -> Dict:
+        data = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        if include_result:
+            data['result'] = self.result
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    """Async job queue drained by a pool of workers on the background loop
+
+    Submissions with the same key as a queued or running job are coalesced
+    onto that job instead of being run again.
+    """
+
+    def __init__(self, workers: int = 4, max_finished: int = 1000):
+        self.workers = workers
+        self.max_finished = max_finished
+        self._jobs: Dict[str, QueuedJob] = {}
+        self._inflight: Dict[Hashable, QueuedJob] = {}
+        self._finished = []
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._counter = 0
+        self._queue = None
+        self.stats = {'submitted': 0, 'coalesced': 0, 'done': 0, 'failed': 0}
+
+    def start(self):
+        """Create the queue and worker tasks on the background loop"""
+        with self._start_lock:
+            if self._queue is None:
+                async_runtime.run_sync(self._start())
+
+    async def _start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, key: Hashable, kind: str, coro_factory: Callable[[], Coroutine]):
+        """Queue a job, or join an identical one in flight; returns (job, coalesced)"""
+        self.start()
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                self.stats['coalesced'] += 1
+                return job, True
+            self._counter += 1
+            job = QueuedJob(f"{int(time.time())}-{self._counter}", key, kind)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self.stats['submitted'] += 1
+        async_runtime.get_loop().call_soon_threadsafe(self._queue.put_nowait, (job, coro_factory))
+        return job, False
+
+    def get(self, job_id: str) -> Optional[QueuedJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def depth(self) -> int:
+        """Jobs queued or running"""
+        with self._lock:
+            return len(self._inflight)
+
+    async def _worker(self):
+        while True:
+            job, coro_factory = await self._queue.get()
+            job.status = 'running'
+            job.started = time.time()
+            try:
+                job.result = await coro_factory()
+                job.status = 'done'
+            except Exception as e:
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished = time.time()
+                self._finish(job)
+
+    def _finish(self, job: QueuedJob):
+        with self._lock:
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            self.stats['done' if job.status == 'done' else 'failed'] += 1
+            # Keep a bounded history of finished jobs for polling
+            self._finished.append(job.id)
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.pop(0), None)
+        job._done.set()
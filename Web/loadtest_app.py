@@ -0,0 +1,499 @@
+"""Capacity test for the Streamlit app: many simulated interviews on one server
+
+The app under test is one `streamlit run app.py` server, started fresh for
+each concurrency level. Each simulated session is a client that talks to it
+the way a browser does, over Streamlit's websocket: it opens the page,
+uploads a file from Code_For_Test/, switches AI on, changes the "Convert
+to:" language and reruns. Model calls go to the mock Bedrock backend. The
+test steps through increasing numbers of concurrent sessions. At each level
+it records the latency of every interaction (one script run each, plus the
+file transfer for uploads), with CPU and RSS of the server's process tree
+sampled over time. It stops once the p95 rerun latency passes the SLO or
+throughput stops growing.
+
+All sessions share the server's caches, analysis workers and Bedrock quota,
+so the capacity reported is that of one app instance. A session warms the
+server up (imports, first run, analysis workers) before the level starts;
+the sessions then begin together. Like the AppTest version before it, the
+client does not send the periodic fragment reruns a browser sends while AI
+results are pending.
+
+    python loadtest_app.py --sessions 1,2,4,8,16 --rounds 3 --slo 2.0 --output capacity.json
+
+Runs are reproducible for a given --seed: every session picks its files and
+languages from its own seeded random generator.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(current_dir, 'app.py')
+SAMPLES_DIR = os.path.join(os.path.dirname(current_dir), 'Code_For_Test')
+# Targets the sessions switch between (any the selector offers would do)
+TARGET_LANGUAGES = ['Java', 'Go', 'Rust', 'TypeScript', 'C++', 'Python']
+
+
+def percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _process_tree(root: int) -> Dict[int, tuple]:
+    """(CPU seconds, RSS bytes) of root and all its descendants, read from /proc"""
+    stats, children = {}, {}
+    tick, page = os.sysconf('SC_CLK_TCK'), os.sysconf('SC_PAGE_SIZE')
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # Fields after the parenthesised command name, which may itself contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        pid, ppid = int(name), int(fields[1])
+        children.setdefault(ppid, []).append(pid)
+        stats[pid] = ((int(fields[11]) + int(fields[12])) / tick, int(fields[21]) * page)
+    tree, pending = {}, [root]
+    while pending:
+        pid = pending.pop()
+        if pid in stats:
+            tree[pid] = stats[pid]
+        pending.extend(children.get(pid, []))
+    return tree
+
+
+class ResourceSampler(threading.Thread):
+    """Samples CPU (percent of one core) and RSS of the `root` process tree every `interval` seconds"""
+
+    def __init__(self, interval: float, started: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.started = started
+        self.samples = []
+        self.level = 0
+        # The server under test once a level starts; the clients run in this process
+        self.root = os.getpid()
+        self.available = os.path.isdir('/proc/self')
+        self._stop_event = threading.Event()
+
+    def run(self):
+        if not self.available:
+            return
+        root = self.root
+        last_wall, last_cpu = time.monotonic(), _process_tree(root)
+        while not self._stop_event.wait(self.interval):
+            if self.root != root:
+                # A new server: its start-up is not part of the first sample
+                root = self.root
+                last_wall, last_cpu = time.monotonic(), _process_tree(root)
+                continue
+            wall, cpu = time.monotonic(), _process_tree(root)
+            # Processes that exited since the last sample drop out; new ones count from their start
+            used = sum(seconds - last_cpu.get(pid, (0.0, 0))[0] for pid, (seconds, _) in cpu.items())
+            self.samples.append({
+                't': round(wall - self.started, 2),
+                'sessions': self.level,
+                'processes': len(cpu),
+                'cpu_percent': round(100 * max(0.0, used) / max(1e-9, wall - last_wall), 1),
+                'rss_mb': round(sum(rss for _, rss in cpu.values()) / (1024 * 1024), 1),
+            })
+            last_wall, last_cpu = wall, cpu
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class AppServer:
+    """`streamlit run app.py` on a free local port, with the mock Bedrock backend"""
+
+    def __init__(self, args):
+        self.args = args
+        self.address = None
+        self.process = None
+        self._log = None
+
+    def start(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        self.address = f'127.0.0.1:{port}'
+        env = dict(os.environ,
+                   BEDROCK_MOCK='1',
+                   BEDROCK_MOCK_LATENCY=str(self.args.mock_latency),
+                   BEDROCK_TPS=str(self.args.tps),
+                   # Every level starts from cold model calls instead of another level's answers
+                   BEDROCK_RESPONSE_CACHE='')
+        env.setdefault('STREAMLIT_LOGGER_LEVEL', 'error')
+        self._log = tempfile.TemporaryFile()
+        # The clients send no XSRF cookie and no origin; the server only listens on loopback
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', APP_PATH, '--server.headless=true',
+             '--server.address=127.0.0.1', f'--server.port={port}', '--server.enableXsrfProtection=false',
+             '--server.enableCORS=false', '--server.fileWatcherType=none', '--browser.gatherUsageStats=false'],
+            env=env, cwd=current_dir, stdout=self._log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + self.args.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"server exited with {self.process.returncode}: {self.output()}")
+            try:
+                if httpx.get(f'http://{self.address}/_stcore/health', timeout=1).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError("server did not become healthy in time")
+
+    def output(self, limit: int = 2000) -> str:
+        self._log.seek(0)
+        return self._log.read().decode('utf-8', errors='replace')[-limit:]
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class SimulatedSession:
+    """One interviewer: a browser-like client of the server, plus the interactions it has timed"""
+
+    def __init__(self, session_id: int, seed: int, samples: List[str], address: str, timeout: float):
+        self.session_id = session_id
+        self.rng = random.Random(seed * 1000 + session_id)
+        self.samples = samples
+        self.address = address
+        self.timeout = timeout
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: List[str] = []
+        self.ai_on = False
+        # What the last script run drew: widget id -> element, and the values this client has set
+        self.widgets = {}
+        self.widget_states = {}
+        self.page_script_hash = ''
+        self.server_session_id = ''
+        self._run_errors: List[str] = []
+        self._requests = 0
+        self._socket = None
+        self._http = None
+
+    async def _connect(self):
+        import websockets
+        self._socket = await websockets.connect(f'ws://{self.address}/_stcore/stream',
+                                                subprotocols=['streamlit'], max_size=None)
+        self._http = httpx.AsyncClient(base_url=f'http://{self.address}', timeout=self.timeout)
+
+    async def close(self):
+        if self._socket is not None:
+            await self._socket.close()
+        if self._http is not None:
+            await self._http.aclose()
+
+    def _apply(self, msg):
+        """Track what the page shows: the widgets of the current run and any exception"""
+        kind = msg.WhichOneof('type')
+        if kind == 'new_session':
+            self.page_script_hash = msg.new_session.page_script_hash
+            self.server_session_id = msg.new_session.initialize.session_id or self.server_session_id
+            self.widgets = {}
+        elif kind == 'delta' and msg.delta.WhichOneof('type') == 'new_element':
+            element = msg.delta.new_element
+            element_type = element.WhichOneof('type')
+            if element_type == 'exception':
+                self._run_errors.append(element.exception.message)
+            elif element_type and 'id' in getattr(element, element_type).DESCRIPTOR.fields_by_name:
+                self.widgets[getattr(element, element_type).id] = element
+
+    async def _receive(self, until):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await self._socket.recv())
+            self._apply(msg)
+            if until(msg):
+                return msg
+
+    async def _send(self, msg):
+        await self._socket.send(msg.SerializeToString())
+
+    async def _run(self, widget=None):
+        """Rerun the script with this client's widget values, as a browser does after an interaction"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        if widget is not None:
+            self.widget_states[widget.id] = widget
+        msg = BackMsg()
+        msg.rerun_script.page_script_hash = self.page_script_hash
+        msg.rerun_script.widget_states.widgets.extend(self.widget_states.values())
+        await self._send(msg)
+        # st.rerun() ends a run early and the server starts the next one by itself
+        finished = await self._receive(lambda m: m.WhichOneof('type') == 'script_finished'
+                                       and m.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN)
+        if finished.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+            self._run_errors.append("compile error")
+
+    async def _timed(self, name: str, action):
+        self._run_errors = []
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(action(), self.timeout)
+            if self._run_errors:
+                self.errors.append(f"{name}: {self._run_errors[0]}")
+        except Exception as e:
+            self.errors.append(f"{name}: {type(e).__name__}: {e}")
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+    def _widget(self, element_type: str, match=lambda widget: True):
+        for element in self.widgets.values():
+            if element.WhichOneof('type') == element_type and match(getattr(element, element_type)):
+                return getattr(element, element_type)
+        return None
+
+    async def page_load(self):
+        async def load():
+            await self._connect()
+            await self._run()
+        await self._timed('page_load', load)
+
+    async def upload(self):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        path = self.rng.choice(self.samples)
+        with open(path, 'rb') as f:
+            data = f.read()
+        # A per-session name keeps uploads distinct, as real submissions are
+        name = f"s{self.session_id}_{os.path.basename(path)}"
+        uploader = self._widget('file_uploader')
+        if uploader is None:
+            self.errors.append("upload: no file uploader on the page")
+            return
+
+        async def send_file():
+            # Ask for an upload URL, send the file there, then rerun with it in the uploader
+            self._requests += 1
+            request = BackMsg()
+            request.file_urls_request.request_id = str(self._requests)
+            request.file_urls_request.file_names.append(name)
+            request.file_urls_request.session_id = self.server_session_id
+            await self._send(request)
+            response = (await self._receive(lambda m: m.WhichOneof('type') == 'file_urls_response'
+                                            and m.file_urls_response.response_id == str(self._requests))
+                        ).file_urls_response
+            if response.error_msg:
+                raise RuntimeError(response.error_msg)
+            urls = response.file_urls[0]
+            (await self._http.put(urls.upload_url, files={'file': (name, data, 'text/plain')})).raise_for_status()
+            state = WidgetState(id=uploader.id)
+            info = state.file_uploader_state_value.uploaded_file_info.add()
+            info.name, info.size, info.file_id = name, len(data), urls.file_id
+            info.file_urls.CopyFrom(urls)
+            await self._run(state)
+        await self._timed('upload', send_file)
+
+    async def enable_ai(self):
+        from streamlit.proto.Checkbox_pb2 import Checkbox
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        toggle = self._widget('checkbox', lambda widget: widget.type == Checkbox.TOGGLE)
+        if toggle is None:
+            self.errors.append("ai_toggle: no toggle on the page")
+            return
+        await self._timed('ai_toggle', lambda: self._run(WidgetState(id=toggle.id, bool_value=True)))
+        self.ai_on = True
+
+    async def switch_language(self):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        selector = self._widget('selectbox', lambda widget: widget.id.endswith('target_language_selector'))
+        if selector is None:
+            return
+        current = self.widget_states.get(selector.id)
+        value = current.string_value if current is not None else selector.options[selector.default]
+        choices = [lang for lang in TARGET_LANGUAGES if lang in selector.options and lang != value]
+        if choices:
+            target = self.rng.choice(choices)
+            await self._timed('switch_language', lambda: self._run(WidgetState(id=selector.id, string_value=target)))
+
+    async def rerun(self):
+        await self._timed('rerun', self._run)
+
+    async def play(self, rounds: int, think: float):
+        """The scripted interview: load, then per round upload, (AI on), switch language, rerun"""
+        try:
+            await self.page_load()
+            if self._socket is None:
+                return
+            for _ in range(rounds):
+                for step in (self.upload, None if self.ai_on else self.enable_ai, self.switch_language, self.rerun):
+                    if step is None:
+                        continue
+                    await step()
+                    if think:
+                        await asyncio.sleep(self.rng.uniform(0, 2 * think))
+        finally:
+            await self.close()
+
+
+async def _play_level(sessions: int, args, samples: List[str], address: str, sampler: ResourceSampler,
+                      server_pid: int) -> Dict:
+    # Imports, module-level caches and the analysis workers are not part of the measurement
+    warm_up = SimulatedSession(-1, args.seed, samples, address, args.timeout)
+    await warm_up.play(1, 0)
+    players = [SimulatedSession(i, args.seed, samples, address, args.timeout) for i in range(sessions)]
+
+    sampler.root = server_pid
+    sampler.level = sessions
+    first_sample = len(sampler.samples)
+    started = time.monotonic()
+    await asyncio.gather(*(player.play(args.rounds, args.think) for player in players))
+    elapsed = time.monotonic() - started
+    window = sampler.samples[first_sample:]
+    sampler.level = 0
+    return {
+        'elapsed': elapsed,
+        'window': window,
+        'sessions': players,
+        'errors': [f"warm-up: {error}" for error in warm_up.errors],
+    }
+
+
+def run_level(sessions: int, args, samples: List[str], sampler: ResourceSampler) -> Dict:
+    """Run `sessions` simulated interviews concurrently on a fresh server and summarise their latencies"""
+    server = AppServer(args).start()
+    try:
+        played = asyncio.run(_play_level(sessions, args, samples, server.address, sampler, server.process.pid))
+    finally:
+        sampler.root = os.getpid()
+        server.stop()
+
+    errors = played['errors']
+    by_kind: Dict[str, List[float]] = {}
+    for player in played['sessions']:
+        for kind, values in player.latencies.items():
+            by_kind.setdefault(kind, []).extend(values)
+        errors.extend(player.errors)
+    elapsed, window = played['elapsed'], played['window']
+    everything = [v for values in by_kind.values() for v in values]
+
+    def summary(values: List[float]) -> Dict:
+        values = sorted(values)
+        return {'count': len(values), **{name: round(percentile(values, q), 3) if values else None
+                                          for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))}}
+
+    return {
+        'sessions': sessions,
+        'elapsed': round(elapsed, 2),
+        'throughput': round(len(everything) / elapsed, 2),
+        'latency': summary(everything),
+        'by_interaction': {kind: summary(values) for kind, values in sorted(by_kind.items())},
+        'cpu_percent': round(sum(s['cpu_percent'] for s in window) / len(window), 1) if window else None,
+        'rss_mb': max((s['rss_mb'] for s in window), default=None),
+        'errors': len(errors),
+        'error_samples': errors[:5],
+    }
+
+
+def _cell(value, width: int, digits: int = 3) -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session capacity test for one Streamlit app server (mock Bedrock)")
+    parser.add_argument('--sessions', default='1,2,4,8,16,32', help="comma-separated concurrency levels")
+    parser.add_argument('--rounds', type=int, default=3, help="upload / switch language / rerun rounds per session")
+    parser.add_argument('--think', type=float, default=0.0, help="mean pause between interactions, in seconds")
+    parser.add_argument('--slo', type=float, default=2.0, help="p95 rerun latency target, in seconds")
+    parser.add_argument('--mock-latency', type=float, default=0.2, help="mock Bedrock latency, in seconds")
+    parser.add_argument('--tps', type=float, default=0.0, help="Bedrock quota per model (0: unlimited)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--timeout', type=float, default=120.0, help="timeout per interaction and for server start")
+    parser.add_argument('--sample-interval', type=float, default=0.5)
+    parser.add_argument('--keep-going', action='store_true', help="run every level, even past saturation")
+    parser.add_argument('--output', help="write the capacity report as JSON")
+    args = parser.parse_args()
+
+    samples = sorted(os.path.join(SAMPLES_DIR, name) for name in os.listdir(SAMPLES_DIR)
+                     if os.path.isfile(os.path.join(SAMPLES_DIR, name)))
+    levels = [int(n) for n in args.sessions.split(',') if n.strip()]
+    started = time.monotonic()
+    sampler = ResourceSampler(args.sample_interval, started)
+    sampler.start()
+
+    results = []
+    saturation = None
+    print(f"{'sessions':>8} {'reruns':>7} {'rerun/s':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} "
+          f"{'cpu%':>6} {'rss MB':>7} {'errors':>6}")
+    for level in levels:
+        result = run_level(level, args, samples, sampler)
+        results.append(result)
+        latency = result['latency']
+        print(f"{level:>8} {latency['count']:>7} {result['throughput']:>8.2f} {_cell(latency['p50'], 7)} "
+              f"{_cell(latency['p95'], 7)} {_cell(latency['p99'], 7)} {_cell(latency['max'], 7)} "
+              f"{_cell(result['cpu_percent'], 6, 1)} {_cell(result['rss_mb'], 7, 1)} {result['errors']:>6}", flush=True)
+
+        if saturation is None:
+            previous = results[-2] if len(results) > 1 else None
+            if latency['p95'] is None or latency['p95'] > args.slo:
+                saturation = {'sessions': level, 'reason': f"p95 {_cell(latency['p95'], 0, 2).strip()}s over the {args.slo:.2f}s SLO"}
+            elif previous and result['throughput'] < previous['throughput'] * 1.1:
+                saturation = {'sessions': level,
+                              'reason': f"throughput {result['throughput']:.2f}/s, under 10% above "
+                                        f"{previous['throughput']:.2f}/s at {previous['sessions']} sessions"}
+            if saturation and not args.keep_going:
+                break
+    sampler.stop()
+
+    for result in results:
+        for error in result['error_samples']:
+            print(f"error at {result['sessions']} sessions: {error}")
+    within_slo = [r['sessions'] for r in results
+                  if r['latency']['p95'] is not None and r['latency']['p95'] <= args.slo and not r['errors']]
+    capacity = max(within_slo, default=0)
+    if saturation:
+        print(f"saturation at {saturation['sessions']} sessions: {saturation['reason']}")
+    else:
+        print(f"no saturation up to {results[-1]['sessions']} sessions")
+    print(f"capacity: {capacity} concurrent sessions on one app server within a p95 of {args.slo:.2f}s")
+
+    if args.output:
+        import streamlit
+        report = {
+            'config': {**vars(args), 'levels': levels, 'samples': [os.path.basename(p) for p in samples]},
+            'environment': {
+                'python': platform.python_version(),
+                'streamlit': streamlit.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+            },
+            'levels': results,
+            'saturation': saturation,
+            'capacity_sessions': capacity,
+            'timeline': sampler.samples,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Typed Bedrock model responses
+
+Every transport (boto3, bearer-token HTTP, the mock backend) hands the raw
+response to ModelResponse exactly once: wire bytes are parsed with orjson
+when it is installed (json otherwise), and a per-provider adapter pulls out
+the text, stop reason, token usage and any error. Callers never see the
+provider's JSON layout.
+
+New providers register an adapter for their model id prefix:
+
+    @register_adapter('mistral.')
+    def _mistral(payload): ...
+"""
+import json
+from typing import Any, Callable, Dict, Optional, Union
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+class ModelResponse:
+    """One model answer, normalised across providers"""
+
+    __slots__ = ('model_id', 'text', 'stop_reason', 'input_tokens', 'output_tokens', 'error', 'latency', 'payload')
+
+    def __init__(self, model_id: str, text: str = '', stop_reason: Optional[str] = None,
+                 input_tokens: int = 0, output_tokens: int = 0, error: Optional[str] = None,
+                 payload: Any = None):
+        self.model_id = model_id
+        self.text = text
+        self.stop_reason = stop_reason
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        # Error message the provider returned instead of (or alongside) an answer
+        self.error = error
+        # Seconds spent on the wire, filled in by the caller that timed the request
+        self.latency = 0.0
+        # Parsed provider JSON, kept for error reports
+        self.payload = payload
+
+    @classmethod
+    def from_bytes(cls, model_id: str, data: Union[bytes, str]) -> 'ModelResponse':
+        """Parse a provider response body"""
+        return cls.from_payload(model_id, _loads(data))
+
+    @classmethod
+    def from_payload(cls, model_id: str, payload: Dict) -> 'ModelResponse':
+        """Build from an already parsed provider response"""
+        adapter = _adapter_for(model_id)
+        fields = adapter(payload) if isinstance(payload, dict) else {'error': f"Unexpected response: {payload!r}"[:200]}
+        return cls(model_id, payload=payload, **fields)
+
+    def __repr__(self) -> str:
+        state = f"error={self.error!r}" if self.error else f"{len(self.text)} chars, stop={self.stop_reason}"
+        return f"ModelResponse({self.model_id}, {state}, tokens={self.input_tokens}/{self.output_tokens})"
+
+
+# Model id prefix -> adapter returning ModelResponse fields from a parsed payload
+_ADAPTERS: Dict[str, Callable[[Dict], Dict]] = {}
+
+
+def register_adapter(prefix: str):
+    def decorator(adapter: Callable[[Dict], Dict]) -> Callable[[Dict], Dict]:
+        _ADAPTERS[prefix] = adapter
+        return adapter
+    return decorator
+
+
+def _adapter_for(model_id: str) -> Callable[[Dict], Dict]:
+    # Claude models are matched anywhere in the id, as elsewhere in the app (e.g. regional "us.anthropic.claude-...")
+    if 'claude' in model_id.lower():
+        return _claude
+    for prefix, adapter in _ADAPTERS.items():
+        if model_id.startswith(prefix):
+            return adapter
+    return _generic
+
+
+@register_adapter('amazon.titan')
+def _titan(payload: Dict) -> Dict:
+    if 'message' in payload:
+        return {'error': str(payload['message'])}
+    results = payload.get('results') or [{}]
+    first = results[0]
+    return {
+        'text': first.get('outputText') or '',
+        'stop_reason': first.get('completionReason'),
+        'input_tokens': payload.get('inputTextTokenCount') or 0,
+        'output_tokens': first.get('tokenCount') or 0,
+        'error': str(first['message']) if 'message' in first else None,
+    }
+
+
+@register_adapter('anthropic.')
+def _claude(payload: Dict) -> Dict:
+    if payload.get('type') == 'error' or ('message' in payload and 'content' not in payload):
+        error = payload.get('error')
+        return {'error': str(error.get('message', error) if isinstance(error, dict) else payload.get('message', error))}
+    usage = payload.get('usage') or {}
+    return {
+        'text': ''.join(block.get('text', '') for block in payload.get('content') or [] if block.get('type', 'text') == 'text'),
+        'stop_reason': payload.get('stop_reason'),
+        'input_tokens': usage.get('input_tokens') or 0,
+        'output_tokens': usage.get('output_tokens') or 0,
+    }
+
+
+def _generic(payload: Dict) -> Dict:
+    """Best effort for providers without an adapter (Titan-style first, then common fields)"""
+    if 'results' in payload or 'message' in payload:
+        return _titan(payload)
+    for field in ('completion', 'generation', 'outputText', 'text'):
+        if isinstance(payload.get(field), str):
+            return {'text': payload[field], 'stop_reason': payload.get('stop_reason')}
+    return {}
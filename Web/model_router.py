@@ -0,0 +1,117 @@
+import os
+import time
+import threading
+from typing import Dict, List, Optional
+
+# Pseudo model id that asks BedrockHelper to route each request
+AUTO_MODEL_ID = 'auto'
+
+# tier: 0 = cheap/fast, 1 = balanced, 2 = strongest
+# latency: prior guess in seconds, replaced by observations as calls complete
+MODEL_CATALOG = [
+    {'modelId': 'amazon.titan-text-lite-v1', 'modelName': 'Amazon Titan Text Lite', 'providerName': 'Amazon',
+     'tier': 0, 'max_input_tokens': 4000, 'latency': 1.5},
+    {'modelId': 'amazon.titan-text-express-v1', 'modelName': 'Amazon Titan Text Express', 'providerName': 'Amazon',
+     'tier': 1, 'max_input_tokens': 8000, 'latency': 2.5},
+    {'modelId': 'anthropic.claude-3-haiku-20240307-v1:0', 'modelName': 'Claude 3 Haiku', 'providerName': 'Anthropic',
+     'tier': 1, 'max_input_tokens': 200000, 'latency': 2.0},
+    {'modelId': 'anthropic.claude-3-sonnet-20240229-v1:0', 'modelName': 'Claude 3 Sonnet', 'providerName': 'Anthropic',
+     'tier': 2, 'max_input_tokens': 200000, 'latency': 5.0},
+]
+
+# Offered (and routed to) unless BEDROCK_MODELS lists other catalog ids: the Titan models the app
+# was tested with. The Claude models need model access granted in the AWS account first
+DEFAULT_MODELS = ('amazon.titan-text-lite-v1', 'amazon.titan-text-express-v1')
+
+
+def enabled_models() -> List[Dict]:
+    """Catalog entries named by BEDROCK_MODELS (comma-separated ids), or the DEFAULT_MODELS"""
+    wanted = [model_id.strip() for model_id in os.getenv('BEDROCK_MODELS', '').split(',') if model_id.strip()]
+    models = [m for m in MODEL_CATALOG if m['modelId'] in (wanted or DEFAULT_MODELS)]
+    return models or [m for m in MODEL_CATALOG if m['modelId'] in DEFAULT_MODELS]
+
+
+class ModelRouter:
+    """Pick a model per request from task, function size and observed latency
+
+    A model that fails failure_limit calls in a row (access denied,
+    throttling, timeouts) cools down: for `cooldown` seconds, or until it
+    next succeeds, it is offered only after every healthy model, whatever
+    its tier.
+    """
+
+    def __init__(self, models: Optional[List[Dict]] = None, small_tokens: int = 150,
+                 large_tokens: int = 600, latency_alpha: float = 0.3, failure_limit: int = 3,
+                 cooldown: float = 60.0):
+        self.models = models if models is not None else enabled_models()
+        self.small_tokens = small_tokens
+        self.large_tokens = large_tokens
+        self.latency_alpha = latency_alpha
+        self.failure_limit = failure_limit
+        self.cooldown = cooldown
+        self._latency = {m['modelId']: m['latency'] for m in self.models}
+        self._failures = {m['modelId']: 0 for m in self.models}
+        self._down_until = {m['modelId']: 0.0 for m in self.models}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token count (about 4 characters per token)"""
+        return len(text) // 4 + 1
+
+    def desired_tier(self, task: str, func_code: str) -> int:
+        """Map task and function size to a capability tier"""
+        tokens = self.estimate_tokens(func_code)
+        if tokens <= self.small_tokens:
+            tier = 0
+        elif tokens <= self.large_tokens:
+            tier = 1
+        else:
+            tier = 2
+        # Conversions have to produce working code, summaries only one sentence
+        if task == 'conversion':
+            tier += 1
+        return min(tier, max(m['tier'] for m in self.models))
+
+    def route(self, task: str, func_code: str) -> List[str]:
+        """Return candidate model ids, best first; the rest are fallbacks"""
+        tier = self.desired_tier(task, func_code)
+        tokens = self.estimate_tokens(func_code)
+        now = time.monotonic()
+        with self._lock:
+            fitting = [m for m in self.models if m['max_input_tokens'] >= tokens] or list(self.models)
+            # Recent failures count as extra latency so a flaky model drops down the list
+            cost = {m['modelId']: self._latency[m['modelId']] * (1 + self._failures[m['modelId']]) for m in fitting}
+            cooling = {m['modelId'] for m in fitting if self._down_until[m['modelId']] > now}
+        # Never trade quality away on purpose: stronger tiers come before weaker ones
+        stronger = sorted((m for m in fitting if m['tier'] >= tier), key=lambda m: (m['tier'], cost[m['modelId']]))
+        weaker = sorted((m for m in fitting if m['tier'] < tier), key=lambda m: (-m['tier'], cost[m['modelId']]))
+        ranked = [m['modelId'] for m in stronger + weaker]
+        # ...except that a model cooling down after repeated failures goes last, in that same order
+        return [m for m in ranked if m not in cooling] + [m for m in ranked if m in cooling]
+
+    def record(self, model_id: str, seconds: float, ok: bool = True):
+        """Feed an observed call latency and outcome back into routing"""
+        with self._lock:
+            if model_id not in self._latency:
+                self._latency[model_id] = seconds
+                self._failures[model_id] = 0
+                self._down_until[model_id] = 0.0
+            self._latency[model_id] += self.latency_alpha * (seconds - self._latency[model_id])
+            if ok:
+                self._failures[model_id] = 0
+                self._down_until[model_id] = 0.0
+            else:
+                self._failures[model_id] = min(self._failures[model_id] + 1, max(5, self.failure_limit))
+                if self._failures[model_id] >= self.failure_limit:
+                    # Each further failure, including the first one after a cooldown, starts another
+                    self._down_until[model_id] = time.monotonic() + self.cooldown
+
+    def latency(self, model_id: str) -> Optional[float]:
+        """Smoothed latency estimate for a model"""
+        with self._lock:
+            return self._latency.get(model_id)
+
+
+# Shared by every session in the process so latency observations accumulate
+default_router = ModelRouter()
@@ -0,0 +1,169 @@
+"""Warm the response cache for a bank of reference solutions
+
+Analyses every source file below the given folders, then asks Bedrock for
+the function summaries and for conversions into each target language and
+stores the answers in the persistent response cache (response_cache.py).
+The app reads the same cache, so the first interviewer on a known problem
+does not wait on cold model calls.
+
+Requests go through a bounded worker pool behind a token-bucket rate
+limit. Each answer is committed as soon as it arrives and cached requests
+are skipped, so an interrupted run picks up where it stopped when started
+again.
+
+    python precompute.py questions/ --targets Java,JavaScript,Go --model amazon.titan-text-lite-v1
+    python precompute.py questions/ --report-only
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from bedrock_helper import BedrockHelper
+from code_analyzer import CodeAnalyzer
+from quota_scheduler import QuotaScheduler
+
+# The most used "Convert to:" targets in the app
+DEFAULT_TARGETS = ['Python', 'Java', 'JavaScript', 'TypeScript', 'C++', 'Go', 'Rust']
+
+
+def iter_sources(roots: Iterable[str]) -> Iterable[str]:
+    analyzer = CodeAnalyzer()
+    for root in roots:
+        paths = [root] if os.path.isfile(root) else (
+            os.path.join(dirpath, name) for dirpath, _, filenames in sorted(os.walk(root)) for name in sorted(filenames)
+        )
+        for path in paths:
+            if analyzer.detect_language(path) != 'Unknown':
+                yield path
+
+
+def plan(paths: Iterable[str], targets: List[str], model_id: str, helper: BedrockHelper) -> List[Tuple]:
+    """Every request the bank needs: (path, task, function name, code, language, target, cache key)"""
+    analyzer = CodeAnalyzer()
+    requests = []
+    seen = set()
+    for path in paths:
+        with open(path, encoding='utf-8', errors='ignore') as f:
+            analysis = analyzer.analyze(f.read(), os.path.basename(path))
+        language = analysis['language']
+        for func in analysis['functions']:
+            if len(func) < 3:
+                continue
+            name, summary, code = func
+            # Only functions without a docstring get a model summary (as in enhance_analysis)
+            if summary.startswith(("Function:", "Function with")):
+                key = helper.summary_cache_key(code, language, model_id)
+                requests.append((path, 'summary', name, code, language, None, key))
+            for target in targets:
+                if target == language:
+                    continue
+                key = helper.conversion_cache_key(code, target, language, model_id)
+                requests.append((path, 'conversion', name, code, language, target, key))
+    # Identical bodies (in one file or across the bank) are requested once
+    unique = []
+    for request in requests:
+        if request[-1] not in seen:
+            seen.add(request[-1])
+            unique.append(request)
+    return unique
+
+
+async def run(requests: List[Tuple], helper: BedrockHelper, model_id: str, workers: int,
+              progress_every: float = 5.0) -> Dict[str, int]:
+    """Send the requests through `workers` concurrent workers; returns outcome counts"""
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    counts = {'done': 0, 'failed': 0}
+    started = time.monotonic()
+    last_report = started
+
+    async def worker():
+        nonlocal last_report
+        while True:
+            try:
+                _, task, name, code, language, target, _ = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if task == 'summary':
+                result = await helper.asummarize_function(name, code, language, model_id)
+            else:
+                result = await helper.aconvert_function_to_language(code, target, language, model_id)
+            counts['failed' if helper._is_failed(task, result) else 'done'] += 1
+            now = time.monotonic()
+            if now - last_report >= progress_every:
+                last_report = now
+                finished = counts['done'] + counts['failed']
+                print(f"  {finished}/{len(requests)} requests, {finished / (now - started):.1f}/s", flush=True)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    await helper.aclose()
+    return counts
+
+
+def coverage(requests: List[Tuple], helper: BedrockHelper) -> Dict[str, Tuple[int, int]]:
+    """(cached, total) per task and conversion target"""
+    cached = helper.response_cache.present(request[-1] for request in requests)
+    report = {}
+    for _, task, _, _, _, target, key in requests:
+        label = task if target is None else f"{task} → {target}"
+        hits, total = report.get(label, (0, 0))
+        report[label] = (hits + (key in cached), total + 1)
+    return report
+
+
+def print_coverage(report: Dict[str, Tuple[int, int]]):
+    hits = sum(h for h, _ in report.values())
+    total = sum(t for _, t in report.values())
+    for label, (h, t) in sorted(report.items()):
+        print(f"  {label:<28} {h:>6}/{t:<6} {h / t:6.1%}")
+    print(f"  {'total':<28} {hits:>6}/{total:<6} {hits / max(1, total):6.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute Bedrock summaries and conversions for reference solutions")
+    parser.add_argument('paths', nargs='+', help="files or folders of reference solutions")
+    parser.add_argument('--targets', default=','.join(DEFAULT_TARGETS),
+                        help="comma-separated conversion targets (empty for summaries only)")
+    parser.add_argument('--model', default='amazon.titan-text-lite-v1')
+    parser.add_argument('--region', default=os.getenv('AWS_REGION', 'us-west-2'))
+    parser.add_argument('--workers', type=int, default=4, help="concurrent model requests")
+    parser.add_argument('--rate', type=float, default=float(os.getenv('BEDROCK_TPS', '2')),
+                        help="model requests per second")
+    parser.add_argument('--cache', default=None, help="response cache file (default: BEDROCK_RESPONSE_CACHE)")
+    parser.add_argument('--report-only', action='store_true', help="only print cache coverage")
+    args = parser.parse_args()
+
+    if args.cache:
+        os.environ['BEDROCK_RESPONSE_CACHE'] = args.cache
+    targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+    # Own quota so the batch never bursts above --rate, independent of BEDROCK_TPS_OVERRIDES
+    scheduler = QuotaScheduler(default_rate=args.rate, default_burst=max(1, args.workers))
+    helper = BedrockHelper(region=args.region, max_concurrency=args.workers, scheduler=scheduler)
+    if helper.response_cache is None:
+        parser.error("the response cache is disabled; set BEDROCK_RESPONSE_CACHE or pass --cache")
+
+    requests = plan(iter_sources(args.paths), targets, args.model, helper)
+    cached = helper.response_cache.present(r[-1] for r in requests)
+    pending = [r for r in requests if r[-1] not in cached]
+    print(f"{len(requests)} requests, {len(pending)} not cached yet")
+    if not args.report_only and pending:
+        started = time.monotonic()
+        try:
+            counts = asyncio.run(run(pending, helper, args.model, max(1, args.workers)))
+            print(f"done in {time.monotonic() - started:.1f}s: {counts['done']} cached, {counts['failed']} failed "
+                  f"(failures are retried on the next run)")
+        except KeyboardInterrupt:
+            print("interrupted; finished requests are cached and skipped on the next run")
+    print("cache coverage:")
+    print_coverage(coverage(requests, helper))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""On-demand profiles of single analyses and script reruns
+
+A capture records the stacks of the calling thread by sampling them (always)
+and, in 'full' mode, every call with cProfile, plus (unless turned off) a
+tracemalloc snapshot of the allocations made during the capture that are
+still alive at its end. Tracing allocations slows allocation-heavy code
+several times over; the stack sampler costs almost nothing.
+Stacks are written in the folded format ("frame;frame;frame count" per
+line) that flamegraph.pl, speedscope and inferno read directly. Full-mode
+statistics are also written as a .pstats file for snakeviz or pstats.
+
+Profiles are stored per submission hash:
+
+    PROFILE_DIR/<sha256 of the upload>/<profile id>.json     summary and allocations
+                                       <profile id>.folded   sampled stacks
+                                       <profile id>.pstats   cProfile statistics (full mode)
+
+Only one capture runs at a time per process: tracemalloc and the profiler
+hooks are process-wide, and an opt-in capture must not be able to slow the
+server down for everyone.
+
+    PROFILE_DIR=...              # default: profiles/ next to this file
+    PROFILE_INTERVAL=0.001       # seconds between stack samples
+    PROFILE_KEEP=20              # profiles kept per submission
+    PROFILE_MAX_SECONDS=120      # captures still running after this are abandoned
+
+Profile one analysis from the command line:
+
+    python profiling.py analyze ../Code_For_Test/sample.py --mode full
+"""
+import json
+import marshal
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+PROFILE_MODES = ('sample', 'full')
+# Key for reruns profiled before anything was uploaded
+NO_SUBMISSION = 'no-submission'
+# Allocations are grouped by the line that made them, so one frame per trace is enough (and far cheaper)
+TRACEMALLOC_FRAMES = 1
+
+_capture_lock = threading.Lock()
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler(threading.Thread):
+    """Counts the folded stacks of one thread every `interval` seconds, calling on_expiry after max_seconds"""
+
+    def __init__(self, thread_id: int, interval: float, max_seconds: float, on_expiry: Callable[[], None]):
+        super().__init__(daemon=True, name='profile-sampler')
+        self.thread_id = thread_id
+        self.interval = interval
+        self.deadline = time.monotonic() + max_seconds
+        self.on_expiry = on_expiry
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            if time.monotonic() > self.deadline:
+                self.on_expiry()
+                return
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        if self is not threading.current_thread():
+            self.join()
+        return self.stacks
+
+
+class Profiler:
+    """One capture on the calling thread: sampled stacks, cProfile in 'full' mode, and tracemalloc
+
+    start() returns False, and the capture records nothing, when another
+    capture is already running in the process. stop() may be called from
+    another thread (a Streamlit run cut short never reaches its own stop);
+    a capture still running after max_seconds is abandoned so that it
+    cannot hold the process-wide hooks forever.
+    """
+
+    def __init__(self, mode: str = 'sample', interval: Optional[float] = None, top: int = 25,
+                 max_seconds: Optional[float] = None, allocations: bool = True):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode!r} (expected one of {', '.join(PROFILE_MODES)})")
+        self.mode = mode
+        self.interval = interval if interval is not None else float(os.getenv('PROFILE_INTERVAL', '0.001'))
+        self.top = top
+        self.allocations = allocations
+        self.max_seconds = max_seconds if max_seconds is not None else float(os.getenv('PROFILE_MAX_SECONDS', '120'))
+        self.active = False
+        self.report = None
+        self._state_lock = threading.Lock()
+        self._thread_id = None
+        self._sampler = None
+        self._profile = None
+        self._baseline = None
+        self._started_tracemalloc = False
+
+    def start(self) -> bool:
+        if not _capture_lock.acquire(blocking=False):
+            return False
+        self.active = True
+        if self.mode == 'full':
+            import cProfile
+            self._profile = cProfile.Profile()
+        self._started_tracemalloc = self.allocations and not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if self.allocations:
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.take_snapshot()
+        self._thread_id = threading.get_ident()
+        self._sampler = _StackSampler(self._thread_id, self.interval, self.max_seconds, self._abandon)
+        self._sampler.start()
+        self._wall, self._cpu = time.perf_counter(), time.thread_time()
+        if self._profile is not None:
+            self._profile.enable()
+        return True
+
+    def _finish(self) -> bool:
+        """Mark the capture finished; False if it already was"""
+        with self._state_lock:
+            if not self.active:
+                return False
+            self.active = False
+            return True
+
+    def _abandon(self):
+        """Give up a capture that overran max_seconds, releasing tracemalloc and the capture lock"""
+        if not self._finish():
+            return
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        _capture_lock.release()
+
+    def stop(self) -> Optional[Dict]:
+        """The capture as a picklable report, or None if it never started or was abandoned"""
+        if not self._finish():
+            return None
+        same_thread = threading.get_ident() == self._thread_id
+        try:
+            # cProfile hooks the thread that enabled it; from another thread that thread has already ended
+            if self._profile is not None and same_thread:
+                self._profile.disable()
+            wall = time.perf_counter() - self._wall
+            cpu = time.thread_time() - self._cpu if same_thread else None
+            stacks = self._sampler.stop()
+            snapshot, peak = None, None
+            if self.allocations:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+        finally:
+            _capture_lock.release()
+
+        growth = []
+        if snapshot is not None:
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            growth = snapshot.filter_traces(ignore).compare_to(self._baseline.filter_traces(ignore), 'lineno')
+        allocations = [{
+            'file': stat.traceback[0].filename,
+            'line': stat.traceback[0].lineno,
+            'size': stat.size_diff,
+            'count': stat.count_diff,
+        } for stat in sorted(growth, key=lambda s: s.size_diff, reverse=True)[:self.top] if stat.size_diff > 0]
+
+        # Self time by the innermost frame of each sample
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        pstats_data = None
+        if self._profile is not None:
+            self._profile.create_stats()
+            # The format pstats.Stats and dump_stats() read and write
+            pstats_data = marshal.dumps(self._profile.stats)
+        return {
+            'mode': self.mode,
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4) if cpu is not None else None,
+            'interval': self.interval,
+            'samples': sum(stacks.values()),
+            'top_frames': [{'frame': frame, 'samples': count} for frame, count in leaves.most_common(self.top)],
+            'allocated_bytes': sum(stat.size_diff for stat in growth) if snapshot is not None else None,
+            'peak_traced_bytes': peak,
+            'allocations': allocations,
+            'folded': '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common()),
+            'pstats': pstats_data,
+        }
+
+    def __enter__(self) -> 'Profiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.report = self.stop()
+        return False
+
+
+def profile_call(fn: Callable, *args, mode: str = 'sample', allocations: bool = True,
+                 **kwargs) -> Tuple[object, Optional[Dict]]:
+    """Run fn(*args, **kwargs) under a Profiler; the report is None if another capture was running"""
+    profiler = Profiler(mode, allocations=allocations)
+    profiler.start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        report = profiler.stop()
+    return result, report
+
+
+class ProfileStore:
+    """Profiles on disk, grouped by submission hash, newest first"""
+
+    def __init__(self, root: Optional[str] = None, keep: Optional[int] = None):
+        self.root = root or os.getenv('PROFILE_DIR') or DEFAULT_DIR
+        self.keep = keep if keep is not None else int(os.getenv('PROFILE_KEEP', '20'))
+
+    def _dir(self, key: str) -> str:
+        # Submission hashes (or NO_SUBMISSION) only, never a path from the outside
+        if not re.fullmatch(r'[0-9a-f]{8,128}|' + NO_SUBMISSION, key or ''):
+            raise ValueError(f"Invalid profile key {key!r}")
+        return os.path.join(self.root, key)
+
+    def save(self, key: str, kind: str, report: Dict, **details) -> str:
+        """Write a report under key; `kind` ('analysis', 'rerun') and details go into the summary"""
+        directory = self._dir(key)
+        os.makedirs(directory, exist_ok=True)
+        now = time.time()
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{kind}-{uuid.uuid4().hex[:6]}"
+        base = os.path.join(directory, profile_id)
+        with open(base + '.folded', 'w') as f:
+            f.write(report['folded'] + '\n')
+        if report.get('pstats'):
+            with open(base + '.pstats', 'wb') as f:
+                f.write(report['pstats'])
+        summary = {name: value for name, value in report.items() if name not in ('folded', 'pstats')}
+        summary.update(id=profile_id, kind=kind, key=key, created=time.time(), **details)
+        with open(base + '.json', 'w') as f:
+            json.dump(summary, f, indent=1)
+        self._prune(directory)
+        return profile_id
+
+    def _prune(self, directory: str):
+        ids = sorted((name[:-5] for name in os.listdir(directory) if name.endswith('.json')), reverse=True)
+        for profile_id in ids[self.keep:]:
+            for ext in ('.json', '.folded', '.pstats'):
+                path = os.path.join(directory, profile_id + ext)
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def list(self, key: str) -> List[Dict]:
+        """Summaries of the profiles stored under key, newest first"""
+        directory = self._dir(key)
+        if not os.path.isdir(directory):
+            return []
+        summaries = []
+        for name in sorted(os.listdir(directory), reverse=True):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(directory, name)) as f:
+                        summaries.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return summaries
+
+    def read(self, key: str, profile_id: str, ext: str) -> Optional[bytes]:
+        """Contents of one stored file ('folded', 'pstats' or 'json'), or None"""
+        if ext not in ('folded', 'pstats', 'json') or not re.fullmatch(r'[\w-]+', profile_id):
+            raise ValueError(f"Invalid profile file {profile_id}.{ext}")
+        path = os.path.join(self._dir(key), f"{profile_id}.{ext}")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def clear(self, key: str):
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+
+
+def main():
+    import argparse
+    import hashlib
+    from code_analyzer import CodeAnalyzer
+
+    parser = argparse.ArgumentParser(description="Profile CodeAnalyzer.analyze on one file")
+    sub = parser.add_subparsers(dest='command', required=True)
+    analyze = sub.add_parser('analyze', help="profile one analysis and store it under the file's hash")
+    analyze.add_argument('file')
+    analyze.add_argument('--mode', choices=PROFILE_MODES, default='sample')
+    analyze.add_argument('--no-allocations', action='store_true', help="skip tracemalloc")
+    analyze.add_argument('--dir', help="profile directory (default: PROFILE_DIR or profiles/)")
+    args = parser.parse_args()
+
+    with open(args.file, 'rb') as f:
+        code_bytes = f.read()
+    code_hash = hashlib.sha256(code_bytes).hexdigest()
+    analysis, report = profile_call(CodeAnalyzer().analyze, code_bytes.decode('utf-8', errors='ignore'),
+                                    os.path.basename(args.file), mode=args.mode,
+                                    allocations=not args.no_allocations)
+    store = ProfileStore(args.dir)
+    profile_id = store.save(code_hash, 'analysis', report, filename=os.path.basename(args.file))
+    print(f"{analysis['language']}, {analysis['loc']} LOC, {len(analysis['functions'])} functions: "
+          f"{report['wall_seconds']:.3f}s wall, {report['cpu_seconds']:.3f}s CPU, {report['samples']} samples"
+          + (f", {report['allocated_bytes'] / 1024:,.0f} KB retained, peak {report['peak_traced_bytes'] / 1024:,.0f} KB"
+             if report['allocated_bytes'] is not None else ''))
+    for entry in report['top_frames'][:10]:
+        print(f"  {entry['samples']:6d}  {entry['frame']}")
+    print(f"stored in {os.path.join(store.root, code_hash, profile_id)}.*")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+
+import async_runtime
+
+# Lower value = served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class TokenBucket:
+    """In-process token bucket"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume one token; return 0, or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class SQLiteBucketStore:
+    """Token buckets shared by several processes through a SQLite (WAL) file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (model TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, model_id: str, rate: float, burst: float) -> float:
+        """Consume one token from the shared bucket; same contract as TokenBucket.take"""
+        conn = self._connect()
+        # Wall-clock time: monotonic clocks are not comparable across processes
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE model = ?", (model_id,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO buckets (model, tokens, updated) VALUES (?, ?, ?)",
+                         (model_id, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+class QuotaScheduler:
+    """Process-wide Bedrock request scheduler
+
+    Owns one token bucket per model. Waiting requests are served strictly by
+    priority (interactive conversions before background summaries) and
+    round-robin across sessions within a priority, so one busy interview
+    cannot starve the others. With a SQLite store the buckets are shared by
+    every process using the same file.
+    """
+
+    def __init__(self, default_rate: float = 5.0, default_burst: float = 10.0,
+                 rates: Optional[Dict[str, float]] = None, store: Optional[SQLiteBucketStore] = None):
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.rates = rates or {}
+        self.store = store
+        self._buckets: Dict[str, TokenBucket] = {}
+        # model -> priority -> session -> deque of (loop, future)
+        self._waiters: Dict[str, Dict[int, OrderedDict]] = {}
+        self._timers = {}
+        # Models with a dispatch pass running, and tokens taken for waiters that were gone by then
+        self._dispatching = set()
+        self._spare: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.stats = {'granted': 0, 'queued': 0}
+
+    @classmethod
+    def from_env(cls) -> 'QuotaScheduler':
+        """Configure from BEDROCK_TPS, BEDROCK_BURST, BEDROCK_TPS_OVERRIDES and BEDROCK_QUOTA_DB"""
+        rates = {}
+        for item in os.getenv('BEDROCK_TPS_OVERRIDES', '').split(','):
+            if '=' in item:
+                model_id, rate = item.rsplit('=', 1)
+                rates[model_id.strip()] = float(rate)
+        db_path = os.getenv('BEDROCK_QUOTA_DB')
+        return cls(
+            default_rate=float(os.getenv('BEDROCK_TPS', '5')),
+            default_burst=float(os.getenv('BEDROCK_BURST', '10')),
+            rates=rates,
+            store=SQLiteBucketStore(db_path) if db_path else None
+        )
+
+    def _rate(self, model_id: str) -> float:
+        return self.rates.get(model_id, self.default_rate)
+
+    def _take(self, model_id: str) -> float:
+        rate = self._rate(model_id)
+        burst = max(1.0, self.default_burst)
+        if self.store is not None:
+            return self.store.take(model_id, rate, burst)
+        bucket = self._buckets.get(model_id)
+        if bucket is None:
+            bucket = self._buckets[model_id] = TokenBucket(rate, burst)
+        return bucket.take()
+
+    async def acquire(self, model_id: str, session_id: str, priority: int = BACKGROUND):
+        """Wait for this session's turn and a free token for model_id"""
+        if self._rate(model_id) <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            queues = self._waiters.setdefault(model_id, {})
+            sessions = queues.setdefault(priority, OrderedDict())
+            sessions.setdefault(session_id, deque()).append((loop, future))
+            self.stats['queued'] += 1
+        self._dispatch(model_id)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Leave the queue so a superseded request does not use up a token
+            with self._lock:
+                sessions = self._waiters.get(model_id, {}).get(priority, {})
+                waiting = sessions.get(session_id)
+                if waiting is not None and (loop, future) in waiting:
+                    waiting.remove((loop, future))
+                    if not waiting:
+                        del sessions[session_id]
+            if future.done() and not future.cancelled():
+                # Granted just before the cancellation: hand the token to the next waiter
+                self._return_token(model_id)
+            raise
+
+    def _next_waiter(self, model_id: str):
+        """Pop the next live waiter as (priority, session, loop, future): highest priority, then round-robin over sessions"""
+        queues = self._waiters.get(model_id, {})
+        for priority in sorted(queues):
+            sessions = queues[priority]
+            while sessions:
+                session_id, waiting = next(iter(sessions.items()))
+                # Rotate this session to the back so others get the next turn
+                sessions.move_to_end(session_id)
+                while waiting:
+                    loop, future = waiting.popleft()
+                    if not future.done():
+                        if not waiting:
+                            del sessions[session_id]
+                        return priority, session_id, loop, future
+                del sessions[session_id]
+        return None
+
+    def _requeue(self, model_id: str, waiter):
+        """Put a waiter popped by _next_waiter back at the head of the queue"""
+        priority, session_id, loop, future = waiter
+        sessions = self._waiters.setdefault(model_id, {}).setdefault(priority, OrderedDict())
+        sessions.setdefault(session_id, deque()).appendleft((loop, future))
+        sessions.move_to_end(session_id, last=False)
+
+    def _dispatch(self, model_id: str):
+        """Start granting tokens to waiters, unless a pass is running or the bucket is empty until a timer"""
+        with self._lock:
+            if model_id in self._dispatching or (model_id in self._timers and not self._spare.get(model_id)):
+                return
+            self._dispatching.add(model_id)
+        if self.store is None:
+            self._grant_waiters(model_id)
+        else:
+            # The shared store may wait up to its busy timeout for a lock; keep that off every event loop
+            async_runtime.submit(asyncio.to_thread(self._grant_waiters, model_id))
+
+    def _grant_waiters(self, model_id: str):
+        """Grant tokens to waiters while the bucket allows; otherwise retry later
+
+        A waiter is picked before its token is taken, and the bucket is read
+        outside the lock. A token whose waiter went away is kept for the
+        next one rather than lost.
+        """
+        try:
+            while True:
+                with self._lock:
+                    waiter = self._next_waiter(model_id)
+                    if waiter is None:
+                        self._dispatching.discard(model_id)
+                        return
+                    spare = self._spare.get(model_id, 0)
+                    if spare:
+                        self._spare[model_id] = spare - 1
+                try:
+                    wait = 0.0 if spare else self._take(model_id)
+                except sqlite3.Error:
+                    # The shared store stayed locked past its timeout (or failed); try again shortly
+                    wait = 1.0
+                if wait > 0:
+                    with self._lock:
+                        self._requeue(model_id, waiter)
+                        self._dispatching.discard(model_id)
+                        self._schedule(model_id, wait)
+                    return
+                _, _, loop, future = waiter
+                with self._lock:
+                    self.stats['granted'] += 1
+                try:
+                    loop.call_soon_threadsafe(self._resolve, model_id, future)
+                except RuntimeError:
+                    # The waiter's event loop has been closed
+                    with self._lock:
+                        self._spare[model_id] = self._spare.get(model_id, 0) + 1
+                        self.stats['granted'] -= 1
+        except BaseException:
+            with self._lock:
+                self._dispatching.discard(model_id)
+            raise
+
+    def _resolve(self, model_id: str, future: asyncio.Future):
+        """Wake a granted waiter, on its own loop; a waiter cancelled in the meantime returns the token"""
+        if future.done():
+            self._return_token(model_id)
+        else:
+            future.set_result(None)
+
+    def _return_token(self, model_id: str):
+        with self._lock:
+            self._spare[model_id] = self._spare.get(model_id, 0) + 1
+            self.stats['granted'] -= 1
+        self._dispatch(model_id)
+
+    def _schedule(self, model_id: str, delay: float):
+        if model_id in self._timers:
+            return
+        loop = async_runtime.get_loop()
+        self._timers[model_id] = True
+        loop.call_soon_threadsafe(loop.call_later, delay, self._on_timer, model_id)
+
+    def _on_timer(self, model_id: str):
+        with self._lock:
+            self._timers.pop(model_id, None)
+        self._dispatch(model_id)
+
+    def waiting(self) -> Dict[str, int]:
+        """Number of queued requests per model"""
+        with self._lock:
+            return {model_id: sum(len(w) for sessions in queues.values() for w in sessions.values())
+                    for model_id, queues in self._waiters.items()}
+
+
+# Shared by every session (and BedrockHelper) in the process
+default_scheduler = QuotaScheduler.from_env()
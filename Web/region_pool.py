@@ -0,0 +1,208 @@
+"""Bedrock regions with health tracking and hedge timing
+
+BedrockHelper sends each model call to the healthiest configured region. If
+the call has not answered within that region's observed p95 latency, a
+duplicate (the hedge) goes to the next region; the first success wins and
+the other request is cancelled. A region that keeps failing is skipped for
+a cooldown period, and failed calls fail over to the next region.
+
+    BEDROCK_REGIONS=us-west-2,us-east-1    # first region is preferred on ties
+    BEDROCK_HEDGE=0                        # disable hedging (on by default with 2+ regions)
+
+Compare tail latency with and without hedging against the mock backend:
+
+    python region_pool.py bench --regions us-west-2,us-east-1 --tail-rate 0.02
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+
+
+class RegionPool:
+    """Latency and failure bookkeeping for the regions a helper may call"""
+
+    def __init__(self, regions: Sequence[str], hedge: Optional[bool] = None, percentile: float = 95.0,
+                 min_samples: int = 20, default_hedge_after: float = 2.0, min_hedge_after: float = 0.05,
+                 hedge_budget: float = 0.1, failure_limit: int = 3, cooldown: float = 30.0, window: int = 256):
+        self.regions = list(dict.fromkeys(r.strip() for r in regions if r.strip()))
+        if not self.regions:
+            raise ValueError("RegionPool needs at least one region")
+        # Hedging across regions by default; with one region a hedge would be a plain duplicate
+        self.hedge = len(self.regions) > 1 if hedge is None else hedge
+        self.percentile = percentile
+        self.min_samples = min_samples
+        # Hedge delay before min_samples latencies are known, and its lower bound afterwards
+        self.default_hedge_after = default_hedge_after
+        self.min_hedge_after = min_hedge_after
+        # Hedges allowed as a fraction of calls, so a slow outage cannot double the load
+        self.hedge_budget = hedge_budget
+        self.failure_limit = failure_limit
+        self.cooldown = cooldown
+        self._latencies = {r: deque(maxlen=window) for r in self.regions}
+        self._failures = {r: 0 for r in self.regions}
+        self._down_until = {r: 0.0 for r in self.regions}
+        self._lock = threading.Lock()
+        # calls: primary requests; hedges: duplicates sent; hedge_wins: hedges that answered first;
+        # failovers: retries in another region after a failure
+        self.stats = {'calls': 0, 'hedges': 0, 'hedge_wins': 0, 'failovers': 0}
+
+    @classmethod
+    def from_env(cls, default_region: str) -> 'RegionPool':
+        """Configure from BEDROCK_REGIONS and BEDROCK_HEDGE"""
+        regions = os.getenv('BEDROCK_REGIONS', '').split(',')
+        hedge = os.getenv('BEDROCK_HEDGE', '').strip().lower()
+        return cls(
+            regions if any(r.strip() for r in regions) else [default_region],
+            hedge=None if not hedge else hedge in ('1', 'true', 'yes', 'on')
+        )
+
+    def ordered(self) -> List[str]:
+        """Regions to try, best first: available, then fewest recent failures, then lowest median latency"""
+        now = time.monotonic()
+        with self._lock:
+            def cost(item):
+                index, region = item
+                samples = self._latencies[region]
+                median = sorted(samples)[len(samples) // 2] if samples else 0.0
+                return (self._down_until[region] > now, self._failures[region], median, index)
+            return [region for _, region in sorted(enumerate(self.regions), key=cost)]
+
+    def hedge_after(self, region: str) -> Optional[float]:
+        """Seconds to wait on region before sending a hedge, or None to not hedge"""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if self.stats['hedges'] >= self.hedge_budget * self.stats['calls'] + 1:
+                return None
+            samples = self._latencies[region]
+            if len(samples) < self.min_samples:
+                return self.default_hedge_after
+            ordered = sorted(samples)
+            value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+        return max(self.min_hedge_after, value)
+
+    def record(self, region: str, seconds: float, ok: bool = True):
+        """Feed back one answered call's latency, or a failure"""
+        with self._lock:
+            if region not in self._failures:
+                return
+            if ok:
+                self._latencies[region].append(seconds)
+                self._failures[region] = 0
+            else:
+                self._fail(region)
+
+    def timed_out(self, region: str, seconds: float):
+        """A call still unanswered when its deadline cut it off after `seconds`
+
+        Counts as a failure, unless the region usually needs longer than
+        that (its p95 from min_samples answers or more), or `seconds` is
+        below min_hedge_after: then the call's time budget was too short,
+        which says nothing about the region.
+        """
+        with self._lock:
+            if region not in self._failures or seconds < self.min_hedge_after:
+                return
+            samples = self._latencies[region]
+            if len(samples) >= self.min_samples:
+                ordered = sorted(samples)
+                if seconds < ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]:
+                    return
+            self._fail(region)
+
+    def _fail(self, region: str):
+        self._failures[region] += 1
+        if self._failures[region] >= self.failure_limit:
+            self._down_until[region] = time.monotonic() + self.cooldown
+
+    def count(self, event: str):
+        with self._lock:
+            self.stats[event] += 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-region sample count, p50/p95 latency and availability, for health endpoints"""
+        now = time.monotonic()
+        report = {}
+        with self._lock:
+            for region in self.regions:
+                ordered = sorted(self._latencies[region])
+                pick = (lambda q: round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 3)) if ordered else (lambda q: None)
+                report[region] = {'samples': len(ordered), 'p50': pick(0.5), 'p95': pick(self.percentile / 100),
+                                  'failures': self._failures[region], 'available': self._down_until[region] <= now}
+        return report
+
+
+_pools: Dict[str, RegionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def default_pool(region: str) -> RegionPool:
+    """Pool shared by every helper in the process whose default region is `region`"""
+    with _pools_lock:
+        pool = _pools.get(region)
+        if pool is None:
+            pool = _pools[region] = RegionPool.from_env(region)
+        return pool
+
+
+def _bench(args):
+    """Send the same mock workload with and without hedging and print latency percentiles"""
+    import asyncio
+    from bedrock_helper import BedrockHelper
+    from quota_scheduler import QuotaScheduler
+
+    regions = [r.strip() for r in args.regions.split(',') if r.strip()]
+    os.environ['BEDROCK_MOCK_LATENCY'] = str(args.latency)
+    os.environ['BEDROCK_MOCK_TAIL_RATE'] = str(args.tail_rate)
+    os.environ['BEDROCK_MOCK_TAIL_LATENCY'] = str(args.tail)
+    body = {'inputText': "Summarize this function in one sentence.", 'textGenerationConfig': {'maxTokenCount': 50}}
+
+    async def workload(pool: RegionPool) -> List[float]:
+        helper = BedrockHelper(mock=True, max_concurrency=args.concurrency, regions=pool,
+                               scheduler=QuotaScheduler(default_rate=0))
+        latencies = []
+
+        async def one():
+            start = time.monotonic()
+            await helper._ainvoke_model('amazon.titan-text-lite-v1', body)
+            latencies.append(time.monotonic() - start)
+
+        for offset in range(0, args.calls, args.concurrency):
+            await asyncio.gather(*(one() for _ in range(min(args.concurrency, args.calls - offset))))
+        return latencies
+
+    def percentile(ordered: List[float], q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    print(f"{args.calls} mock calls over {', '.join(regions)}: {args.latency}s base, "
+          f"{args.tail_rate:.0%} of calls +{args.tail}s")
+    print(f"  {'mode':<10} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}  extra requests")
+    for hedge in (False, True):
+        pool = RegionPool(regions, hedge=hedge, min_samples=min(20, args.calls // 10))
+        latencies = sorted(asyncio.run(workload(pool)))
+        extra = pool.stats['hedges'] / max(1, pool.stats['calls'])
+        print(f"  {'hedged' if hedge else 'single':<10} "
+              + ' '.join(f"{percentile(latencies, q):7.3f}" for q in (0.5, 0.95, 0.99, 1.0))
+              + f"  {extra:6.1%} ({pool.stats['hedge_wins']} hedges won)")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Bedrock region pool tools")
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench = sub.add_parser('bench', help="p99 latency with and without hedging on the mock backend")
+    bench.add_argument('--regions', default='us-west-2,us-east-1')
+    bench.add_argument('--calls', type=int, default=400)
+    bench.add_argument('--concurrency', type=int, default=8)
+    bench.add_argument('--latency', type=float, default=0.05, help="base mock latency in seconds")
+    bench.add_argument('--tail-rate', type=float, default=0.02, help="fraction of calls that are slow")
+    bench.add_argument('--tail', type=float, default=1.0, help="extra seconds for a slow call")
+    args = parser.parse_args()
+    if args.command == 'bench':
+        _bench(args)
+
+
+if __name__ == '__main__':
+    main()
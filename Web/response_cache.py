@@ -0,0 +1,88 @@
+"""Persistent cache of model responses shared by every session and process
+
+Entries are keyed by a hash of the task, the model and the normalised
+function body (plus the languages involved), so the app and the offline
+precompute job (precompute.py) read and fill the same cache.
+
+BEDROCK_RESPONSE_CACHE points at the SQLite file; set it to an empty value
+to disable the cache.
+"""
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'response_cache.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    task TEXT NOT NULL,
+    model TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class ResponseCache:
+    """Model responses in SQLite, keyed by request"""
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(task: str, model_id: str, *parts: str) -> str:
+        return hashlib.sha256('\0'.join((task, model_id) + parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, task: str, model_id: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, task, model, value, created) VALUES (?, ?, ?, ?, ?)",
+                (key, task, model_id, value, time.time())
+            )
+
+    def present(self, keys: Iterable[str]) -> Set[str]:
+        """The subset of keys that have a cached response"""
+        keys = list(keys)
+        found = set()
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key FROM responses WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                found.update(row[0] for row in rows)
+        return found
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT task, COUNT(*) FROM responses GROUP BY task").fetchall())
+
+    def close(self):
+        self._conn.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _open(path: str) -> ResponseCache:
+    return ResponseCache(path)
+
+
+def default_cache() -> Optional[ResponseCache]:
+    """The process-wide cache at BEDROCK_RESPONSE_CACHE, or None when disabled"""
+    path = os.getenv('BEDROCK_RESPONSE_CACHE', DEFAULT_DB)
+    return _open(path) if path else None
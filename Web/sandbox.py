@@ -0,0 +1,295 @@
+"""Static analysis in isolated, resource-limited worker processes
+
+A hostile upload can keep CodeAnalyzer.analyze busy for minutes (the C
+function pattern backtracks quadratically on one long line) or blow the
+stack or memory in ast.parse (thousands of chained operators). SandboxPool
+runs every analysis in a worker process with a CPU-time limit per job, an
+address-space limit and a wall-clock timeout. A worker that overruns is
+killed together with its process group (the chunk pool analyze() starts for
+huge files) and replaced, and workers are recycled after max_jobs analyses. The
+caller then gets a degraded analysis (language and line count only)
+instead of a stalled page.
+
+    ANALYSIS_SANDBOX_WORKERS=2        # worker processes (0 runs analysis in-process)
+    ANALYSIS_TIMEOUT=10               # wall-clock seconds per analysis
+    ANALYSIS_CPU_SECONDS=10           # CPU seconds per analysis
+    ANALYSIS_MEMORY_MB=1024           # address space per worker
+"""
+import atexit
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from code_analyzer import CodeAnalyzer
+
+
+class SandboxError(Exception):
+    """An analysis was stopped by a limit, or its worker died"""
+
+
+def _worker_main(conn, cpu_seconds: float, memory_bytes: int):
+    """Worker loop: apply the limits, then analyse jobs until told to stop"""
+    if hasattr(os, 'setpgrp'):
+        # Its own process group, so a kill also reaches processes it starts (analyze's chunk pool)
+        os.setpgrp()
+    try:
+        import resource
+    except ImportError:
+        # No rlimits on this platform; only the wall-clock timeout applies
+        resource = None
+    if resource is not None and memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    analyzer = CodeAnalyzer()
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        if resource is not None and cpu_seconds:
+            # RLIMIT_CPU counts the whole process lifetime, so move the limit past this job's budget
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            limit = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+        kind, args, profile = job
+
+        def run():
+            if kind == 'file':
+                path, filename, max_bytes = args
+                with open(path, 'rb') as f:
+                    return analyzer.analyze_stream(iter(lambda: f.read(1024 * 1024), b''), filename, max_bytes)
+            return analyzer.analyze(*args)
+
+        try:
+            if profile is not None:
+                from profiling import profile_call
+                reply = ('ok', *profile_call(run, **profile))
+            else:
+                reply = ('ok', run(), None)
+        except MemoryError:
+            reply = ('failed', "memory limit reached", None)
+        except RecursionError:
+            reply = ('failed', "code is nested too deeply", None)
+        except Exception as e:
+            reply = ('failed', f"{type(e).__name__}: {e}", None)
+        conn.send(reply)
+
+
+def _exit_reason(exitcode: Optional[int]) -> str:
+    if exitcode is not None and exitcode == -getattr(signal, 'SIGXCPU', 0):
+        return "CPU time limit reached"
+    if exitcode is not None and exitcode == -getattr(signal, 'SIGKILL', 0):
+        return "worker was killed (out of memory?)"
+    return f"worker exited unexpectedly (code {exitcode})"
+
+
+class _Worker:
+    def __init__(self, context, cpu_seconds: float, memory_bytes: int):
+        self.conn, child = context.Pipe()
+        # Not a daemon: analyze() may start its own process pool for huge files
+        self.process = context.Process(target=_worker_main, args=(child, cpu_seconds, memory_bytes), daemon=False)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def stop(self, kill: bool = False):
+        if not kill:
+            try:
+                self.conn.send(None)
+                self.process.join(1)
+            except (OSError, ValueError):
+                pass
+        if kill or self.process.is_alive():
+            self._kill_group()
+        self.conn.close()
+
+    def _kill_group(self):
+        """Kill the worker and every process it started, even if the worker itself already died"""
+        if hasattr(os, 'killpg'):
+            try:
+                # The group outlives a worker that died on a limit while its children still run
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                # No such group: the worker exited (with its children) or had not called setpgrp yet
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(1)
+
+
+class SandboxPool:
+    """Pool of analysis worker processes shared by every session in the process
+
+    Workers are started on first use (spawned, as the Streamlit server is
+    multi-threaded). analyze() and analyze_file() never raise for a bad
+    upload: a job that fails, overruns or kills its worker returns a
+    degraded analysis with the reason under 'degraded'.
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 10.0, cpu_seconds: float = 10.0,
+                 memory_mb: int = 1024, max_jobs: int = 100):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self.max_jobs = max_jobs
+        self._idle = queue.LifoQueue()
+        self._all = set()
+        self._lock = threading.Lock()
+        self._context = None
+        self._analyzer = CodeAnalyzer()
+        # degraded: analyses answered with language and LOC only; recycled: workers retired after max_jobs
+        self.stats = {'jobs': 0, 'degraded': 0, 'timeouts': 0, 'crashes': 0, 'recycled': 0}
+
+    @classmethod
+    def from_env(cls) -> 'SandboxPool':
+        """Configure from ANALYSIS_SANDBOX_WORKERS, ANALYSIS_TIMEOUT, ANALYSIS_CPU_SECONDS and ANALYSIS_MEMORY_MB"""
+        return cls(
+            workers=int(os.getenv('ANALYSIS_SANDBOX_WORKERS', '2')),
+            timeout=float(os.getenv('ANALYSIS_TIMEOUT', '10')),
+            cpu_seconds=float(os.getenv('ANALYSIS_CPU_SECONDS', '10')),
+            memory_mb=int(os.getenv('ANALYSIS_MEMORY_MB', '1024'))
+        )
+
+    def _count(self, event: str):
+        with self._lock:
+            self.stats[event] += 1
+
+    def _acquire(self) -> _Worker:
+        """An idle worker, or a new one while the pool is below its size"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                if len(self._all) < self.workers:
+                    if self._context is None:
+                        import multiprocessing
+                        import multiprocessing.util
+                        self._context = multiprocessing.get_context('spawn')
+                        # Registered after multiprocessing's own exit handler, so it runs first and
+                        # stops the (non-daemon) workers before multiprocessing waits for them
+                        atexit.register(self.close)
+                    worker = _Worker(self._context, self.cpu_seconds, self.memory_bytes)
+                    self._all.add(worker)
+                    return worker
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise SandboxError(f"no analysis worker free within {self.timeout:.0f}s")
+            # Wake up now and then: a killed worker frees its slot without going back to the queue
+            try:
+                return self._idle.get(timeout=min(remaining, 0.1))
+            except queue.Empty:
+                pass
+
+    def _release(self, worker: _Worker, healthy: bool):
+        if healthy and worker.jobs < self.max_jobs:
+            self._idle.put(worker)
+            return
+        if healthy:
+            self._count('recycled')
+        with self._lock:
+            self._all.discard(worker)
+        # The next _acquire starts a fresh worker in its place
+        worker.stop(kill=not healthy)
+
+    def _run(self, job) -> Tuple[Dict, Optional[Dict]]:
+        """The analysis and, for a profiled job, its profile report"""
+        worker = self._acquire()
+        healthy = False
+        try:
+            self._count('jobs')
+            try:
+                worker.conn.send(job)
+                finished = worker.conn.poll(self.timeout)
+                if not finished:
+                    self._count('timeouts')
+                    raise SandboxError(f"analysis took longer than {self.timeout:.0f}s")
+                status, payload, profile = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.process.join(1)
+                self._count('crashes')
+                raise SandboxError(_exit_reason(worker.process.exitcode))
+            worker.jobs += 1
+            healthy = True
+            if status != 'ok':
+                raise SandboxError(payload)
+            return payload, profile
+        finally:
+            self._release(worker, healthy)
+
+    @staticmethod
+    def _with_profile(result: Tuple[Dict, Optional[Dict]]) -> Dict:
+        analysis, profile = result
+        if profile is not None:
+            analysis['profile'] = profile
+        return analysis
+
+    def analyze(self, code_text: str, filename: str, workers: Optional[int] = None,
+                profile: Optional[Dict] = None) -> Dict:
+        """CodeAnalyzer.analyze in a worker, or language and LOC only if that fails
+
+        With `profile` (Profiler options such as {'mode': 'full'}, see
+        profiling.py) the worker profiles the analysis and the report comes
+        back under 'profile'.
+        """
+        try:
+            return self._with_profile(self._run(('text', (code_text, filename, workers), profile)))
+        except SandboxError as e:
+            self._count('degraded')
+            analyzer = self._analyzer
+            return self._degraded(
+                analyzer.detect_language(filename, code_text[:analyzer.DETECT_SAMPLE_CHARS]),
+                analyzer.count_loc(code_text),
+                str(e)
+            )
+
+    def analyze_file(self, path: str, filename: str, max_bytes: Optional[int] = None,
+                     profile: Optional[Dict] = None) -> Dict:
+        """CodeAnalyzer.analyze_stream over a file in a worker, or language and LOC only if that fails"""
+        try:
+            return self._with_profile(self._run(('file', (path, filename, max_bytes), profile)))
+        except SandboxError as e:
+            self._count('degraded')
+            analyzer = self._analyzer
+            with open(path, 'rb') as f:
+                reader = analyzer.iter_lines(iter(lambda: f.read(1024 * 1024), b''), max_bytes)
+                loc = 0
+                head = []
+                for line in reader:
+                    if len(head) < 200:
+                        head.append(line)
+                    if line.strip():
+                        loc += 1
+            analysis = self._degraded(analyzer.detect_language(filename, '\n'.join(head)), loc, str(e))
+            analysis['truncated'] = reader.truncated
+            analysis['bytes_read'] = reader.bytes_read
+            return analysis
+
+    @staticmethod
+    def _degraded(language: str, loc: int, reason: str) -> Dict:
+        return {
+            'language': language,
+            'loc': loc,
+            'libraries': [],
+            'functions': [],
+            'code_tree': None,
+            'tree_graphviz': None,
+            'degraded': reason
+        }
+
+    def close(self):
+        """Stop every worker"""
+        with self._lock:
+            workers, self._all = list(self._all), set()
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,92 @@
+"""Per-session store of model results with a byte budget
+
+Each BedrockHelper (one per Streamlit session) keeps the conversions it
+has shown in a SessionStore, so reruns do not ask the model again.
+Memory per session stays bounded: least recently used entries are
+evicted, and an evicted entry is read back from the shared response
+cache (response_cache.py) when it is needed again.
+
+    SESSION_STORE_BYTES=2097152    # budget per session (default 2 MB)
+"""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+# Bookkeeping per entry on top of the key and value (OrderedDict node and size record)
+ENTRY_OVERHEAD = 120
+
+
+class SessionStore:
+    """Per-session LRU of model results held within a byte budget
+
+    Least recently used entries are evicted once the budget is exceeded.
+    An evicted (or never seen) key is looked up with `load`, normally the
+    process-wide response cache, so eviction costs a SQLite read rather
+    than a model call, and each session keeps only what it is showing.
+    """
+
+    def __init__(self, max_bytes: int, load: Optional[Callable[[str], Optional[str]]] = None):
+        self.max_bytes = max_bytes
+        self.load = load
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.nbytes = 0
+        self._lock = threading.Lock()
+        # hits: served from memory; loads: served by `load` after a miss; evictions: entries dropped for space
+        self.stats = {'hits': 0, 'loads': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def sizeof(key: str, value: str) -> int:
+        return sys.getsizeof(key) + sys.getsizeof(value) + ENTRY_OVERHEAD
+
+    def get(self, key: str, load: bool = True) -> Optional[str]:
+        """The value for key, read back with `load` after a miss unless load is False"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return value
+        value = self.load(key) if load and self.load is not None else None
+        if value is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['loads'] += 1
+        self.put(key, value)
+        return value
+
+    def put(self, key: str, value: str):
+        size = self.sizeof(key, value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._sizes.pop(key)
+                del self._entries[key]
+            if size > self.max_bytes:
+                # Larger than the whole budget: hand it back to the caller without keeping it
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                self.nbytes -= self._sizes.pop(old_key)
+                self.stats['evictions'] += 1
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+
+    def usage(self) -> Dict[str, int]:
+        """Entries and bytes held, with the budget and counters, for display"""
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.nbytes, 'max_bytes': self.max_bytes, **self.stats}
@@ -0,0 +1,357 @@
+"""Near-duplicate detection for functions and files with MinHash + LSH
+
+Function bodies from CodeAnalyzer are normalised (comments and whitespace
+removed, identifiers / literals replaced by placeholders), cut into token
+shingles and summarised as MinHash signatures computed with NumPy. Banded
+LSH buckets give candidate matches without comparing against every stored
+signature; candidates are then ranked by estimated Jaccard similarity.
+
+    python similarity_index.py build <file-or-dir>... --index similarity_index.npz [--label NAME]
+    python similarity_index.py query <file> --index similarity_index.npz [--threshold 0.7]
+    python similarity_index.py bench [--functions 100000]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from code_analyzer import CodeAnalyzer
+
+DEFAULT_INDEX = os.path.join(current_dir, 'similarity_index.npz')
+
+# Kept verbatim when tokenising; every other identifier becomes a placeholder
+KEYWORDS = frozenset("""
+if else elif for while do return def class function var let const int long float double char bool boolean
+void public private protected static final new delete try catch except finally throw throws raise import from
+in and or not true false null nil None True False this self super switch case default break continue struct
+fn func fun go defer yield async await lambda with as is interface extends implements package namespace using
+""".split())
+
+_TOKEN_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[A-Za-z_]\w*|\d+(?:\.\d+)?|\S')
+
+# Shingles hashed per batch of MinHash work; bounds the (num_perm x shingles) matrix
+_SHINGLE_BATCH = 32768
+
+
+def tokenize(code: str, language: str, analyzer: CodeAnalyzer = None) -> List[str]:
+    """Comment-free tokens with identifiers, strings and numbers replaced by placeholders"""
+    normalized = (analyzer or CodeAnalyzer()).normalize_code(code, language)
+    tokens = []
+    for token in _TOKEN_RE.findall(normalized):
+        first = token[0]
+        if first == '"' or first == "'":
+            tokens.append('S')
+        elif first.isdigit():
+            tokens.append('N')
+        elif first.isalpha() or first == '_':
+            tokens.append(token if token in KEYWORDS else 'I')
+        else:
+            tokens.append(token)
+    # Python bodies come from the AST and are exact; braces there are dict / set literals
+    return tokens if language == 'Python' else _first_block(tokens)
+
+
+def _first_block(tokens: List[str]) -> List[str]:
+    """Cut tokens after the brace block that closes the function
+
+    Bodies from the generic parser are fixed-size line windows, so without
+    this neighbouring short functions would share most of their tokens.
+    """
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token == '{':
+            depth += 1
+        elif token == '}' and depth:
+            depth -= 1
+            if not depth:
+                return tokens[:i + 1]
+    return tokens
+
+
+class _LSHTable:
+    """Signatures plus banded LSH buckets for one kind of item (functions or files)"""
+
+    def __init__(self, num_perm: int, bands: int):
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self.meta: List[Dict] = []
+        self.buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        # Odd 64-bit multipliers that fold a band's rows into one bucket key
+        self._band_mult = np.random.default_rng(12345).integers(
+            1, 2 ** 63, size=self.rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        bands = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (bands * self._band_mult).sum(axis=2, dtype=np.uint64)
+
+    def add(self, signatures: np.ndarray, meta: List[Dict]):
+        start = len(self.meta)
+        self.signatures = np.concatenate([self.signatures, signatures]) if start else signatures
+        self.meta.extend(meta)
+        keys = self.band_keys(signatures)
+        for band, bucket in enumerate(self.buckets):
+            for offset, key in enumerate(keys[:, band].tolist()):
+                bucket.setdefault(key, []).append(start + offset)
+
+    def query(self, signature: np.ndarray, threshold: float, limit: int,
+              exclude_label: Optional[str] = None) -> List[Dict]:
+        keys = self.band_keys(signature[None, :])[0].tolist()
+        candidates = set()
+        for band, key in enumerate(keys):
+            candidates.update(self.buckets[band].get(key, ()))
+        if not candidates:
+            return []
+        ids = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self.signatures[ids] == signature).mean(axis=1)
+        order = np.argsort(-similarity, kind='stable')
+        matches = []
+        for i in order:
+            if similarity[i] < threshold or len(matches) >= limit:
+                break
+            meta = self.meta[ids[i]]
+            if exclude_label is not None and meta['label'] == exclude_label:
+                continue
+            matches.append(dict(meta, similarity=round(float(similarity[i]), 3)))
+        return matches
+
+
+class SimilarityIndex:
+    """MinHash/LSH index of function bodies and whole files
+
+    With the defaults (128 permutations in 16 bands of 8 rows) pairs above
+    roughly 0.7 estimated Jaccard similarity are very likely to share a
+    bucket, and pairs below 0.4 almost never do.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 5,
+                 min_shingles: int = 20, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash family: h(x) = (a * x + b) >> 32 for 32-bit x
+        self._a = rng.integers(1, 2 ** 32, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._powers = np.array([pow(1000003, shingle_size - 1 - i, 2 ** 64) for i in range(shingle_size)],
+                                dtype=np.uint64)
+        self._token_ids: Dict[str, int] = {}
+        self._analyzer = CodeAnalyzer()
+        self.functions = _LSHTable(num_perm, bands)
+        self.files = _LSHTable(num_perm, bands)
+
+    def _token_id(self, token: str) -> int:
+        token_id = self._token_ids.get(token)
+        if token_id is None:
+            # crc32 keeps ids stable across processes, so saved signatures stay comparable
+            token_id = self._token_ids[token] = zlib.crc32(token.encode('utf-8'))
+        return token_id
+
+    def shingles(self, tokens: Sequence[str]) -> np.ndarray:
+        """32-bit hashes of the token k-grams of one body"""
+        if len(tokens) < self.shingle_size:
+            return np.empty(0, dtype=np.uint64)
+        ids = np.fromiter((self._token_id(t) for t in tokens), dtype=np.uint64, count=len(tokens))
+        windows = np.lib.stride_tricks.sliding_window_view(ids, self.shingle_size)
+        hashes = (windows * self._powers).sum(axis=1, dtype=np.uint64)
+        return (hashes ^ (hashes >> np.uint64(32))) & np.uint64(0xFFFFFFFF)
+
+    def signatures(self, shingle_sets: Sequence[np.ndarray]) -> np.ndarray:
+        """MinHash signatures (len(shingle_sets) x num_perm), computed in vectorised batches"""
+        result = np.empty((len(shingle_sets), self.num_perm), dtype=np.uint32)
+        a = self._a[:, None]
+        b = self._b[:, None]
+        start = 0
+        while start < len(shingle_sets):
+            end = start
+            total = 0
+            while end < len(shingle_sets) and (end == start or total + len(shingle_sets[end]) <= _SHINGLE_BATCH):
+                total += len(shingle_sets[end])
+                end += 1
+            batch = np.concatenate(shingle_sets[start:end])
+            offsets = np.cumsum([0] + [len(s) for s in shingle_sets[start:end - 1]])
+            hashed = (a * batch[None, :] + b) >> np.uint64(32)
+            result[start:end] = np.minimum.reduceat(hashed, offsets, axis=1).T
+            start = end
+        return result
+
+    def _function_shingles(self, analysis: Dict) -> Tuple[List[np.ndarray], List[str]]:
+        shingle_sets, names = [], []
+        for func in analysis['functions']:
+            if len(func) < 3 or not func[2]:
+                continue
+            shingles = self.shingles(tokenize(func[2], analysis['language'], self._analyzer))
+            if len(shingles) >= self.min_shingles:
+                shingle_sets.append(shingles)
+                names.append(func[0])
+        return shingle_sets, names
+
+    def add_analysis(self, analysis: Dict, label: str) -> int:
+        """Index the functions of one analysed file (and the file itself); returns functions added"""
+        shingle_sets, names = self._function_shingles(analysis)
+        if not shingle_sets:
+            return 0
+        signatures = self.signatures(shingle_sets)
+        self.functions.add(signatures, [{'label': label, 'function': name} for name in names])
+        # A file's shingle set is the union of its functions', so its MinHash is the element-wise minimum
+        self.files.add(signatures.min(axis=0)[None, :], [{'label': label, 'language': analysis['language']}])
+        return len(names)
+
+    def query_function(self, code: str, language: str, threshold: float = 0.7, limit: int = 10,
+                       exclude_label: Optional[str] = None) -> List[Dict]:
+        """Stored functions similar to one function body"""
+        shingles = self.shingles(tokenize(code, language, self._analyzer))
+        if len(shingles) < self.min_shingles or not len(self.functions):
+            return []
+        return self.functions.query(self.signatures([shingles])[0], threshold, limit, exclude_label)
+
+    def query_analysis(self, analysis: Dict, threshold: float = 0.7, limit: int = 10,
+                       exclude_label: Optional[str] = None) -> Dict:
+        """Similar stored files, and similar stored functions for each function of the analysis"""
+        shingle_sets, names = self._function_shingles(analysis)
+        if not shingle_sets:
+            return {'files': [], 'functions': {}}
+        signatures = self.signatures(shingle_sets)
+        functions = {}
+        if len(self.functions):
+            for name, signature in zip(names, signatures):
+                matches = self.functions.query(signature, threshold, limit, exclude_label)
+                if matches:
+                    functions[name] = matches
+        files = self.files.query(signatures.min(axis=0), threshold, limit, exclude_label) if len(self.files) else []
+        return {'files': files, 'functions': functions}
+
+    def save(self, path: str):
+        config = {'num_perm': self.num_perm, 'bands': self.bands, 'shingle_size': self.shingle_size,
+                  'min_shingles': self.min_shingles, 'seed': self.seed}
+        np.savez_compressed(
+            path,
+            config=np.array(json.dumps(config)),
+            function_signatures=self.functions.signatures,
+            function_meta=np.array(json.dumps(self.functions.meta)),
+            file_signatures=self.files.signatures,
+            file_meta=np.array(json.dumps(self.files.meta)),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'SimilarityIndex':
+        """Load a saved index; LSH buckets are rebuilt from the signatures"""
+        with np.load(path) as data:
+            index = cls(**json.loads(str(data['config'])))
+            for table, prefix in ((index.functions, 'function'), (index.files, 'file')):
+                meta = json.loads(str(data[f'{prefix}_meta']))
+                if meta:
+                    table.add(data[f'{prefix}_signatures'], meta)
+        return index
+
+
+def _iter_files(roots: Iterable[str]) -> Iterable[str]:
+    analyzer = CodeAnalyzer()
+    for root in roots:
+        paths = [root] if os.path.isfile(root) else (
+            os.path.join(dirpath, name) for dirpath, _, filenames in os.walk(root) for name in sorted(filenames)
+        )
+        for path in paths:
+            if analyzer.detect_language(path) != 'Unknown':
+                yield path
+
+
+def _analyze_path(path: str) -> Dict:
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        return CodeAnalyzer().analyze(f.read(), os.path.basename(path))
+
+
+def bench(total: int, queries: int = 200):
+    """Index `total` synthetic functions and compare LSH queries with a brute-force scan"""
+    rng = np.random.default_rng(0)
+    vocabulary = ['I', '(', ')', '{', '}', ';', '=', '+', '-', '*', '<', 'N', 'S', ',', '.', '[', ']',
+                  'if', 'for', 'return', 'while', 'else', 'new', 'int']
+    index = SimilarityIndex()
+
+    def mutate(tokens: np.ndarray, rate: float) -> np.ndarray:
+        tokens = tokens.copy()
+        positions = rng.random(len(tokens)) < rate
+        tokens[positions] = rng.integers(0, len(vocabulary), positions.sum())
+        return tokens
+
+    # Families of near-duplicates: each base body appears a few times with small edits
+    bases = [rng.integers(0, len(vocabulary), rng.integers(40, 200)) for _ in range(total // 4)]
+    bodies = [mutate(bases[i % len(bases)], 0.03) for i in range(total)]
+
+    start = time.perf_counter()
+    shingle_sets = [index.shingles([vocabulary[t] for t in body]) for body in bodies]
+    shingled = time.perf_counter()
+    signatures = index.signatures(shingle_sets)
+    signed = time.perf_counter()
+    index.functions.add(signatures, [{'label': f'synthetic-{i}', 'function': f'f{i}'} for i in range(total)])
+    built = time.perf_counter()
+    print(f"functions={total} shingling={shingled - start:.1f}s minhash={signed - shingled:.1f}s "
+          f"({total / (signed - shingled):,.0f}/s) lsh={built - signed:.1f}s")
+
+    probes = [mutate(bases[i], 0.03) for i in rng.integers(0, len(bases), queries)]
+    probe_signatures = index.signatures([index.shingles([vocabulary[t] for t in body]) for body in probes])
+    start = time.perf_counter()
+    lsh_results = [index.functions.query(sig, 0.7, 10) for sig in probe_signatures]
+    lsh_time = (time.perf_counter() - start) / queries
+    start = time.perf_counter()
+    brute_results = []
+    for sig in probe_signatures:
+        similarity = (index.functions.signatures == sig).mean(axis=1)
+        brute_results.append(set(np.nonzero(similarity >= 0.7)[0].tolist()))
+    brute_time = (time.perf_counter() - start) / queries
+    found = sum(len({int(m['function'][1:]) for m in lsh} & brute) for lsh, brute in zip(lsh_results, brute_results))
+    expected = sum(min(len(brute), 10) for brute in brute_results)
+    print(f"query lsh={lsh_time * 1000:.2f} ms brute-force={brute_time * 1000:.2f} ms "
+          f"recall@10={found / max(1, expected):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash/LSH near-duplicate index for code")
+    parser.add_argument('command', choices=['build', 'query', 'bench'])
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--index', default=os.getenv('SIMILARITY_INDEX', DEFAULT_INDEX))
+    parser.add_argument('--label', default=None, help="build: label for the files (default: their path)")
+    parser.add_argument('--threshold', type=float, default=0.7)
+    parser.add_argument('--functions', type=int, default=100000, help="bench: stored functions")
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        bench(args.functions)
+    elif args.command == 'build':
+        index = SimilarityIndex.load(args.index) if os.path.exists(args.index) else SimilarityIndex()
+        added = 0
+        for path in _iter_files(args.paths):
+            added += index.add_analysis(_analyze_path(path), args.label or path)
+        index.save(args.index)
+        print(f"added {added} functions; index has {len(index.functions)} functions in {len(index.files)} files")
+    else:
+        index = SimilarityIndex.load(args.index)
+        for path in _iter_files(args.paths):
+            start = time.perf_counter()
+            result = index.query_analysis(_analyze_path(path), args.threshold, exclude_label=path)
+            print(f"{path} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+            for match in result['files']:
+                print(f"  file ~ {match['label']} ({match['similarity']:.2f})")
+            for name, matches in result['functions'].items():
+                for match in matches:
+                    print(f"  {name} ~ {match['label']}:{match['function']} ({match['similarity']:.2f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import itertools
+from array import array
+from typing import Iterator, Tuple, Union
+
+# Characters str.splitlines() treats as line boundaries ('\r\n' counts as one)
+_LINE_BREAKS = '\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029'
+
+
+class SourceBuffer:
+    """Immutable source text shared by the function records of one analysis
+
+    Lines are numbered as str.splitlines() numbers them. The line index is
+    built on first use, so an analysis whose code is never displayed or
+    sent to a model never pays for it.
+    """
+
+    __slots__ = ('text', '_line_starts')
+
+    def __init__(self, text: str):
+        self.text = text
+        self._line_starts = None
+
+    def line_starts(self) -> array:
+        """Character offset where each line starts, followed by the length of the text"""
+        if self._line_starts is None:
+            starts = array('Q', [0])
+            starts.extend(itertools.accumulate(map(len, self.text.splitlines(True))))
+            self._line_starts = starts
+        return self._line_starts
+
+    def line_count(self) -> int:
+        return len(self.line_starts()) - 1
+
+    def span(self, start_line: int, end_line: int) -> Tuple[int, int]:
+        """Character offsets of lines [start_line, end_line) without the last line break"""
+        starts = self.line_starts()
+        count = len(starts) - 1
+        start_line = min(max(start_line, 0), count)
+        end_line = min(max(end_line, start_line), count)
+        start, end = starts[start_line], starts[end_line]
+        text = self.text
+        if end > start and text[end - 1] in _LINE_BREAKS:
+            end -= 2 if text[end - 2:end] == '\r\n' and end - 2 >= start else 1
+        return start, end
+
+    def view(self, start_line: int, end_line: int) -> 'SourceView':
+        return SourceView(self, *self.span(start_line, end_line))
+
+    def lines(self, start_line: int, end_line: int) -> str:
+        """Lines [start_line, end_line) joined with '\\n'"""
+        start, end = self.span(start_line, end_line)
+        chunk = self.text[start:end]
+        lines = chunk.splitlines()
+        if chunk and chunk[-1] in _LINE_BREAKS:
+            # The range ends with an empty line, which splitlines() drops
+            lines.append('')
+        return '\n'.join(lines)
+
+
+class SourceView:
+    """Window onto a SourceBuffer, in the spirit of memoryview
+
+    Slicing returns another view without copying; str() and tobytes() copy
+    the text out.
+    """
+
+    __slots__ = ('buffer', 'start', 'end')
+
+    def __init__(self, buffer: SourceBuffer, start: int, end: int):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[str, 'SourceView']:
+        positions = range(self.start, self.end)
+        if isinstance(key, slice):
+            window = positions[key]
+            if window.step != 1:
+                raise ValueError("SourceView slices must be contiguous")
+            return SourceView(self.buffer, window.start, max(window.start, window.stop))
+        return self.buffer.text[positions[key]]
+
+    def __str__(self) -> str:
+        return self.buffer.text[self.start:self.end]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (SourceView, str)):
+            return len(self) == len(other) and str(self) == str(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    def __repr__(self) -> str:
+        return f"<SourceView [{self.start}:{self.end}] of {len(self.buffer.text)} chars>"
+
+    def tobytes(self, encoding: str = 'utf-8') -> bytes:
+        return str(self).encode(encoding)
+
+
+class FunctionRecord:
+    """A function entry whose code is a line range of a shared SourceBuffer
+
+    Stands in for the legacy (name, summary, code) tuple: it unpacks,
+    indexes, compares and hashes like one. The code is only copied out of
+    the buffer when .code (or [2]) is read; view() gives a zero-copy
+    SourceView instead.
+    """
+
+    __slots__ = ('name', 'summary', 'buffer', 'start_line', 'end_line')
+
+    def __init__(self, name: str, summary: str, buffer: SourceBuffer, start_line: int, end_line: int):
+        self.name = name
+        self.summary = summary
+        self.buffer = buffer
+        self.start_line = start_line
+        self.end_line = end_line
+
+    @classmethod
+    def from_code(cls, name: str, summary: str, code: str) -> 'FunctionRecord':
+        """Record owning its own code, e.g. a window kept while streaming"""
+        # Terminating the last line keeps a trailing empty line countable
+        buffer = SourceBuffer(code + '\n')
+        return cls(name, summary, buffer, 0, buffer.line_count())
+
+    @property
+    def code(self) -> str:
+        return self.buffer.lines(self.start_line, self.end_line)
+
+    def view(self) -> SourceView:
+        return self.buffer.view(self.start_line, self.end_line)
+
+    def with_summary(self, summary: str) -> 'FunctionRecord':
+        """Copy of the record with another summary, sharing the same buffer"""
+        return FunctionRecord(self.name, summary, self.buffer, self.start_line, self.end_line)
+
+    def __len__(self) -> int:
+        return 3
+
+    def __iter__(self) -> Iterator[str]:
+        yield self.name
+        yield self.summary
+        yield self.code
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        if index in (0, -3):
+            return self.name
+        if index in (1, -2):
+            return self.summary
+        if index in (2, -1):
+            return self.code
+        raise IndexError("FunctionRecord index out of range")
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (FunctionRecord, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(tuple(self))
+
+    def __repr__(self) -> str:
+        return f"FunctionRecord({self.name!r}, lines {self.start_line + 1}-{self.end_line})"
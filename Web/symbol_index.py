@@ -0,0 +1,283 @@
+"""Persistent symbol / library / language index over analysed submissions
+
+Files are keyed by the SHA-256 of their content, so re-adding an unchanged
+file (under any path or submission) costs one lookup and no re-analysis.
+
+    python symbol_index.py add <file-or-dir>... [--submission ID] [--db symbol_index.db]
+    python symbol_index.py symbol <name> [--prefix] [--kind function|class]
+    python symbol_index.py library <name>
+    python symbol_index.py language <name>
+    python symbol_index.py stats
+    python symbol_index.py bench [--files 20000]    # in a temporary database unless --db is given
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from code_analyzer import CodeAnalyzer
+
+DEFAULT_DB = os.path.join(current_dir, 'symbol_index.db')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    hash TEXT PRIMARY KEY,
+    language TEXT NOT NULL,
+    loc INTEGER NOT NULL,
+    added REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS paths (
+    submission TEXT NOT NULL,
+    path TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (submission, path)
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    name TEXT NOT NULL COLLATE NOCASE,
+    kind TEXT NOT NULL,
+    qualname TEXT NOT NULL,
+    line INTEGER,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS libraries (
+    name TEXT NOT NULL COLLATE NOCASE,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (name, hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_language ON files (language COLLATE NOCASE, hash);
+CREATE INDEX IF NOT EXISTS paths_hash ON paths (hash);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name, hash);
+CREATE INDEX IF NOT EXISTS symbols_hash ON symbols (hash);
+"""
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class SymbolIndex:
+    """Inverted index of symbol names, libraries and languages keyed by file content hash"""
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._analyzer = CodeAnalyzer()
+
+    def close(self):
+        self._conn.close()
+
+    def has(self, file_hash: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM files WHERE hash = ?", (file_hash,)).fetchone() is not None
+
+    def add(self, analysis: Dict, file_hash: str, path: str, submission: str = '') -> bool:
+        """Record one analysed file; returns False if its content was already indexed"""
+        with self._lock, self._conn:
+            return self._add(analysis, file_hash, path, submission)
+
+    def _add(self, analysis: Dict, file_hash: str, path: str, submission: str) -> bool:
+        self._conn.execute("INSERT OR REPLACE INTO paths (submission, path, hash) VALUES (?, ?, ?)",
+                           (submission, path, file_hash))
+        if self._conn.execute("SELECT 1 FROM files WHERE hash = ?", (file_hash,)).fetchone():
+            return False
+        self._conn.execute("INSERT INTO files (hash, language, loc, added) VALUES (?, ?, ?, ?)",
+                           (file_hash, analysis['language'], analysis['loc'], time.time()))
+        self._conn.executemany("INSERT OR IGNORE INTO libraries (name, hash) VALUES (?, ?)",
+                               [(lib, file_hash) for lib in analysis['libraries']])
+        self._conn.executemany("INSERT INTO symbols (name, kind, qualname, line, hash) VALUES (?, ?, ?, ?, ?)",
+                               [row + (file_hash,) for row in self._symbols(analysis)])
+        return True
+
+    @staticmethod
+    def _symbols(analysis: Dict) -> List[tuple]:
+        """(name, kind, qualname, line) for every class and function, without duplicates"""
+        rows = {}
+        for node in analysis.get('code_tree') or []:
+            rows.setdefault((node['type'], node['qualname']), (node['name'], node['type'], node['qualname'], node['line']))
+        # The inventory can find functions the structure tree does not
+        in_tree = {row[0] for row in rows.values() if row[1] == 'function'}
+        for func in analysis['functions']:
+            if func[0] not in in_tree:
+                rows.setdefault(('function', func[0]), (func[0], 'function', func[0], None))
+        return list(rows.values())
+
+    def add_file(self, path: str, submission: str = '', data: bytes = None) -> bool:
+        """Analyse and index one file; unchanged content is not analysed again"""
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        file_hash = content_hash(data)
+        analysis = None
+        if not self.has(file_hash):
+            analysis = self._analyzer.analyze(data.decode('utf-8', errors='ignore'), os.path.basename(path))
+        with self._lock, self._conn:
+            if analysis is None:
+                self._conn.execute("INSERT OR REPLACE INTO paths (submission, path, hash) VALUES (?, ?, ?)",
+                                   (submission, path, file_hash))
+                return False
+            return self._add(analysis, file_hash, path, submission)
+
+    def add_tree(self, root: str, submission: Optional[str] = None) -> Dict[str, int]:
+        """Index every file below root; the submission defaults to root's name"""
+        submission = submission if submission is not None else os.path.basename(os.path.abspath(root))
+        counts = {'files': 0, 'new': 0}
+        paths = [root] if os.path.isfile(root) else (
+            os.path.join(dirpath, name)
+            for dirpath, dirnames, filenames in os.walk(root)
+            for name in sorted(filenames)
+        )
+        for path in paths:
+            if self._analyzer.detect_language(path) == 'Unknown':
+                continue
+            counts['files'] += 1
+            counts['new'] += self.add_file(path, submission)
+        return counts
+
+    # Results are ordered by content hash so every query can walk an index instead of sorting all matches
+    def _query(self, sql: str, params: Iterable) -> List[Dict]:
+        with self._lock:
+            cursor = self._conn.execute(sql, tuple(params))
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def find_symbol(self, name: str, kind: str = None, prefix: bool = False, limit: int = 100) -> List[Dict]:
+        """Files (and their submissions) defining a class or function, case-insensitively"""
+        if prefix:
+            # Range scan on the NOCASE index instead of LIKE, which cannot use it with parameters
+            condition, params = "s.name >= ? AND s.name < ?", [name, name + '\U0010ffff']
+        else:
+            condition, params = "s.name = ?", [name]
+        if kind:
+            condition += " AND s.kind = ?"
+            params.append(kind)
+        return self._query(
+            "SELECT s.name, s.kind, s.qualname, s.line, s.hash, f.language, p.submission, p.path "
+            "FROM symbols s JOIN files f ON f.hash = s.hash JOIN paths p ON p.hash = s.hash "
+            f"WHERE {condition} ORDER BY s.name, s.hash, p.submission, p.path, s.line LIMIT ?",
+            params + [limit]
+        )
+
+    def find_library(self, name: str, limit: int = 100) -> List[Dict]:
+        """Files (and their submissions) importing a library"""
+        return self._query(
+            "SELECT l.name AS library, l.hash, f.language, p.submission, p.path "
+            "FROM libraries l JOIN files f ON f.hash = l.hash JOIN paths p ON p.hash = l.hash "
+            "WHERE l.name = ? ORDER BY l.hash, p.submission, p.path LIMIT ?",
+            (name, limit)
+        )
+
+    def find_language(self, language: str, limit: int = 100) -> List[Dict]:
+        """Files written in a language"""
+        return self._query(
+            "SELECT f.hash, f.language, f.loc, p.submission, p.path "
+            "FROM files f JOIN paths p ON p.hash = f.hash "
+            "WHERE f.language = ? COLLATE NOCASE ORDER BY f.hash, p.submission, p.path LIMIT ?",
+            (language, limit)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('files', 'paths', 'symbols', 'libraries')
+            }
+
+
+def _print_rows(rows: List[Dict]):
+    for row in rows:
+        print('  '.join(f"{key}={value}" for key, value in row.items() if key != 'hash'))
+    print(f"({len(rows)} rows)")
+
+
+def bench(db: Optional[str], files: int):
+    """Index synthetic files, then time typical queries
+
+    Without a database path the files go to a temporary database, removed
+    afterwards, so the bench never fills the real index with fake files.
+    """
+    import random
+    if db is None:
+        import tempfile
+        with tempfile.TemporaryDirectory(prefix='symbol_index_bench_') as tmp:
+            bench(os.path.join(tmp, 'bench.db'), files)
+        return
+    rng = random.Random(0)
+    words = ['load', 'save', 'parse', 'merge', 'sort', 'find', 'build', 'check', 'count', 'split']
+    libs = ['os', 'sys', 'json', 're', 'numpy', 'pandas', 'requests', 'flask', 'django', 'torch']
+    index = SymbolIndex(db)
+    start = time.perf_counter()
+    with index._lock, index._conn:
+        for i in range(files):
+            names = {f"{rng.choice(words)}_{rng.choice(words)}_{rng.randrange(500)}" for _ in range(10)}
+            nodes = [{'type': 'function', 'name': n, 'qualname': n, 'line': j + 1} for j, n in enumerate(sorted(names))]
+            analysis = {'language': rng.choice(['Python', 'Java', 'Go']), 'loc': 100,
+                        'libraries': rng.sample(libs, 3), 'functions': [], 'code_tree': nodes}
+            index._add(analysis, content_hash(str(i).encode()), f"file_{i}.py", f"candidate_{i % 1000}")
+    print(f"indexed {files} files in {time.perf_counter() - start:.1f}s: {index.stats()}")
+    queries = [
+        ('symbol exact', lambda: index.find_symbol('parse_sort_42')),
+        ('symbol prefix', lambda: index.find_symbol('merge_split_1', prefix=True)),
+        ('library', lambda: index.find_library('torch')),
+        ('language', lambda: index.find_language('Go')),
+    ]
+    for label, query in queries:
+        start = time.perf_counter()
+        for _ in range(20):
+            rows = query()
+        print(f"{label:<14} {len(rows):>4} rows  {(time.perf_counter() - start) / 20 * 1000:.2f} ms")
+    index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Symbol index over analysed submissions")
+    parser.add_argument('command', choices=['add', 'symbol', 'library', 'language', 'stats', 'bench'])
+    parser.add_argument('args', nargs='*')
+    parser.add_argument('--db', default=None,
+                        help="index database (default: SYMBOL_INDEX_DB or symbol_index.db; bench: a temporary one)")
+    parser.add_argument('--submission', default=None, help="add: submission id (default: directory name)")
+    parser.add_argument('--prefix', action='store_true', help="symbol: match names starting with the query")
+    parser.add_argument('--kind', choices=['function', 'class'], default=None)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--files', type=int, default=20000, help="bench: synthetic files to index")
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        bench(args.db, args.files)
+        return
+    index = SymbolIndex(args.db or os.getenv('SYMBOL_INDEX_DB', DEFAULT_DB))
+    if args.command == 'add':
+        for root in args.args:
+            start = time.perf_counter()
+            counts = index.add_tree(root, args.submission)
+            print(f"{root}: {counts['files']} files, {counts['new']} new, {time.perf_counter() - start:.2f}s")
+    elif args.command == 'stats':
+        print(index.stats())
+    else:
+        if not args.args:
+            parser.error(f"{args.command} needs a name")
+        start = time.perf_counter()
+        if args.command == 'symbol':
+            rows = index.find_symbol(args.args[0], args.kind, args.prefix, args.limit)
+        elif args.command == 'library':
+            rows = index.find_library(args.args[0], args.limit)
+        else:
+            rows = index.find_language(args.args[0], args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        _print_rows(rows)
+        print(f"{elapsed:.2f} ms")
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import pytest
+
+import analysis_codec
+from analysis_codec import CodecError, decode, decode_metrics, encode
+from code_analyzer import CodeAnalyzer
+from sandbox import SandboxPool
+
+PYTHON = '''import os
+from collections import OrderedDict
+
+
+class Store:
+    """Keeps things"""
+
+    def get(self, key, default=None):
+        # café: non-ASCII survives
+        return self.items.get(key, default)
+
+    def put(self, key, value):
+        if key:
+            self.items[key] = value
+
+
+def main(argv):
+    return 0
+'''
+
+C = '''#include <stdio.h>
+
+int add(int a, int b) {
+    return a + b;
+}
+
+/* twice */
+int twice(int a) {
+    return add(a, a);
+}
+'''
+
+
+def analyses():
+    analyzer = CodeAnalyzer()
+    yield analyzer.analyze(PYTHON, 'store.py')
+    yield analyzer.analyze(C, 'add.c')
+    # Streamed: every function owns its own window
+    yield analyzer.analyze_stream([C.encode('utf-8')], 'add.c')
+    # No functions or tree at all
+    yield analyzer.analyze('', 'empty.py')
+    # What the sandbox answers when the full analysis is stopped
+    yield SandboxPool._degraded('Python', 17, 'timed out after 10s')
+
+
+def comparable(analysis, code=True):
+    functions = [tuple(func) if code else tuple(func)[:2] for func in analysis['functions']]
+    tree = list(analysis['code_tree'] or [])
+    return analysis['language'], analysis['loc'], list(analysis['libraries']), functions, tree, analysis.get('metrics')
+
+
+@pytest.mark.parametrize('source', ['functions', 'full'])
+@pytest.mark.parametrize('compress', [True, False])
+def test_round_trip(source, compress):
+    for analysis in analyses():
+        decoded = decode(encode(analysis, source=source, compress=compress))
+        assert comparable(decoded) == comparable(analysis)
+        assert decoded['tree_graphviz'] == analysis['tree_graphviz']
+        for key in ('truncated', 'bytes_read', 'degraded'):
+            assert decoded.get(key) == analysis.get(key)
+
+
+def test_full_source_keeps_the_whole_file():
+    analysis = CodeAnalyzer().analyze(PYTHON, 'store.py')
+    decoded = decode(encode(analysis, source='full'))
+    assert decoded['functions'][0].buffer.text == PYTHON
+    # Only the lines functions cover are stored by default
+    assert len(encode(analysis, compress=False)) < len(encode(analysis, source='full', compress=False))
+
+
+def test_without_code():
+    analysis = CodeAnalyzer().analyze(PYTHON, 'store.py')
+    for data in (encode(analysis, source='none'), encode(analysis)):
+        decoded = decode(data, code=False)
+        assert decoded['functions'] == [tuple(func)[:2] for func in analysis['functions']]
+    assert comparable(decode(encode(analysis, source='none')), code=False) == comparable(analysis, code=False)
+
+
+def test_without_tree():
+    analysis = CodeAnalyzer().analyze(PYTHON, 'store.py')
+    decoded = decode(encode(analysis), tree=False)
+    assert decoded['code_tree'] is None and decoded['tree_graphviz'] is None
+    assert [tuple(f) for f in decoded['functions']] == [tuple(f) for f in analysis['functions']]
+
+
+def test_legacy_tuples_and_dict_tree():
+    analysis = CodeAnalyzer().analyze(PYTHON, 'store.py')
+    legacy = dict(analysis, functions=[tuple(func) for func in analysis['functions']],
+                  code_tree=list(analysis['code_tree']))
+    decoded = decode(encode(legacy))
+    assert [tuple(f) for f in decoded['functions']] == legacy['functions']
+    assert decoded['code_tree'].qualnames == analysis['code_tree'].qualnames
+
+
+def test_metrics_alone():
+    analysis = CodeAnalyzer().analyze(PYTHON, 'store.py')
+    meta = decode_metrics(encode(analysis))
+    assert (meta['language'], meta['loc'], meta['libraries']) == ('Python', analysis['loc'], analysis['libraries'])
+    assert meta['function_count'] == len(analysis['functions'])
+    assert meta['tree_size'] == len(analysis['code_tree'])
+    assert meta['metrics'] == analysis['metrics']
+
+
+def test_rejects_other_data_and_newer_versions():
+    with pytest.raises(CodecError):
+        decode(b'')
+    with pytest.raises(CodecError):
+        decode(b'PK\x03\x04' + bytes(20))
+    data = bytearray(encode(CodeAnalyzer().analyze(PYTHON, 'store.py')))
+    data[3] = analysis_codec.FORMAT_VERSION + 1
+    with pytest.raises(CodecError):
+        decode(bytes(data))
+
+
+def test_unknown_sections_are_skipped():
+    analysis = CodeAnalyzer().analyze(C, 'add.c')
+    data = encode(analysis)
+    magic, version, count = analysis_codec._HEADER.unpack_from(data)
+    entries = [analysis_codec._ENTRY.unpack_from(data, analysis_codec._HEADER.size + i * analysis_codec._ENTRY.size)
+               for i in range(count)]
+    # A section id from a newer writer, appended after the known ones
+    extra = b'future'
+    shift = analysis_codec._ENTRY.size
+    header = analysis_codec._HEADER.pack(magic, version, count + 1)
+    directory = b''.join(analysis_codec._ENTRY.pack(sid, flags, offset + shift, length)
+                         for sid, flags, offset, length in entries)
+    directory += analysis_codec._ENTRY.pack(200, 0, len(data) + shift, len(extra))
+    body = data[analysis_codec._HEADER.size + count * analysis_codec._ENTRY.size:]
+    assert comparable(decode(header + directory + body + extra)) == comparable(analysis)
@@ -0,0 +1,51 @@
+import glob
+import os
+
+import pytest
+
+from code_analyzer import CodeAnalyzer
+
+SAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', '..', 'Code_For_Test', '*')))
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def comparable(analysis):
+    return {
+        'language': analysis['language'],
+        'loc': analysis['loc'],
+        'libraries': list(analysis['libraries']),
+        'functions': [tuple(func) for func in analysis['functions']],
+        'code_tree': list(analysis['code_tree'] or []),
+        'metrics': analysis['metrics'],
+    }
+
+
+def variants(text):
+    """The text as is, with extra trailing blank lines, without a final line break, and with CRLF"""
+    return [text, text + '\n\n', text.rstrip('\n'), text.replace('\n', '\r\n')]
+
+
+@pytest.mark.parametrize('path', SAMPLES, ids=os.path.basename)
+def test_stream_matches_analyze(path):
+    analyzer = CodeAnalyzer()
+    name = os.path.basename(path)
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    for variant in variants(text):
+        expected = comparable(analyzer.analyze(variant, name))
+        data = variant.encode('utf-8')
+        # Chunk sizes that split lines, CRLF pairs and multi-byte characters
+        for size in (len(data) or 1, 7, 1):
+            streamed = analyzer.analyze_stream(chunked(data, size), name)
+            assert comparable(streamed) == expected
+            assert streamed['truncated'] is False
+
+
+@pytest.mark.parametrize('text', ['', '\n', 'x = 1', 'x = 1\n\n\n', '\n\ndef f():\n    return 1\n\n'])
+def test_python_edge_cases(text):
+    analyzer = CodeAnalyzer()
+    expected = comparable(analyzer.analyze(text, 'edge.py'))
+    assert comparable(analyzer.analyze_stream([text.encode('utf-8')], 'edge.py')) == expected
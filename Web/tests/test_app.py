@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+SOURCE = b'''class Greeter:
+    def greet(self, name):
+        return "hello " + name
+
+
+def main():
+    print(Greeter().greet("world"))
+'''
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    monkeypatch.setenv('BEDROCK_MOCK', '1')
+    monkeypatch.setenv('BEDROCK_RESPONSE_CACHE', '')
+    monkeypatch.setenv('ANALYSIS_SANDBOX_WORKERS', '0')
+    monkeypatch.setenv('PROFILE_DIR', str(tmp_path / 'profiles'))
+    monkeypatch.setenv('PROFILE_MAX_SECONDS', '10')
+    # Shared resources (profile store, sandbox, ...) would keep another test's configuration
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.session_state['authenticated'] = True
+    at.session_state['username'] = 'admin'
+    at.run()
+    assert not at.exception
+    return at
+
+
+def test_upload_is_analysed(app):
+    app.file_uploader[0].set_value(('greeter.py', SOURCE, 'text/plain')).run()
+    assert not app.exception
+    assert any('Greeter' in block.value for block in app.code)
+
+
+def test_profile_this_files_analysis(app):
+    app.file_uploader[0].set_value(('greeter.py', SOURCE, 'text/plain')).run()
+    # analyze_upload's result is unpacked here as well as in the main analysis block
+    app.button(key='profile_analysis_btn').click().run()
+    assert not app.exception
+    assert len(os.listdir(os.environ['PROFILE_DIR'])) == 1
+
+
+@pytest.mark.parametrize('workers', ['0', '1'])
+def test_large_upload_hash_covers_the_whole_file(app, monkeypatch, workers):
+    import hashlib
+    monkeypatch.setenv('ANALYSIS_MAX_BYTES', str(1024 * 1024))
+    monkeypatch.setenv('ANALYSIS_SANDBOX_WORKERS', workers)
+    # Past the streaming threshold, and far past the analysis limit
+    data = SOURCE * (6 * 1024 * 1024 // len(SOURCE) + 1)
+    app.file_uploader[0].set_value(('big.py', data, 'text/plain')).run()
+    assert not app.exception
+    _, analysis, code_hash = app.session_state['upload_analysis']
+    assert analysis['truncated']
+    assert code_hash == hashlib.sha256(data).hexdigest()
@@ -0,0 +1,98 @@
+import ast
+
+from code_analyzer import CodeAnalyzer
+from code_tree import CodeTree
+
+SOURCE = '''
+class Shape:
+    def __init__(self, name, sides):
+        pass
+
+    def area(self):
+        def helper(x):
+            return x
+        return helper(0)
+
+
+class Circle(Shape):
+    def area(self):
+        return 3.14
+
+    class Meta:
+        ordering = None
+
+
+def main(argv, env, stdin, stdout, stderr):
+    pass
+'''
+
+# Nodes named like an outer parent: a bare parent name resolves to the inner one
+SHADOWED = '''
+class C:
+    class D:
+        class C:
+            pass
+    def method(self):
+        pass
+'''
+
+LEGACY_FIELDS = ('type', 'name', 'parent', 'level', 'args')
+
+
+def legacy_tree(source):
+    """build_code_tree as it was before CodeTree: a list of dicts whose parent is a name"""
+    structure = []
+
+    def visit_node(node, parent_name="", level=0):
+        if isinstance(node, ast.Module):
+            for child in ast.iter_child_nodes(node):
+                visit_node(child, "", level)
+        elif isinstance(node, ast.ClassDef):
+            structure.append({'type': 'class', 'name': node.name, 'parent': parent_name,
+                              'level': level, 'children': []})
+            for child in ast.iter_child_nodes(node):
+                visit_node(child, node.name, level + 1)
+        elif isinstance(node, ast.FunctionDef):
+            structure.append({'type': 'function', 'name': node.name, 'parent': parent_name, 'level': level,
+                              'args': [a.arg for a in node.args.args if a.arg != 'self']})
+            for child in ast.iter_child_nodes(node):
+                visit_node(child, node.name, level + 1)
+
+    visit_node(ast.parse(source))
+    return structure
+
+
+def legacy_fields(nodes):
+    return [tuple(node.get(field, []) for field in LEGACY_FIELDS) for node in nodes]
+
+
+def test_matches_the_old_tree_output():
+    tree = CodeAnalyzer().build_code_tree(SOURCE)
+    assert legacy_fields(tree) == legacy_fields(legacy_tree(SOURCE))
+    assert legacy_fields(tree.to_dicts()) == legacy_fields(legacy_tree(SOURCE))
+
+
+def test_from_old_dicts_rebuilds_the_same_tree():
+    tree = CodeAnalyzer().build_code_tree(SOURCE)
+    rebuilt = CodeTree.from_dicts(legacy_tree(SOURCE))
+    assert list(rebuilt.parents) == list(tree.parents)
+    assert rebuilt.qualnames == tree.qualnames
+    # Legacy dicts carry no line numbers, which the renderers do not use
+    assert rebuilt.to_dot() == tree.to_dot()
+    assert rebuilt.to_text() == tree.to_text()
+
+
+def test_to_dicts_round_trips():
+    for source in (SOURCE, SHADOWED):
+        tree = CodeAnalyzer().build_code_tree(source)
+        rebuilt = CodeTree.from_dicts(tree.to_dicts())
+        assert rebuilt.to_dicts() == tree.to_dicts()
+
+
+def test_parent_index_wins_over_a_shadowed_name():
+    tree = CodeAnalyzer().build_code_tree(SHADOWED)
+    assert tree.qualnames == ['C', 'C.D', 'C.D.C', 'C.method']
+    assert CodeTree.from_dicts(tree.to_dicts()).qualnames[-1] == 'C.method'
+    # Without indexes the old name lookup is all there is
+    legacy = [{key: value for key, value in node.items() if key != 'parent_index'} for node in tree.to_dicts()]
+    assert CodeTree.from_dicts(legacy).qualnames[-1] == 'C.D.C.method'
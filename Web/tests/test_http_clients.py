@@ -0,0 +1,37 @@
+import asyncio
+
+from bedrock_helper import BedrockHelper, _async_clients
+
+
+def bearer_helper(**kwargs):
+    bedrock = BedrockHelper(mock=False, response_cache=None, **kwargs)
+    # Skip credential discovery: only the pooled client is under test
+    bedrock._auth_resolved = True
+    bedrock.use_bearer_token = True
+    bedrock.bearer_token = 'test'
+    return bedrock
+
+
+def test_helpers_on_one_loop_share_a_client():
+    async def main():
+        first, second = bearer_helper(), bearer_helper()
+        client = first._state_for_loop()['client']
+        assert client is not None
+        assert second._state_for_loop()['client'] is client
+        # A different deadline gets its own client
+        assert bearer_helper(call_timeout=5.0)._state_for_loop()['client'] is not client
+        await first.aclose()
+        assert client.is_closed
+        assert asyncio.get_running_loop() not in _async_clients
+
+    asyncio.run(main())
+
+
+def test_each_loop_gets_its_own_client():
+    async def client_of(bedrock):
+        client = bedrock._state_for_loop()['client']
+        await bedrock.aclose()
+        return client
+
+    bedrock = bearer_helper()
+    assert asyncio.run(client_of(bedrock)) is not asyncio.run(client_of(bedrock))
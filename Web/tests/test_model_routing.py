@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+
+from bedrock_helper import BedrockHelper
+from model_router import AUTO_MODEL_ID, DEFAULT_MODELS, MODEL_CATALOG, ModelRouter, enabled_models
+
+
+def helper():
+    return BedrockHelper(mock=True, router=ModelRouter(MODEL_CATALOG))
+
+
+@pytest.mark.parametrize('task, failure', [
+    ('conversion', "HTTP_ERROR: Access denied. Please check your API permissions."),
+    ('conversion', "HTTP_ERROR: Rate limit exceeded. Please try again later."),
+    ('conversion', "SYSTEM_ERROR: Error converting to Go: Model call exceeded its 60.0s deadline"),
+    ('conversion', "MODEL_ERROR: The current model cannot process this request."),
+    ('summary', "Function: f (Error: Claude API error: AccessDeniedException)"),
+    ('summary', "Function: f (Model error: sorry)"),
+])
+def test_auto_falls_back_on_any_failure(task, failure):
+    bedrock = helper()
+    calls = []
+
+    async def call(model_id):
+        calls.append(model_id)
+        return failure if len(calls) == 1 else "answer"
+
+    result = asyncio.run(bedrock._acall_with_routing(task, "def f(): pass", AUTO_MODEL_ID, call))
+    assert result == "answer"
+    assert len(calls) == 2 and calls[0] != calls[1]
+
+
+def test_no_fallback_once_the_deadline_has_passed():
+    bedrock = helper()
+    calls = []
+
+    async def call(model_id):
+        calls.append(model_id)
+        return "SYSTEM_ERROR: Error converting to Go: Model call deadline passed"
+
+    deadline = time.monotonic() - 1
+    result = asyncio.run(bedrock._acall_with_routing('conversion', "x", AUTO_MODEL_ID, call, deadline))
+    assert result.startswith("SYSTEM_ERROR:")
+    assert len(calls) == 1
+
+
+def test_explicit_model_is_not_replaced():
+    bedrock = helper()
+    calls = []
+
+    async def call(model_id):
+        calls.append(model_id)
+        return "HTTP_ERROR: Access denied."
+
+    asyncio.run(bedrock._acall_with_routing('conversion', "x", 'amazon.titan-text-lite-v1', call))
+    assert calls == ['amazon.titan-text-lite-v1']
+
+
+def test_only_enabled_models_are_offered(monkeypatch):
+    monkeypatch.delenv('BEDROCK_MODELS', raising=False)
+    assert [m['modelId'] for m in enabled_models()] == list(DEFAULT_MODELS)
+    offered = [m['modelId'] for m in BedrockHelper(mock=True, router=ModelRouter()).get_available_models()]
+    assert offered == [DEFAULT_MODELS[0], AUTO_MODEL_ID, *DEFAULT_MODELS[1:]]
+    monkeypatch.setenv('BEDROCK_MODELS', 'amazon.titan-text-lite-v1,anthropic.claude-3-haiku-20240307-v1:0')
+    assert [m['modelId'] for m in enabled_models()] == ['amazon.titan-text-lite-v1',
+                                                         'anthropic.claude-3-haiku-20240307-v1:0']
+
+
+def test_failing_model_cools_down_behind_healthy_ones():
+    router = ModelRouter([m for m in MODEL_CATALOG if m['modelId'] in DEFAULT_MODELS])
+    lite, express = DEFAULT_MODELS
+    # A small conversion wants tier 1, which only Express offers
+    assert router.route('conversion', "x") == [express, lite]
+    for _ in range(router.failure_limit - 1):
+        router.record(express, 0.1, ok=False)
+    assert router.route('conversion', "x") == [express, lite]
+    router.record(express, 0.1, ok=False)
+    assert router.route('conversion', "x") == [lite, express]
+    assert router.route('summary', "x") == [lite, express]
+    # A success ends the cooldown
+    router.record(express, 0.1, ok=True)
+    assert router.route('conversion', "x") == [express, lite]
+
+
+def test_cooldown_expires(monkeypatch):
+    router = ModelRouter([m for m in MODEL_CATALOG if m['modelId'] in DEFAULT_MODELS], cooldown=30.0)
+    lite, express = DEFAULT_MODELS
+    for _ in range(router.failure_limit):
+        router.record(express, 0.1, ok=False)
+    assert router.route('conversion', "x")[0] == lite
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 31)
+    assert router.route('conversion', "x")[0] == express
+    # Failing again right after the cooldown starts another one
+    router.record(express, 0.1, ok=False)
+    assert router.route('conversion', "x")[0] == lite
+
+
+def test_auto_skips_a_cooling_model_first():
+    bedrock = BedrockHelper(mock=True, router=ModelRouter(
+        [m for m in MODEL_CATALOG if m['modelId'] in DEFAULT_MODELS]))
+    lite, express = DEFAULT_MODELS
+    calls = []
+
+    async def call(model_id):
+        calls.append(model_id)
+        return "HTTP_ERROR: Access denied." if model_id == express else "answer"
+
+    for _ in range(bedrock.router.failure_limit):
+        asyncio.run(bedrock._acall_with_routing('conversion', "x", AUTO_MODEL_ID, call))
+    calls.clear()
+    assert asyncio.run(bedrock._acall_with_routing('conversion', "x", AUTO_MODEL_ID, call)) == "answer"
+    assert calls == [lite]
@@ -0,0 +1,50 @@
+import pytest
+
+from code_analyzer import CodeAnalyzer
+
+analyzer = CodeAnalyzer()
+
+
+def normalize(code, language):
+    return analyzer.normalize_code(code, language)
+
+
+def test_python_indentation_is_kept():
+    loop_return = "def f(xs):\n    for x in xs:\n        if x:\n            return 1\n    return 0\n"
+    body_return = "def f(xs):\n    for x in xs:\n        if x:\n            return 1\n        return 0\n"
+    assert normalize(loop_return, 'Python') != normalize(body_return, 'Python')
+
+
+@pytest.mark.parametrize('language', ['Python', 'Java', 'JavaScript', 'SQL'])
+def test_string_whitespace_is_kept(language):
+    assert normalize('s = "a  # b"', language) != normalize('s = "a # b"', language)
+    assert normalize("s = 'a  -- b'", language) != normalize("s = 'a -- b'", language)
+
+
+def test_python_triple_quoted_strings_are_kept():
+    first = 'def f():\n    return """a\n\n    b"""\n'
+    second = 'def f():\n    return """a\n    b"""\n'
+    assert normalize(first, 'Python') != normalize(second, 'Python')
+
+
+def test_python_comments_and_blank_lines_are_ignored():
+    plain = "def f(x):\n    y = x + 1\n    return y\n"
+    noisy = "def f(x):  # entry\n\n    # add one\n    y = x + 1   \n\n    return y  # done\n# trailing"
+    assert normalize(plain, 'Python') == normalize(noisy, 'Python')
+
+
+def test_python_methods_match_functions():
+    function = "def f(x):\n    return x\n"
+    method = "    def f(x):\n        return x\n"
+    assert normalize(function, 'Python') == normalize(method, 'Python')
+
+
+def test_brace_languages_ignore_layout_and_comments():
+    plain = 'int f() { return "a  b"; }'
+    noisy = 'int f() {\n    /* why */ return  "a  b"; // c\n}\n'
+    assert normalize(plain, 'Java') == normalize(noisy, 'Java')
+
+
+def test_comment_markers_in_strings_survive():
+    assert '"http://x"' in normalize('url = "http://x" // c', 'JavaScript')
+    assert "'#'" in normalize("c = '#'  # c", 'Python')
@@ -0,0 +1,62 @@
+import glob
+import os
+
+import pytest
+
+from code_analyzer import CodeAnalyzer
+
+SAMPLES = sorted(path for path in glob.glob(os.path.join(os.path.dirname(__file__), '..', '..', 'Code_For_Test', '*'))
+                 if not path.endswith('.py'))
+WORKERS = 2
+
+# Declarations a blank line parts from their body; only every fourth one is followed by a
+# blank line where a chunk may start, so a careless split would fall inside one
+PARTED = {
+    'parted.c': (lambda i: f'int f{i}(int a)\n\n{{\n    return a;\n}}\n', 'int g(int b) {\n    return b;\n}\n\n'),
+    'Parted.java': (lambda i: f'public class C{i}\n\n{{\n    public int m(int a)\n    {{\n        return a;\n    }}\n}}\n',
+                    'class D {\n    void n() { }\n}\n\n'),
+    'parted.go': (lambda i: f'func f{i}(a int,\n\n    b int) int {{\n    return a\n}}\n', 'func g() {\n}\n\n'),
+    'parted.rb': (lambda i: f'class K{i}\n  def m{i}(x)\n    y = x\n\n    y + 1\n  end\nend\n', 'def n\n  2\nend\n\n'),
+}
+
+
+def comparable(analysis):
+    return {
+        'libraries': list(analysis['libraries']),
+        'functions': [tuple(func) for func in analysis['functions']],
+        'code_tree': list(analysis['code_tree'] or []),
+        'tree_graphviz': analysis['tree_graphviz'],
+        'metrics': analysis['metrics'],
+    }
+
+
+def sources():
+    for path in SAMPLES:
+        with open(path, encoding='utf-8') as f:
+            # Repeated, so function windows run across chunk boundaries
+            yield os.path.basename(path), f.read() * 3
+    for name, (parted, closing) in PARTED.items():
+        yield name, ''.join(parted(i) + (closing if i % 4 == 3 else '') for i in range(40))
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    # Small inputs take the parallel path too
+    monkeypatch.setattr(CodeAnalyzer, 'PARALLEL_MIN_LINES', 1)
+    return CodeAnalyzer()
+
+
+def test_parallel_scan_matches_serial(analyzer):
+    for name, text in sources():
+        # More than one chunk, or analyze() falls back to the serial scan
+        assert len(analyzer.split_top_level(text.splitlines(), WORKERS * 4)) > 2, name
+        parallel = analyzer.analyze(text, name, workers=WORKERS)
+        assert comparable(parallel) == comparable(analyzer.analyze(text, name)), name
+
+
+def test_no_split_inside_a_parted_declaration(analyzer):
+    lines = ['public class C', '', '{', '    int x;', '}', '', 'class D {', '}', ''] * 4
+    bounds = analyzer.split_top_level(lines, 8)
+    assert len(bounds) > 2
+    # Every chunk starts after a blank line that follows a closing brace
+    assert all(lines[bound - 1] == '' and lines[bound - 2] == '}' for bound in bounds[1:-1])
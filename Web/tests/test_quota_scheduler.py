@@ -0,0 +1,122 @@
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+from quota_scheduler import BACKGROUND, INTERACTIVE, QuotaScheduler, SQLiteBucketStore
+
+MODEL = 'model'
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+
+def test_sessions_take_turns_and_interactive_goes_first():
+    # One token to start with, then one every 20 ms
+    scheduler = QuotaScheduler(default_rate=50, default_burst=1)
+    order = []
+
+    async def request(session, priority=BACKGROUND):
+        await scheduler.acquire(MODEL, session, priority)
+        order.append(session)
+
+    async def main():
+        await scheduler.acquire(MODEL, 'warmup')
+        tasks = [asyncio.create_task(request('busy')) for _ in range(4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request('quiet')))
+        tasks.append(asyncio.create_task(request('urgent', INTERACTIVE)))
+        await asyncio.gather(*tasks)
+
+    run(main())
+    assert order[0] == 'urgent'
+    # The quiet session is served after one request of the busy one, not after all four
+    assert order.index('quiet') == 2
+    assert scheduler.stats['granted'] == 7
+
+
+def test_cancelled_waiter_returns_its_token():
+    # Two tokens and practically no refill
+    scheduler = QuotaScheduler(default_rate=0.01, default_burst=2)
+
+    async def main():
+        await scheduler.acquire(MODEL, 'a')
+        # Granted synchronously, then cancelled before its loop wakes it
+        cancelled = asyncio.create_task(scheduler.acquire(MODEL, 'b'))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        await asyncio.wait_for(scheduler.acquire(MODEL, 'c'), 1)
+
+    run(main())
+    assert scheduler.stats['granted'] == 2
+
+
+def test_cancelled_waiters_do_not_consume_tokens():
+    scheduler = QuotaScheduler(default_rate=0.01, default_burst=1)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        gone = loop.create_future()
+        gone.cancel()
+        scheduler._waiters[MODEL] = {BACKGROUND: OrderedDict(s=deque([(loop, gone)]))}
+        scheduler._dispatch(MODEL)
+        # The only token is still there for a live request
+        await asyncio.wait_for(scheduler.acquire(MODEL, 'live'), 1)
+
+    run(main())
+    assert scheduler.stats['granted'] == 1
+
+
+def test_waiting_request_is_granted_when_the_bucket_refills():
+    scheduler = QuotaScheduler(default_rate=20, default_burst=1)
+
+    async def main():
+        await scheduler.acquire(MODEL, 'a')
+        await scheduler.acquire(MODEL, 'a')
+
+    run(main())
+    assert scheduler.waiting() == {MODEL: 0}
+
+
+def test_shared_store(tmp_path):
+    store = SQLiteBucketStore(str(tmp_path / 'quota.db'))
+    scheduler = QuotaScheduler(default_rate=20, default_burst=2, store=store)
+
+    async def main():
+        await asyncio.gather(*(scheduler.acquire(MODEL, f's{i}') for i in range(4)))
+
+    run(main())
+    assert scheduler.stats['granted'] == 4
+    # A second process's scheduler sees the same (now empty) bucket
+    assert store.take(MODEL, 20, 2) > 0
+
+
+def test_zero_rate_is_unlimited():
+    scheduler = QuotaScheduler(default_rate=0)
+
+    async def main():
+        await asyncio.gather(*(scheduler.acquire(MODEL, 's') for _ in range(100)))
+
+    run(main())
+    assert scheduler.stats['queued'] == 0
+
+
+def test_store_is_read_off_the_loop_and_outside_the_lock(tmp_path):
+    store = SQLiteBucketStore(str(tmp_path / 'quota.db'))
+    scheduler = QuotaScheduler(default_rate=20, default_burst=2, store=store)
+    seen = []
+    take = store.take
+
+    def checked_take(*args):
+        seen.append((threading.current_thread(), scheduler._lock.locked()))
+        return take(*args)
+
+    store.take = checked_take
+
+    async def main():
+        await scheduler.acquire(MODEL, 's')
+        return threading.current_thread()
+
+    loop_thread = run(main())
+    assert seen and all(thread is not loop_thread and not locked for thread, locked in seen)
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from bedrock_helper import BedrockHelper
+from quota_scheduler import QuotaScheduler
+from region_pool import RegionPool
+
+MODEL = 'amazon.titan-text-lite-v1'
+BODY = {'inputText': 'hello'}
+
+
+def helper(pool, region_latency, call_timeout=5.0, latency=0.01):
+    bedrock = BedrockHelper(mock=True, regions=pool, call_timeout=call_timeout,
+                            scheduler=QuotaScheduler(default_rate=0), response_cache=None)
+    bedrock.mock_latency = latency
+    bedrock.mock_tail_rate = 0
+    bedrock.mock_region_latency = region_latency
+    return bedrock
+
+
+def invoke(bedrock, times=1):
+    async def main():
+        return [await bedrock._ainvoke_model(MODEL, BODY) for _ in range(times)]
+    return asyncio.run(main())
+
+
+def test_ordered_prefers_healthy_fast_regions():
+    pool = RegionPool(['a', 'b', 'c'])
+    for _ in range(5):
+        pool.record('a', 0.5)
+        pool.record('b', 0.1)
+    pool.record('c', 0.1, ok=False)
+    assert pool.ordered() == ['b', 'a', 'c']
+
+
+def test_failover_to_next_region_and_cooldown():
+    pool = RegionPool(['down', 'up'], hedge=False, failure_limit=3)
+    bedrock = helper(pool, {'down': None})
+    responses = invoke(bedrock, 3)
+    assert all(response.text for response in responses)
+    assert pool.stats['failovers'] >= 1
+    health = pool.snapshot()
+    assert health['up']['samples'] == 3
+    assert health['down']['samples'] == 0
+    # Failures push the down region to the back of the order
+    assert pool.ordered()[0] == 'up'
+
+
+def test_region_that_hangs_past_the_timeout_is_cooled_down():
+    pool = RegionPool(['slow'], failure_limit=3)
+    bedrock = helper(pool, {'slow': 30.0}, call_timeout=0.2)
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            invoke(bedrock)
+    health = pool.snapshot()['slow']
+    assert health['failures'] == 3
+    assert not health['available']
+    assert health['samples'] == 0
+
+
+def test_hedge_loser_is_not_a_latency_sample():
+    pool = RegionPool(['slow', 'fast'], hedge=True, default_hedge_after=0.05, hedge_budget=1.0)
+    bedrock = helper(pool, {'slow': 1.0, 'fast': 0.01})
+    invoke(bedrock)
+    assert pool.stats['hedges'] == 1 and pool.stats['hedge_wins'] == 1
+    health = pool.snapshot()
+    assert health['fast']['samples'] == 1
+    # The cancelled request to the slow region leaves no (too short) sample and no failure
+    assert health['slow']['samples'] == 0
+    assert health['slow']['failures'] == 0
+
+
+def test_timeout_shorter_than_usual_latency_is_not_a_failure():
+    pool = RegionPool(['a'], min_samples=5)
+    for _ in range(5):
+        pool.record('a', 1.0)
+    pool.timed_out('a', 0.3)
+    assert pool.snapshot()['a']['failures'] == 0
+    pool.timed_out('a', 2.0)
+    assert pool.snapshot()['a']['failures'] == 1
@@ -0,0 +1,90 @@
+import asyncio
+
+from bedrock_helper import BedrockHelper
+from session_store import SessionStore
+
+
+def store_for(entries, load=None):
+    """A store with room for exactly `entries` entries of the size used below"""
+    return SessionStore(SessionStore.sizeof('k0', 'v' * 100) * entries, load=load)
+
+
+def test_evicts_least_recently_used_within_budget():
+    store = store_for(3)
+    for i in range(3):
+        store.put(f'k{i}', 'v' * 100)
+    # Reading k0 makes k1 the oldest
+    assert store.get('k0') == 'v' * 100
+    store.put('k3', 'v' * 100)
+    assert 'k1' not in store
+    assert all(key in store for key in ('k0', 'k2', 'k3'))
+    assert store.nbytes <= store.max_bytes
+    assert store.stats['evictions'] == 1
+
+
+def test_replacing_a_key_does_not_double_count():
+    store = store_for(2)
+    store.put('k0', 'v' * 100)
+    store.put('k0', 'v' * 100)
+    assert len(store) == 1
+    assert store.nbytes == SessionStore.sizeof('k0', 'v' * 100)
+
+
+def test_value_larger_than_the_budget_is_not_kept():
+    store = store_for(2)
+    store.put('k0', 'v' * 100)
+    store.put('big', 'v' * 10000)
+    assert 'big' not in store and 'k0' in store
+
+
+def test_evicted_entry_is_loaded_back():
+    backing = {}
+    store = store_for(1, load=backing.get)
+    for key in ('k0', 'k1'):
+        backing[key] = 'v' * 100
+        store.put(key, backing[key])
+    assert 'k0' not in store
+    assert store.get('k0') == 'v' * 100
+    assert 'k0' in store and 'k1' not in store
+    assert store.get('missing') is None
+    assert (store.stats['loads'], store.stats['misses']) == (1, 1)
+
+
+def test_conversion_evicted_between_calls_is_not_requested_again():
+    class Cache(dict):
+        def put(self, key, task, model_id, result):
+            self[key] = result
+
+    cache = Cache()
+    bedrock = BedrockHelper(mock=True, response_cache=cache)
+    bedrock.mock_latency = 0
+    first = asyncio.run(bedrock.aconvert_function_to_language("def f(): pass", "Go"))
+    calls = bedrock.stats['model_calls']
+    assert calls == 1
+    bedrock.conversions.clear()
+    assert asyncio.run(bedrock.aconvert_function_to_language("def f(): pass", "Go")) == first
+    assert bedrock.stats['model_calls'] == calls
+
+
+def test_response_cache_is_read_and_written_off_the_event_loop():
+    import threading
+
+    class Cache(dict):
+        def get(self, key, default=None):
+            calls.append(('get', threading.get_ident()))
+            return super().get(key, default)
+
+        def put(self, key, task, model_id, result):
+            calls.append(('put', threading.get_ident()))
+            self[key] = result
+
+    async def convert():
+        await bedrock.aconvert_function_to_language("def f(): pass", "Go")
+        return threading.get_ident()
+
+    calls = []
+    bedrock = BedrockHelper(mock=True, response_cache=Cache())
+    bedrock.mock_latency = 0
+    loop_thread = asyncio.run(convert())
+    assert [name for name, _ in calls] == ['get', 'put']
+    assert all(thread != loop_thread for _, thread in calls)
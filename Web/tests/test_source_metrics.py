@@ -0,0 +1,91 @@
+import glob
+import os
+
+import pytest
+
+import source_metrics
+from code_analyzer import CodeAnalyzer
+from source_metrics import LineCounter, line_counts
+
+SAMPLES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', '..', 'Code_For_Test', '*')))
+
+
+def streamed(text, marker=None):
+    counter = LineCounter(marker)
+    for line in text.splitlines():
+        counter.feed(line)
+    return counter.counts
+
+
+@pytest.mark.parametrize('text, marker, expected', [
+    ('', None, (0, 0, 0, 0)),
+    ('x', None, (1, 0, 0, 1)),
+    ('\n', None, (1, 1, 0, 0)),
+    ('a\n  ', None, (2, 1, 0, 1)),
+    # Whitespace-only lines inside an unclosed comment are blank, not also comment
+    ('/*\n\t', None, (2, 1, 1, 0)),
+    ('int f() {\n  return 1;\n}\n/* todo\n  ', None, (5, 1, 1, 3)),
+    ('/* open\n\nstill\n', None, (3, 1, 2, 0)),
+    # Unicode whitespace is blank, as count_loc's strip() sees it
+    ('/*\n\xa0', None, (2, 1, 1, 0)),
+    ('  /* one\n  // two\n  three */\n', None, (3, 0, 3, 0)),
+    ('x /* a */\n/* a */ /* b */\n"/*" s\n', None, (3, 0, 1, 2)),
+    ('# c\nx = 1\n\n', '#', (3, 1, 1, 1)),
+    ('-- c\nSELECT 1 /* x\n y */ ;\n', '--', (3, 0, 1, 2)),
+    ('a\r\n\r\n// c\r\nb', None, (4, 1, 1, 2)),
+])
+def test_line_counts(text, marker, expected):
+    counts = line_counts(text, marker)
+    assert (counts['lines'], counts['blank'], counts['comment'], counts['code']) == expected
+    assert streamed(text, marker) == counts
+    assert counts['lines'] - counts['blank'] == CodeAnalyzer().count_loc(text)
+    assert min(counts.values()) >= 0
+
+
+@pytest.mark.parametrize('path', SAMPLES, ids=os.path.basename)
+def test_samples_agree_with_count_loc_and_stream(path):
+    analyzer = CodeAnalyzer()
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    analysis = analyzer.analyze(text, os.path.basename(path))
+    metrics = analysis['metrics']
+    assert analysis['loc'] == analyzer.count_loc(text)
+    assert metrics['lines'] - metrics['blank'] == analysis['loc']
+    assert metrics['blank'] + metrics['comment'] + metrics['code'] == metrics['lines']
+    for entry in metrics['functions']:
+        assert 0 <= entry['loc'] <= entry['end_line'] - entry['line'] + 1
+        assert entry['complexity'] >= 1
+
+
+def test_unclosed_comment_analysis():
+    analysis = CodeAnalyzer().analyze('int f() {\n  return 1;\n}\n/* todo\n  ', 'a.c')
+    metrics = analysis['metrics']
+    assert (metrics['code'], metrics['comment'], metrics['blank']) == (3, 1, 1)
+    assert analysis['loc'] == 4
+    assert metrics['functions'][0]['loc'] == 3
+
+
+def test_python_functions():
+    source = (
+        'def f(xs):\n'
+        '    """Doc\n'
+        '    string"""\n'
+        '    for x in xs:\n'
+        '        if x and x > 1:\n'
+        '            return x\n'
+        '        elif x:\n'
+        '            pass\n'
+        '    return [y for y in xs if y]\n'
+    )
+    metrics = CodeAnalyzer().analyze(source, 'a.py')['metrics']
+    (entry,) = metrics['functions']
+    # for, if, elif, one extra boolean operand, one comprehension with one condition
+    assert entry['complexity'] == 1 + 1 + 1 + 1 + 1 + 2
+    assert entry['max_nesting'] == 2
+    # The docstring's two lines are comments, not code
+    assert entry['loc'] == 7
+    assert metrics['comment'] == 2
+
+
+def test_decision_points():
+    assert source_metrics.decision_points('if (a && b) { while (c) {} }') == 3